@@ -2,67 +2,118 @@
 import pygame
 import random
 import math
+import numpy as np
 from steering import Steering
 from food import Pheromone
+from pheromone_field import PheromoneField
+from spatial_hash import nearby
+from obstacle import point_blocked
+from movement_memory import MovementMemory
+from entity import Entity, shared_image, COLORS, BLACK, RED, BLUE
 
-class Ant(pygame.sprite.Sprite):
-    def __init__(self, x, y, screen_width, screen_height, nest):
-        pygame.sprite.Sprite.__init__(self)
+class Ant(Entity):
+    # Slots instead of a per-ant __dict__, and no Surface of its own: the
+    # image is the shared one for the ant's color (see entity.py)
+    __slots__ = ('rng', 'np_rng', 'screen_width', 'screen_height', 'color', 'velocity', 'max_speed',
+                 'steering', 'carrying_food', 'nest', 'colony', 'pheromone_type', 'pheromone_drop_interval',
+                 'pheromone_timer', 'perception_radius', 'exploration_bias', 'last_direction_change',
+                 'direction_change_interval', 'has_found_food', 'last_food_position', 'last_food_spot',
+                 'returning_to_food', 'successful_trip', 'food_reach', 'memory_length', 'movement_memory',
+                 'stuck_threshold', 'last_stuck_check', 'stuck_check_interval', 'current_direction',
+                 'direction_persistence', 'direction_timer', 'profiler', 'recorder', 'ant_id', 'flow')
+
+    def __init__(self, x, y, screen_width, screen_height, nest, rng=None, np_rng=None):
+        Entity.__init__(self)
         
+        # Random sources: a random.Random-like stream and a NumPy generator for
+        # batched draws; both default to the global modules
+        self.rng = rng if rng is not None else random
+        self.np_rng = np_rng if np_rng is not None else np.random
         self.screen_width = screen_width
         self.screen_height = screen_height
-        self.image = pygame.Surface((5, 5))
-        self.image.fill((0, 0, 0))
-        self.rect = self.image.get_rect()
+        self.color = BLACK
+        self.rect = pygame.Rect(0, 0, 5, 5)
         self.rect.center = (x, y)
         self.position = pygame.math.Vector2(x, y)
-        self.velocity = pygame.math.Vector2(random.uniform(-1, 1), random.uniform(-1, 1)).normalize()
+        self.velocity = pygame.math.Vector2(self.rng.uniform(-1, 1), self.rng.uniform(-1, 1)).normalize()
         self.max_speed = 2
         self.steering = Steering(self)
         
         # Modified attributes for anti-circling
         self.carrying_food = False
         self.nest = nest
+        self.colony = 0  # Index of the nest this ant belongs to
+        self.pheromone_type = 'food'  # This colony's pheromone channel
         self.pheromone_drop_interval = 20
         self.pheromone_timer = 0
         self.perception_radius = 100
-        self.exploration_bias = random.uniform(0.8, 1.5)
+        self.exploration_bias = self.rng.uniform(0.8, 1.5)
         self.last_direction_change = 0
-        self.direction_change_interval = random.randint(50, 150)
+        self.direction_change_interval = self.rng.randint(50, 150)
         self.has_found_food = False
         self.last_food_position = None
+        self.last_food_spot = None  # FoodSpot the last food came from
         self.returning_to_food = False
         self.successful_trip = False
+        self.food_reach = 6  # Distance within which food rects can overlap the ant's rect
         
         # Anti-circling attributes
-        self.movement_memory = []
         self.memory_length = 50 # Increase memory length to have more data points to evaluate if stuck
+        self.movement_memory = MovementMemory(self.memory_length)
         self.stuck_threshold = 60 # Increase the threshold for detecting if the ant is stuck
         self.last_stuck_check = 0
         self.stuck_check_interval = 20
-        self.current_direction = pygame.math.Vector2(random.uniform(-1, 1), random.uniform(-1, 1)).normalize()
-        self.direction_persistence = random.randint(30, 60)
+        self.current_direction = pygame.math.Vector2(self.rng.uniform(-1, 1), self.rng.uniform(-1, 1)).normalize()
+        self.direction_persistence = self.rng.randint(30, 60)
         self.direction_timer = 0
 
+        # Optional TickProfiler; phases are only timed when one is attached
+        self.profiler = None
+
+        # Optional Recorder for pickup/delivery/stuck events, and this ant's index in it
+        self.recorder = None
+        self.ant_id = 0
+
+        # Optional FlowFields that route ants heading home or back to food around obstacles
+        self.flow = None
+
+    @property
+    def image(self):
+        return shared_image((5, 5), COLORS[self.color])
+
+    def heading(self, target, offset):
+        # Unit direction toward target (offset = target - position): along the
+        # flow field when one is attached and a wall is in the way, else straight
+        if self.flow is not None and target is not None:
+            step = self.flow.field(target).steer(self.position.x, self.position.y)
+            if step is not None:
+                return pygame.math.Vector2(step)
+        return offset.normalize()
+
     def find_nearby_pheromones(self, pheromones, type_to_follow):
-        nearby = []
-        for p in pheromones:
+        found = []
+        for p in nearby(pheromones, self.position, self.perception_radius):
+            if p.type != type_to_follow:
+                continue
             distance = (self.position - p.position).length()
             if distance < self.perception_radius:
-                nearby.append((p, distance))
-        return nearby
+                found.append((p, distance))
+        return found
 
     def handle_food_collection(self, foods):
         if not self.carrying_food:
-            for food in foods:
+            for food in nearby(foods, self.position, self.food_reach):
                 if self.rect.colliderect(food.rect):
                     self.carrying_food = True
                     self.has_found_food = True
                     self.last_food_position = pygame.math.Vector2(food.position)
+                    self.last_food_spot = food.spot
                     self.returning_to_food = False
                     if food.reduce_amount():
                         foods.remove(food)
-                    self.image.fill((255, 0, 0))  # Red color when carrying food
+                    self.color = RED  # Red when carrying food
+                    if self.recorder is not None:
+                        self.recorder.event('pickup', self.ant_id, food.position.x, food.position.y)
                     return
 
     def handle_food_delivery(self):
@@ -71,15 +122,19 @@ class Ant(pygame.sprite.Sprite):
             if distance_to_nest < 20:  # Nest radius
                 self.carrying_food = False
                 self.nest.store_food(1)
-                self.image.fill((0, 0, 0))  # Back to black when not carrying food
+                self.color = BLACK  # Back to black when not carrying food
                 self.successful_trip = True
                 self.returning_to_food = True
                 self.exploration_bias = 0.3
+                if self.recorder is not None:
+                    self.recorder.event('delivery', self.ant_id, self.position.x, self.position.y)
 
-    def drop_pheromone(self, pheromones):
-        if self.pheromone_timer <= 0:
+    def drop_pheromone(self, pheromones, dt=1):
+        # A drop due partway through a dt-tick update still happens, and the
+        # ticks after it count toward the next one
+        if self.pheromone_timer < dt:
             strength = 20  # Base pheromone strength
-            pheromone_type = 'food'
+            pheromone_type = self.pheromone_type
 
             if self.carrying_food:
                 strength = 300  # Strong pheromone when carrying food
@@ -88,30 +143,51 @@ class Ant(pygame.sprite.Sprite):
             elif self.has_found_food:
                 strength = 100  # Medium strength for experienced ants
 
-            pheromones.append(Pheromone(self.position.x, self.position.y, strength, pheromone_type))
-            self.pheromone_timer = self.pheromone_drop_interval
+            if isinstance(pheromones, PheromoneField):
+                pheromones.deposit(self.position.x, self.position.y, strength, pheromone_type)
+            else:
+                pheromones.append(Pheromone(self.position.x, self.position.y, strength, pheromone_type))
+            self.pheromone_timer = self.pheromone_drop_interval - (dt - 1 - self.pheromone_timer)
         else:
-            self.pheromone_timer -= 1
+            self.pheromone_timer -= dt
 
     def is_stuck(self):
-        if len(self.movement_memory) < self.memory_length:
+        if not self.movement_memory.full:
             return False
-            
-        center = pygame.math.Vector2(0, 0)
-        for pos in self.movement_memory:
-            center += pos
-        center /= len(self.movement_memory)
-        
-        avg_distance = sum((pos - center).length() for pos in self.movement_memory) / len(self.movement_memory)
-        return avg_distance < self.stuck_threshold
+        return self.movement_memory.spread() < self.stuck_threshold
 
     def update_movement_memory(self):
-        self.movement_memory.append(pygame.math.Vector2(self.position))
-        if len(self.movement_memory) > self.memory_length:
-            self.movement_memory.pop(0)
+        self.movement_memory.push(self.position.x, self.position.y)
+
+    def calculate_field_influence(self, field):
+        xs, ys, strengths, distances = field.nearby(self.position, self.perception_radius, self.pheromone_type)
+        keep = distances >= 10  # Ignore very close cells
+        if not keep.any():
+            return pygame.math.Vector2(0, 0)
+
+        xs, ys = xs[keep], ys[keep]
+        weights = strengths[keep] / np.maximum(distances[keep], 1) * self.np_rng.uniform(1, 1.5, len(xs))
+        if self.carrying_food:
+            weights *= 15  # Ants carrying food should follow pheromones more strongly
+        total_weight = weights.sum()
+        if total_weight <= 0:
+            return pygame.math.Vector2(0, 0)
+
+        weighted_pos = pygame.math.Vector2(float((xs * weights).sum() / total_weight),
+                                           float((ys * weights).sum() / total_weight))
+        direction = weighted_pos - self.position
+        if direction.length_squared() == 0:
+            return pygame.math.Vector2(0, 0)
+        direction = direction.normalize()
+        direction += pygame.math.Vector2(self.rng.uniform(-0.3, 0.3),
+                                         self.rng.uniform(-0.3, 0.3))
+        return direction.normalize()
 
     def calculate_pheromone_influence(self, pheromones):
-        nearby = self.find_nearby_pheromones(pheromones, 'food')
+        if isinstance(pheromones, PheromoneField):
+            return self.calculate_field_influence(pheromones)
+
+        nearby = self.find_nearby_pheromones(pheromones, self.pheromone_type)
         if not nearby:
             return pygame.math.Vector2(0, 0)
 
@@ -122,7 +198,7 @@ class Ant(pygame.sprite.Sprite):
             if distance < 10:  # Ignore very close pheromones
                 continue
                 
-            weight = (pheromone.strength / max(distance, 1)) * random.uniform(1, 1.5)
+            weight = (pheromone.strength / max(distance, 1)) * self.rng.uniform(1, 1.5)
             # Increase weighting for pheromones if the ant has found food
             if self.carrying_food:
                 weight *= 15  # Ants carrying food should follow pheromones more strongly
@@ -132,32 +208,43 @@ class Ant(pygame.sprite.Sprite):
         if total_weight > 0:
             weighted_pos /= total_weight
             direction = (weighted_pos - self.position).normalize()
-            random_offset = pygame.math.Vector2(random.uniform(-0.3, 0.3), 
-                                              random.uniform(-0.3, 0.3))
+            random_offset = pygame.math.Vector2(self.rng.uniform(-0.3, 0.3), 
+                                              self.rng.uniform(-0.3, 0.3))
             direction += random_offset
             return direction.normalize()
             
         return pygame.math.Vector2(0, 0)
 
-    def update(self, obstacles, foods, pheromones):
+    def update(self, obstacles, foods, pheromones, dt=1):
+        # dt is the number of ticks this update covers (see LevelOfDetail)
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.lap()
+
         self.handle_food_collection(foods)
         self.handle_food_delivery()
-        self.drop_pheromone(pheromones)
+        if profiler is not None:
+            profiler.lap('ants.food')
+        self.drop_pheromone(pheromones, dt)
+        if profiler is not None:
+            profiler.lap('ants.pheromone_drop')
         
         # Update movement memory and check for circling
         self.update_movement_memory()
         
         # Update direction persistence
-        self.direction_timer += 1
+        self.direction_timer += dt
         if self.direction_timer >= self.direction_persistence:
             self.direction_timer = 0
-            self.direction_persistence = random.randint(30, 60)
-            self.current_direction = pygame.math.Vector2(random.uniform(-1, 1), 
-                                                       random.uniform(-1, 1)).normalize()
+            self.direction_persistence = self.rng.randint(30, 60)
+            self.current_direction = pygame.math.Vector2(self.rng.uniform(-1, 1), 
+                                                       self.rng.uniform(-1, 1)).normalize()
 
         # Calculate base forces
         wander_force = self.steering.wander()
         avoid_force = self.steering.avoid_obstacles(obstacles) * 2
+        if profiler is not None:
+            profiler.lap('ants.steering')
         
         # Calculate movement force
         movement_force = pygame.math.Vector2(0, 0)
@@ -166,37 +253,51 @@ class Ant(pygame.sprite.Sprite):
             # Head straight back to nest with some randomness
             to_nest = self.nest.position - self.position
             if to_nest.length_squared() > 0:
-                movement_force = to_nest.normalize() * 2.0
-                movement_force += pygame.math.Vector2(random.uniform(-0.1, 0.1), 
-                                                    random.uniform(-0.1, 0.1))
+                movement_force = self.heading(self.nest.position, to_nest) * 2.0
+                movement_force += pygame.math.Vector2(self.rng.uniform(-0.1, 0.1), 
+                                                    self.rng.uniform(-0.1, 0.1))
         elif self.returning_to_food and self.last_food_position:
             to_food = self.last_food_position - self.position
             if to_food.length_squared() > 0:
-                movement_force = to_food.normalize() * 1.5
-                movement_force += pygame.math.Vector2(random.uniform(-0.2, 0.2), 
-                                                    random.uniform(-0.2, 0.2))
+                spot = self.last_food_spot
+                movement_force = self.heading(spot.position if spot is not None else None, to_food) * 1.5
+                movement_force += pygame.math.Vector2(self.rng.uniform(-0.2, 0.2), 
+                                                    self.rng.uniform(-0.2, 0.2))
                 
-                if to_food.length() < 20 and not any(food.rect.collidepoint(self.position) for food in foods):
+                # Give up once the spot is empty, or on arriving to find no food
+                if (spot is not None and not spot.has_food()) or (
+                        to_food.length() < 20 and not any(food.rect.collidepoint(self.position)
+                                                          for food in nearby(foods, self.position, self.food_reach))):
                     self.returning_to_food = False
-                    self.exploration_bias = random.uniform(0.6, 0.9)
+                    self.exploration_bias = self.rng.uniform(0.6, 0.9)
         else:
             pheromone_force = self.calculate_pheromone_influence(pheromones)
             movement_force = pheromone_force * (1.2 if self.has_found_food else 0.4)
+        if profiler is not None:
+            profiler.lap('ants.pheromone_influence')
 
-        # Check if stuck in circles
-        if self.is_stuck() and not self.carrying_food:
-            self.current_direction = pygame.math.Vector2(random.uniform(-1, 1), 
-                                                       random.uniform(-1, 1)).normalize()
+        # Check if stuck in circles, every stuck_check_interval ticks
+        self.last_stuck_check += dt
+        stuck = False
+        if self.last_stuck_check >= self.stuck_check_interval:
+            self.last_stuck_check = 0
+            stuck = self.is_stuck()
+        if stuck and not self.carrying_food:
+            if self.recorder is not None:
+                self.recorder.event('stuck', self.ant_id, self.position.x, self.position.y)
+            self.current_direction = pygame.math.Vector2(self.rng.uniform(-1, 1), 
+                                                       self.rng.uniform(-1, 1)).normalize()
             self.exploration_bias = min(self.exploration_bias * 1.5, 0.9)
             wander_force = self.current_direction * 2.0
             movement_force *= 0.2
 
         if not self.carrying_food and not self.returning_to_food:
-            self.exploration_bias = random.uniform(1.0, 1.5)  # Strong exploration when idle
+            self.exploration_bias = self.rng.uniform(1.0, 1.5)  # Strong exploration when idle
         elif self.successful_trip:
             self.exploration_bias = 0.3  # Reduce exploration after successful trip
 
         # Combine forces
+        wander = pygame.math.Vector2(0, 0)
         if self.carrying_food:
             steering = (avoid_force + 
                        movement_force * 2.0 + 
@@ -206,36 +307,40 @@ class Ant(pygame.sprite.Sprite):
                        movement_force * 1.5 + 
                        self.current_direction * 0.5)
         else:
-            steering = (wander_force * self.exploration_bias + 
+            wander = wander_force * self.exploration_bias
+            steering = (wander + 
                        avoid_force + 
                        movement_force * (0.8 if self.has_found_food else 0.3) +
                        self.current_direction * 0.4)
+        if dt != 1:
+            # dt ticks of steering in one update: the steady pulls act dt
+            # times, while dt random turns only spread like sqrt(dt) of them
+            steering = (steering - wander) * dt + wander * math.sqrt(dt)
 
         # Update velocity
         self.velocity += steering
         if self.velocity.length_squared() > 0:
             self.velocity = self.velocity.normalize() * self.max_speed
-            self.velocity += pygame.math.Vector2(random.uniform(-0.1, 0.1), 
-                                              random.uniform(-0.1, 0.1))
+            self.velocity += pygame.math.Vector2(self.rng.uniform(-0.1, 0.1), 
+                                              self.rng.uniform(-0.1, 0.1))
+
+        if profiler is not None:
+            profiler.lap('ants.steering')
 
         # Update position with collision checking
-        new_position = self.position + self.velocity
+        new_position = self.position + self.velocity * dt
         
-        collision = False
-        for obstacle in obstacles:
-            if obstacle.rect.collidepoint(new_position):
-                collision = True
-                break
-        
-        if collision:
+        if point_blocked(obstacles, new_position):
             for angle in range(0, 360, 10):
                 test_velocity = pygame.math.Vector2(1, 0).rotate(angle) * self.max_speed
                 test_position = self.position + test_velocity
-                if not any(obstacle.rect.collidepoint(test_position) for obstacle in obstacles):
+                if not point_blocked(obstacles, test_position):
                     self.velocity = test_velocity
                     new_position = test_position
                     break
             else:
+                if profiler is not None:
+                    profiler.lap('ants.collision')
                 return
         
         self.position = new_position
@@ -243,19 +348,26 @@ class Ant(pygame.sprite.Sprite):
         self.position.x %= self.screen_width
         self.position.y %= self.screen_height
         self.rect.center = self.position
+        if profiler is not None:
+            profiler.lap('ants.collision')
         
 class SoldierAnt(Ant):
-    def __init__(self, x, y, screen_width, screen_height, nest):
-        super().__init__(x, y, screen_width, screen_height, nest)
-        self.image.fill((0, 0, 255))  # Blue for soldier ants
+    __slots__ = ('protection_radius', 'max_distance_from_nest')
+
+    def __init__(self, x, y, screen_width, screen_height, nest, rng=None, np_rng=None):
+        super().__init__(x, y, screen_width, screen_height, nest, rng, np_rng)
+        self.color = BLUE  # Blue for soldier ants
         self.protection_radius = 100  # Radius within which the soldier ant provides protection
         self.max_distance_from_nest = 100  # Maximum distance from the nest
 
-    def update(self, obstacles, foods, pheromones):
-        super().update(obstacles, foods, pheromones)  # Call the parent update method
+    def update(self, obstacles, foods, pheromones, dt=1):
+        super().update(obstacles, foods, pheromones, dt)  # Call the parent update method
 
         # Check for nearby worker ants
-        nearby_workers = [ant for ant in self.groups()[0] if isinstance(ant, Ant) and
+        # Ants are reindexed once per step and move up to max_speed * dt in
+        # it (dt > 1 with LevelOfDetail or multi-tick steps), so pad the query by that
+        candidates = nearby(self.groups()[0], self.position, self.protection_radius + self.max_speed * dt)
+        nearby_workers = [ant for ant in candidates if isinstance(ant, Ant) and ant.nest is self.nest and
                           (self.position - ant.position).length() < self.protection_radius]
 
         # Move towards the nearest ant for protection, ensuring not to exceed max distance from nest
@@ -267,12 +379,15 @@ class SoldierAnt(Ant):
             # Only move towards the worker if within the allowed distance from the nest
             if distance_to_worker > 0 and distance_to_nest < self.max_distance_from_nest:
                 direction_to_worker = (closest_ant.position - self.position).normalize()
-                self.position += direction_to_worker * self.max_speed * 0.5  # Move towards the ant at a slower speed
+                # Move towards the ant at a slower speed
+                self.position += direction_to_worker * self.max_speed * 0.5 * dt
                 self.rect.center = self.position
             else:
                 # If too far from the nest, adjust position back towards the nest
                 if distance_to_nest >= self.max_distance_from_nest:
                     direction_to_nest = (self.nest.position - self.position).normalize()
-                    self.position += direction_to_nest * self.max_speed * 0.5  # Move back towards the nest
+                    self.position += direction_to_nest * self.max_speed * 0.5 * dt  # Move back towards the nest
                     self.rect.center = self.position
+        if self.profiler is not None:
+            self.profiler.lap('ants.soldier')
                 
\ No newline at end of file
@@ -0,0 +1,156 @@
+# benchmark.py
+import argparse
+import json
+import multiprocessing
+import platform
+import resource
+import sys
+import time
+import numpy as np
+import pygame
+from obstacle import SHAPES
+from simulation import Simulation
+
+PHASES = ['ants', 'pheromones', 'replenish', 'draw']
+
+def time_phases(sim, ticks, surface):
+    # Wall time per phase of Simulation.step plus drawing, summed over the run
+    totals = dict.fromkeys(PHASES, 0.0)
+    clock = time.perf_counter
+    for _ in range(ticks):
+        t0 = clock()
+        sim.update_ants()
+        t1 = clock()
+        sim.update_pheromones()
+        t2 = clock()
+        sim.replenish_food()
+        t3 = clock()
+        sim.ticks += 1
+        if surface is not None:
+            sim.draw(surface)
+        t4 = clock()
+        totals['ants'] += t1 - t0
+        totals['pheromones'] += t2 - t1
+        totals['replenish'] += t3 - t2
+        totals['draw'] += t4 - t3
+    return totals
+
+def time_avoidance(sim, repeats=3):
+    # Steering.avoid_obstacles over every sprite ant, baked map vs plain group
+    ants = sim.ants.sprites()
+    result = {}
+    for name, obstacles in (('map', sim.obstacle_map), ('group', sim.obstacles)):
+        start = time.perf_counter()
+        for _ in range(repeats):
+            for ant in ants:
+                ant.steering.avoid_obstacles(obstacles)
+        result[name] = (time.perf_counter() - start) / (repeats * max(len(ants), 1))
+    return result
+
+def run_case(case):
+    # Runs in its own process so the peak RSS belongs to this case alone
+    start = time.perf_counter()
+    sim = Simulation(num_ants=case['ants'], shape=case['shape'], seed=case['seed'],
+                     vectorized=case['engine'] == 'vectorized')
+    if case.get('lod'):
+        sim.enable_lod()
+    if case.get('flow'):
+        sim.enable_flow_fields()
+    build_seconds = time.perf_counter() - start
+
+    surface = pygame.Surface((sim.screen_width, sim.screen_height)) if case['draw'] else None
+    sim.step(case['warmup'])
+    start = time.perf_counter()
+    phases = time_phases(sim, case['ticks'], surface)
+    elapsed = time.perf_counter() - start
+
+    result = dict(case)
+    result.update({
+        'build_seconds': round(build_seconds, 4),
+        'seconds': round(elapsed, 4),
+        'ticks_per_second': round(case['ticks'] / elapsed, 2) if elapsed > 0 else None,
+        'phase_ms_per_tick': {name: round(total * 1000 / case['ticks'], 4) for name, total in phases.items()},
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'final': sim.stats(),
+    })
+    if sim.lod is not None:
+        result['lod_report'] = sim.lod.report()
+    if case['engine'] == 'sprite':
+        result['avoid_obstacles_us_per_ant'] = {name: round(seconds * 1e6, 3)
+                                                for name, seconds in time_avoidance(sim).items()}
+    return result
+
+def build_cases(ant_counts, shapes, engines, ticks, warmup, seed, draw, lods=(False,), flows=(False,)):
+    return [{'ants': ants, 'shape': shape, 'engine': engine, 'lod': lod, 'flow': flow, 'ticks': ticks,
+             'warmup': warmup, 'seed': seed, 'draw': draw}
+            for engine in engines for lod in lods for flow in flows for shape in shapes for ants in ant_counts]
+
+def label(result):
+    engine = result['engine'] + ('+lod' if result.get('lod') else '') + ('+flow' if result.get('flow') else '')
+    return f"{engine:>14} {result['shape']:>6} ants={result['ants']:<6}"
+
+
+def run_benchmarks(cases):
+    results = []
+    for case in cases:
+        # A fresh process per case keeps memory numbers and caches independent
+        with multiprocessing.Pool(1, maxtasksperchild=1) as pool:
+            result = pool.apply(run_case, (case,))
+        print(f"{label(result)} {result['ticks_per_second']:>9} ticks/s  "
+              + "  ".join(f"{name}={ms:.3f}ms" for name, ms in result['phase_ms_per_tick'].items())
+              + f"  rss={result['peak_rss_mb']}MB")
+        results.append(result)
+    return results
+
+def environment():
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': sys.version.split()[0],
+        'numpy': np.__version__,
+        'pygame': pygame.version.ver,
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+    }
+
+def compare(results, baseline_path):
+    # Ticks/sec of this run relative to a saved one, matched by case
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    key = lambda r: (r['engine'], r.get('lod', False), r.get('flow', False), r['shape'], r['ants'], r['ticks'])
+    previous = {key(r): r for r in baseline['results']}
+    for result in results:
+        old = previous.get(key(result))
+        if old and old['ticks_per_second'] and result['ticks_per_second']:
+            ratio = result['ticks_per_second'] / old['ticks_per_second']
+            print(f"{label(result)} {old['ticks_per_second']:>9} -> {result['ticks_per_second']:>9} ticks/s "
+                  f"({ratio:.2f}x)")
+
+def run(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the simulation hot paths.")
+    parser.add_argument('--ants', default='30,300,3000', help="comma-separated ant counts")
+    parser.add_argument('--shapes', default=','.join(SHAPES), help="comma-separated obstacle layouts")
+    parser.add_argument('--engines', default='sprite,vectorized', help="sprite, vectorized or both")
+    parser.add_argument('--lod', default='off', help="level of detail: off, on or off,on")
+    parser.add_argument('--flow', default='off', help="flow-field routing: off, on or off,on")
+    parser.add_argument('--ticks', type=int, default=200, help="timed ticks per case")
+    parser.add_argument('--warmup', type=int, default=50, help="untimed ticks before timing")
+    parser.add_argument('--seed', type=int, default=0, help="world seed")
+    parser.add_argument('--no-draw', action='store_true', help="skip the render phase")
+    parser.add_argument('--out', default='bench_results.json', help="JSON file for the results")
+    parser.add_argument('--compare', default=None, help="earlier results file to compare against")
+    args = parser.parse_args(argv)
+
+    cases = build_cases([int(n) for n in args.ants.split(',')], args.shapes.split(','),
+                        args.engines.split(','), args.ticks, args.warmup, args.seed, not args.no_draw,
+                        [mode == 'on' for mode in args.lod.split(',')],
+                        [mode == 'on' for mode in args.flow.split(',')])
+    results = run_benchmarks(cases)
+    with open(args.out, 'w') as f:
+        json.dump({'environment': environment(), 'results': results}, f, indent=2)
+    print(f"Results written to {args.out}")
+    if args.compare:
+        compare(results, args.compare)
+    return results
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,94 @@
+# camera.py
+import pygame
+
+class Camera:
+    # The part of the world shown in the window: top-left corner in world
+    # pixels and a zoom factor (window pixels per world pixel). The world is
+    # drawn at 1:1 onto a canvas the size of the visible area, which is then
+    # scaled into the window.
+    def __init__(self, view_width, view_height, world_width, world_height, zoom=1.0, min_zoom=0.25, max_zoom=4.0):
+        self.view_width = view_width
+        self.view_height = view_height
+        self.world_width = world_width
+        self.world_height = world_height
+        self.min_zoom = min_zoom  # Bounds the canvas at 1 / min_zoom times the window size
+        self.max_zoom = max_zoom
+        self.zoom = zoom
+        self.x = 0.0
+        self.y = 0.0
+        self._canvas = None
+        self.clamp()
+
+    def view_rect(self):
+        # Visible area in world coordinates
+        return pygame.Rect(int(self.x), int(self.y), round(self.view_width / self.zoom),
+                           round(self.view_height / self.zoom))
+
+    def clamp(self):
+        self.zoom = min(max(self.zoom, self.min_zoom), self.max_zoom)
+        self.x = min(max(self.x, 0), max(self.world_width - self.view_width / self.zoom, 0))
+        self.y = min(max(self.y, 0), max(self.world_height - self.view_height / self.zoom, 0))
+
+    def center_on(self, x, y):
+        self.x = x - self.view_width / self.zoom / 2
+        self.y = y - self.view_height / self.zoom / 2
+        self.clamp()
+
+    def pan(self, dx, dy):
+        # Move by a distance in window pixels
+        self.x += dx / self.zoom
+        self.y += dy / self.zoom
+        self.clamp()
+
+    def zoom_at(self, factor, screen_pos):
+        # Zoom keeping the world point under screen_pos in place
+        world_x, world_y = self.screen_to_world(screen_pos)
+        self.zoom *= factor
+        self.clamp()
+        self.x = world_x - screen_pos[0] / self.zoom
+        self.y = world_y - screen_pos[1] / self.zoom
+        self.clamp()
+
+    def screen_to_world(self, pos):
+        return self.x + pos[0] / self.zoom, self.y + pos[1] / self.zoom
+
+    def world_to_screen(self, pos):
+        return (pos[0] - self.x) * self.zoom, (pos[1] - self.y) * self.zoom
+
+    def canvas(self):
+        # Reused offscreen surface matching the visible area
+        size = self.view_rect().size
+        if self._canvas is None or self._canvas.get_size() != size:
+            self._canvas = pygame.Surface(size)
+        return self._canvas
+
+    def present(self, canvas, surface):
+        if canvas.get_size() == surface.get_size():
+            surface.blit(canvas, (0, 0))
+        else:
+            pygame.transform.scale(canvas, surface.get_size(), surface)
+
+def visible_sprites(sprites, view, padding=0):
+    # Sprites whose rect overlaps the view; indexed groups are narrowed by
+    # query_rect first, padded for members that moved since they were indexed
+    query_rect = getattr(sprites, 'query_rect', None)
+    candidates = query_rect(view.inflate(2 * padding, 2 * padding)) if query_rect else sprites
+    return [sprite for sprite in candidates if sprite.rect.colliderect(view)]
+
+def blit_visible(canvas, sprites, view, padding=0):
+    canvas.blits([(sprite.image, sprite.rect.move(-view.left, -view.top))
+                  for sprite in visible_sprites(sprites, view, padding)], doreturn=False)
+
+def handle_camera_event(camera, event):
+    # Mouse wheel zooms around the pointer, middle-button drag pans
+    if event.type == pygame.MOUSEWHEEL:
+        camera.zoom_at(1.25 if event.y > 0 else 0.8, pygame.mouse.get_pos())
+    elif event.type == pygame.MOUSEMOTION and event.buttons[1]:
+        camera.pan(-event.rel[0], -event.rel[1])
+
+def pan_camera(camera, keys, speed=12):
+    # Held W/A/S/D keys scroll the view
+    dx = (keys[pygame.K_d] - keys[pygame.K_a]) * speed
+    dy = (keys[pygame.K_s] - keys[pygame.K_w]) * speed
+    if dx or dy:
+        camera.pan(dx, dy)
@@ -0,0 +1,771 @@
+# colony_engine.py
+import math
+import numpy as np
+from food import Pheromone
+from pheromone_field import PheromoneField, TiledPheromoneField, colony_channel
+from obstacle import ObstacleMap, TiledObstacleMap
+from movement_memory import MovementMemoryBatch
+from entity import shared_image, COLORS, BLACK, RED, BLUE  # Same color codes as the sprite ants
+
+# Per-ant state arrays (movement memory is kept separately in a MovementMemoryBatch)
+ANT_ARRAYS = ['position', 'velocity', 'current_direction', 'last_food_position', 'has_last_food', 'last_food_spot',
+              'carrying_food', 'has_found_food', 'returning_to_food', 'successful_trip', 'soldier',
+              'color', 'exploration_bias', 'pheromone_timer', 'direction_timer', 'direction_persistence',
+              'stuck_timer', 'colony']
+
+class ColonyEngine:
+    # Structure-of-arrays version of Ant/SoldierAnt.update: every field of the
+    # per-sprite state machine lives in a NumPy array and each step runs the
+    # same rules for the whole colony at once. nest may be a list of nests,
+    # one per colony; each ant carries the index of its colony and follows
+    # only that colony's pheromone channel.
+    def __init__(self, nest, screen_width, screen_height, seed=None):
+        self.nests = list(nest) if isinstance(nest, (list, tuple)) else [nest]
+        self.nest = self.nests[0]
+        self.channels = [colony_channel(colony) for colony in range(len(self.nests))]
+        self.screen_width = screen_width
+        self.screen_height = screen_height
+        self.rng = np.random.default_rng(seed)  # A seed, or a Generator to draw from directly
+
+        # Parameters, matching the defaults in Ant, SoldierAnt and Steering
+        self.max_speed = 2
+        self.max_force = 0.1
+        self.avoid_radius = 50  # Steering.perception_radius
+        self.size = 5
+        self.pheromone_drop_interval = 20
+        self.perception_radius = 100
+        self.memory_length = 50
+        self.stuck_threshold = 60
+        self.stuck_check_interval = 20
+        self.nest_radius = 20
+        self.max_distance_from_nest = 100
+
+        self.count = 0
+        self.position = np.zeros((0, 2))
+        self.velocity = np.zeros((0, 2))
+        self.current_direction = np.zeros((0, 2))
+        self.last_food_position = np.zeros((0, 2))
+        self.has_last_food = np.zeros(0, dtype=bool)
+        self.last_food_spot = np.zeros(0, dtype=np.int32)  # Index into food_spots, -1 if unknown
+        self.carrying_food = np.zeros(0, dtype=bool)
+        self.has_found_food = np.zeros(0, dtype=bool)
+        self.returning_to_food = np.zeros(0, dtype=bool)
+        self.successful_trip = np.zeros(0, dtype=bool)
+        self.soldier = np.zeros(0, dtype=bool)
+        self.colony = np.zeros(0, dtype=np.int32)
+        self.color = np.zeros(0, dtype=np.int8)
+        self.exploration_bias = np.zeros(0)
+        self.pheromone_timer = np.zeros(0, dtype=np.int32)
+        self.direction_timer = np.zeros(0, dtype=np.int32)
+        self.direction_persistence = np.zeros(0, dtype=np.int32)
+
+        # Movement memory as a shared ring: every ant writes the same slot each tick
+        self.memory = MovementMemoryBatch(0, self.memory_length)
+        self.stuck_timer = np.zeros(0, dtype=np.int32)  # Ant.last_stuck_check
+
+        self._obstacle_source = None
+        self._obstacle_rects = None
+        self._kernels = {}  # FFT'd influence kernels by source shape
+
+        # Optional TickProfiler; phases are only timed when one is attached
+        self.profiler = None
+
+        # Optional Recorder for pickup/delivery/stuck events (ant ids are array indices)
+        self.recorder = None
+
+        # Optional LevelOfDetail scheduler. While it runs a subset of ants, the
+        # arrays above hold just those ants: active maps them back to full
+        # indices and dt holds the ticks each one advances.
+        self.lod = None
+        self.active = None
+        self.dt = None
+
+        # Optional FlowFields that route ants heading home or back to food around obstacles
+        self.flow = None
+
+        # FoodSpots the food comes from (the Simulation's list), so ants can
+        # tell whether the spot they remember still has food
+        self.food_spots = []
+
+    def __len__(self):
+        return self.count
+
+    @classmethod
+    def from_sprites(cls, ants, nest, screen_width, screen_height, seed=None):
+        engine = cls(nest, screen_width, screen_height, seed)
+        ants = list(ants)
+        positions = np.array([(ant.position.x, ant.position.y) for ant in ants]).reshape(-1, 2)
+        soldiers = np.array([hasattr(ant, 'protection_radius') for ant in ants], dtype=bool)
+        colonies = np.array([ant.colony for ant in ants], dtype=np.int32)
+        engine.add_ants(positions[:, 0], positions[:, 1], soldiers, colonies)
+        return engine
+
+    def random_directions(self, n):
+        # Same distribution as Vector2(uniform(-1, 1), uniform(-1, 1)).normalize()
+        directions = self.rng.uniform(-1, 1, (n, 2))
+        return directions / np.maximum(np.linalg.norm(directions, axis=1, keepdims=True), 1e-12)
+
+    def add_ants(self, xs, ys, soldier=False, colony=0):
+        n = len(xs)
+        soldier = np.broadcast_to(np.asarray(soldier, dtype=bool), (n,))
+        colony = np.broadcast_to(np.asarray(colony, dtype=np.int32), (n,))
+
+        def grow(array, values):
+            return np.concatenate([array, values])
+
+        self.position = grow(self.position, np.column_stack([xs, ys]).astype(float))
+        self.velocity = grow(self.velocity, self.random_directions(n))
+        self.current_direction = grow(self.current_direction, self.random_directions(n))
+        self.last_food_position = grow(self.last_food_position, np.zeros((n, 2)))
+        self.has_last_food = grow(self.has_last_food, np.zeros(n, dtype=bool))
+        self.last_food_spot = grow(self.last_food_spot, np.full(n, -1, dtype=np.int32))
+        self.carrying_food = grow(self.carrying_food, np.zeros(n, dtype=bool))
+        self.has_found_food = grow(self.has_found_food, np.zeros(n, dtype=bool))
+        self.returning_to_food = grow(self.returning_to_food, np.zeros(n, dtype=bool))
+        self.successful_trip = grow(self.successful_trip, np.zeros(n, dtype=bool))
+        self.soldier = grow(self.soldier, soldier)
+        self.colony = grow(self.colony, colony)
+        self.color = grow(self.color, np.where(soldier, BLUE, BLACK).astype(np.int8))
+        self.exploration_bias = grow(self.exploration_bias, self.rng.uniform(0.8, 1.5, n))
+        self.pheromone_timer = grow(self.pheromone_timer, np.zeros(n, dtype=np.int32))
+        self.direction_timer = grow(self.direction_timer, np.zeros(n, dtype=np.int32))
+        self.direction_persistence = grow(self.direction_persistence,
+                                          self.rng.integers(30, 61, n, dtype=np.int32))
+        self.memory.grow(n)
+        self.stuck_timer = grow(self.stuck_timer, np.zeros(n, dtype=np.int32))
+        self.count += n
+
+    def nest_positions(self):
+        # (x, y) of every colony's nest, indexed by colony
+        return np.array([(nest.position.x, nest.position.y) for nest in self.nests], dtype=float).reshape(-1, 2)
+
+    def obstacle_rects(self, obstacles):
+        # Obstacles never move, so their rects are only unpacked when the group changes
+        key = (id(obstacles), len(obstacles))
+        if self._obstacle_source != key:
+            rects = [o.rect for o in obstacles]
+            self._obstacle_rects = np.array([(r.left, r.top, r.right, r.bottom) for r in rects],
+                                            dtype=float).reshape(-1, 4)
+            self._obstacle_source = key
+        return self._obstacle_rects
+
+    def blocked(self, points, obstacles):
+        # Vectorized Rect.collidepoint over every obstacle, chunked to bound memory
+        if isinstance(obstacles, ObstacleMap):
+            return obstacles.blocked_many(points)
+        rects = self.obstacle_rects(obstacles)
+        hit = np.zeros(len(points), dtype=bool)
+        if len(rects) == 0 or len(points) == 0:
+            return hit
+        x = np.floor(points[:, 0:1])
+        y = np.floor(points[:, 1:2])
+        chunk = max(1, 2_000_000 // len(rects))
+        for start in range(0, len(points), chunk):
+            stop = start + chunk
+            inside = ((x[start:stop] >= rects[:, 0]) & (x[start:stop] < rects[:, 2]) &
+                      (y[start:stop] >= rects[:, 1]) & (y[start:stop] < rects[:, 3]))
+            hit[start:stop] = inside.any(axis=1)
+        return hit
+
+    def avoid_baked(self, obstacle_map, positions):
+        # ObstacleMap.avoidance for the ants at positions
+        rows, cols, valid = obstacle_map.lookup(positions)
+        force = np.where(valid[:, None], obstacle_map.repulsion[rows, cols], 0).astype(float)
+        distance = np.where(valid, obstacle_map.distance[rows, cols], obstacle_map.touch_distance)
+        inside = distance <= 0
+        touching = ~inside & (distance < obstacle_map.touch_distance)
+        force[touching] += normalize(obstacle_map.gradient[rows[touching], cols[touching]].astype(float)) * self.max_force * 3
+        force[inside] += self.random_directions(int(inside.sum())) * self.max_force * 2
+        return clamp_magnitude(force, self.max_force)
+
+    def avoid_obstacles(self, obstacles):
+        # Steering.avoid_obstacles for all ants
+        if isinstance(obstacles, TiledObstacleMap):
+            force = np.zeros((self.count, 2))
+            for tile, indices in obstacles.split(self.position):
+                force[indices] = self.avoid_baked(tile, self.position[indices])
+            return force
+        if isinstance(obstacles, ObstacleMap):
+            return self.avoid_baked(obstacles, self.position)
+        rects = self.obstacle_rects(obstacles)
+        force = np.zeros((self.count, 2))
+        if len(rects) == 0:
+            return force
+        centers = np.column_stack([(rects[:, 0] + rects[:, 2]) / 2, (rects[:, 1] + rects[:, 3]) / 2])
+        widths = rects[:, 2] - rects[:, 0]
+        chunk = max(1, 2_000_000 // len(rects))
+        for start in range(0, self.count, chunk):
+            pos = self.position[start:start + chunk]
+            px, py = pos[:, 0:1], pos[:, 1:2]
+            to_center_x = centers[:, 0] - px
+            to_center_y = centers[:, 1] - py
+            distance = np.hypot(to_center_x, to_center_y)
+            to_edge_x = np.clip(px, rects[:, 0], rects[:, 2]) - px
+            to_edge_y = np.clip(py, rects[:, 1], rects[:, 3]) - py
+            edge_distance = np.hypot(to_edge_x, to_edge_y)
+
+            touching = edge_distance < self.size / 2 + 1
+            inside = touching & (edge_distance == 0)
+            near = ~touching & (distance < self.avoid_radius + widths / 2)
+
+            safe_edge = np.where(edge_distance > 0, edge_distance, 1)
+            safe_center = np.where(distance > 0, distance, 1)
+            push = (self.avoid_radius - distance) / self.avoid_radius / safe_center
+            fx = np.where(touching & ~inside, -to_edge_x / safe_edge * self.max_force * 3, 0)
+            fy = np.where(touching & ~inside, -to_edge_y / safe_edge * self.max_force * 3, 0)
+            fx += np.where(near, -to_center_x * push, 0)
+            fy += np.where(near, -to_center_y * push, 0)
+            force[start:start + chunk, 0] = fx.sum(axis=1)
+            force[start:start + chunk, 1] = fy.sum(axis=1)
+
+            stuck_inside = inside.sum(axis=1)
+            for i in np.nonzero(stuck_inside)[0]:
+                jolt = self.random_directions(stuck_inside[i]) * self.max_force * 2
+                force[start + i] += jolt.sum(axis=0)
+        return clamp_magnitude(force, self.max_force)
+
+    def wander(self):
+        # Steering.wander for all ants
+        wander_point = self.random_directions(self.count) * 30
+        target = self.position + normalize(self.velocity) * 50 + wander_point
+        desired = normalize(target - self.position) * self.max_speed
+        return clamp_magnitude(desired - self.velocity, self.max_force)
+
+    def food_near(self, foods, points, reach):
+        # (point, item) index pairs of food items that may lie within reach of
+        # the points, with the items and rects (left, top, right, bottom) the
+        # item indices refer to. FoodGroups only look in the cells around each
+        # point, so the cost follows the food near the ants rather than all of
+        # it; other groups pair every point with every item.
+        near = getattr(foods, 'near', None)
+        if near is not None:
+            rows, cols = near(points, reach)
+            return rows, cols, foods.slot_items, foods.slot_rects
+        items = list(foods)
+        rects = np.array([(f.rect.left, f.rect.top, f.rect.right, f.rect.bottom) for f in items],
+                         dtype=float).reshape(-1, 4)
+        rows, cols = np.divmod(np.arange(len(points) * len(items)), max(len(items), 1))
+        return rows, cols, items, rects
+
+    def handle_food_collection(self, foods):
+        free = np.nonzero(~self.carrying_food)[0]
+        if len(free) == 0:
+            return
+        rows, cols, items, rects = self.food_near(foods, self.position[free], self.size + 6)
+        left = np.floor(self.position[free[rows], 0]) - self.size // 2
+        top = np.floor(self.position[free[rows], 1]) - self.size // 2
+        rects = rects[cols]
+        hits = ((left < rects[:, 2]) & (rects[:, 0] < left + self.size) &
+                (top < rects[:, 3]) & (rects[:, 1] < top + self.size))
+        if not hits.any():
+            return
+        # By ant, then by item in the order they were added
+        rows, cols = rows[hits], cols[hits]
+        order = np.lexsort((cols, rows))
+        alive = np.ones(len(items), dtype=bool)
+        spot_index = {spot: i for i, spot in enumerate(self.food_spots)}
+        picked = []
+        previous = -1
+        for row, col in zip(rows[order].tolist(), cols[order].tolist()):
+            if row == previous or not alive[col]:
+                continue
+            previous = row
+            index = free[row]
+            food = items[col]
+            self.carrying_food[index] = True
+            self.has_found_food[index] = True
+            self.last_food_position[index] = (food.position.x, food.position.y)
+            self.has_last_food[index] = True
+            self.last_food_spot[index] = spot_index.get(food.spot, -1)
+            self.returning_to_food[index] = False
+            self.color[index] = RED
+            picked.append((self.ant_ids(index), food.position.x, food.position.y))
+            if food.reduce_amount():
+                foods.remove(food)
+                alive[col] = False
+        if self.recorder is not None and picked:
+            indices, xs, ys = zip(*picked)
+            self.recorder.events('pickup', indices, xs, ys)
+
+    def touching_food(self, foods, points):
+        # Whether each of the (n, 2) points lies inside a food item's rect
+        rows, cols, _, rects = self.food_near(foods, points, 1)
+        rects = rects[cols]
+        x, y = np.floor(points[rows, 0]), np.floor(points[rows, 1])
+        inside = (x >= rects[:, 0]) & (x < rects[:, 2]) & (y >= rects[:, 1]) & (y < rects[:, 3])
+        touching = np.zeros(len(points), dtype=bool)
+        touching[rows[inside]] = True
+        return touching
+
+    def handle_food_delivery(self):
+        to_nest = self.position - self.nest_positions()[self.colony]
+        delivered = self.carrying_food & (np.hypot(to_nest[:, 0], to_nest[:, 1]) < self.nest_radius)
+        count = int(delivered.sum())
+        if count:
+            self.carrying_food[delivered] = False
+            per_colony = np.bincount(self.colony[delivered], minlength=len(self.nests))
+            for colony in np.nonzero(per_colony)[0].tolist():
+                stored = int(per_colony[colony])
+                self.nests[colony].store_food(stored, trips=stored)
+            self.color[delivered] = BLACK
+            self.successful_trip[delivered] = True
+            self.returning_to_food[delivered] = True
+            self.exploration_bias[delivered] = 0.3
+            if self.recorder is not None:
+                indices = np.nonzero(delivered)[0]
+                self.recorder.events('delivery', self.ant_ids(indices).tolist(), self.position[indices, 0].tolist(),
+                                     self.position[indices, 1].tolist())
+
+    def drop_pheromones(self, pheromones, dt):
+        # A drop due partway through a dt-tick update still happens, and the
+        # ticks after it count toward the next one
+        dropping = self.pheromone_timer < dt
+        late = (dt - 1 - self.pheromone_timer)[dropping]
+        self.pheromone_timer[~dropping] -= dt[~dropping]
+        self.pheromone_timer[dropping] = self.pheromone_drop_interval - late
+        if not dropping.any():
+            return
+        strength = np.select(
+            [self.carrying_food, self.successful_trip & self.returning_to_food, self.has_found_food],
+            [300, 200, 100], default=20)[dropping]
+        xs, ys = self.position[dropping, 0], self.position[dropping, 1]
+        colonies = self.colony[dropping]
+        if isinstance(pheromones, PheromoneField):
+            # One batched deposit per colony channel
+            for colony in np.unique(colonies).tolist():
+                mine = colonies == colony
+                pheromones.deposit_many(xs[mine], ys[mine], strength[mine], self.channels[colony])
+        else:
+            pheromones.extend(Pheromone(x, y, s, self.channels[c])
+                              for x, y, s, c in zip(xs, ys, strength, colonies.tolist()))
+
+    def update_movement_memory(self):
+        self.memory.push(self.position)
+
+    def is_stuck(self, dt):
+        # Only ants whose stuck_check_interval is up are checked this tick
+        self.stuck_timer += dt
+        due = self.stuck_timer >= self.stuck_check_interval
+        self.stuck_timer[due] = 0
+        full = self.memory.full if self.active is None else self.memory.full[self.active]
+        checked = np.nonzero(due & full)[0]
+        stuck = np.zeros(self.count, dtype=bool)
+        stuck[checked] = self.memory.spread(self.ant_ids(checked)) < self.stuck_threshold
+        return stuck
+
+    def ant_ids(self, indices):
+        # Full-colony indices of ants in the arrays being stepped
+        return indices if self.active is None else self.active[indices]
+
+    def influence_kernel(self, field, rows, cols):
+        # Ant.calculate_pheromone_influence weighs deposits by strength / distance
+        # between 10 and perception_radius; as a kernel over cell offsets, in the
+        # frequency domain for a rows x cols source
+        key = (rows, cols, field.cell_size, self.perception_radius)
+        kernel = self._kernels.get(key)
+        if kernel is None:
+            reach = self.influence_reach(field)
+            dy, dx = np.mgrid[-reach:reach + 1, -reach:reach + 1]
+            distance = np.hypot(dx, dy) * field.cell_size
+            weights = np.where((distance < self.perception_radius) & (distance >= 10),
+                               1 / np.maximum(distance, 1), 0)
+            shape = (rows + 2 * reach, cols + 2 * reach)
+            kernel = (shape, np.fft.rfft2(weights, shape))
+            if len(self._kernels) >= 64:
+                self._kernels.clear()
+            self._kernels[key] = kernel
+        return kernel
+
+    def influence_reach(self, field):
+        return int(math.ceil(self.perception_radius / field.cell_size))
+
+    def convolve_influence(self, field, layer, cell_x, cell_y, crop):
+        # Weighted pheromone sums (total, x, y) seen from every cell of layer;
+        # crop is the margin of layer that only serves as context
+        rows, cols = layer.shape
+        shape, kernel = self.influence_kernel(field, rows, cols)
+        reach = self.influence_reach(field)
+        start = reach + crop
+        # The three sources go through one batched FFT
+        sources = np.stack([layer, layer * cell_x, layer * cell_y[:, None]])
+        full = np.fft.irfft2(np.fft.rfft2(sources, shape) * kernel, shape)
+        return list(full[:, start:start + rows - 2 * crop, start:start + cols - 2 * crop])
+
+    def influence_maps(self, field, channel='food'):
+        # Weighted pheromone centroid seen from every cell, via three FFT
+        # convolutions, so the per-ant cost is a single lookup. The per-deposit
+        # uniform(1, 1.5) jitter and the x15 weight for carrying ants scale all
+        # weights alike and drop out of the centroid, so they are not applied.
+        layer = field.grid[field.type_index[channel]].astype(float)
+        return self.convolve_influence(field, layer, field.cell_x, field.cell_y, 0)
+
+    def window_centers(self, field, layer_index, rows, cols):
+        # Weighted pheromone centroid seen from the given cells, convolving only
+        # the window of the layer that spans them plus a margin of
+        # perception_radius, so the cost follows where the ants are rather
+        # than the size of the world
+        reach = self.influence_reach(field)
+        center = np.zeros((len(rows), 2))
+        has = np.zeros(len(rows), dtype=bool)
+        r0, r1 = max(int(rows.min()) - reach, 0), min(int(rows.max()) + reach + 1, field.rows)
+        c0, c1 = max(int(cols.min()) - reach, 0), min(int(cols.max()) + reach + 1, field.cols)
+        window = field.window(layer_index, r0, r1, c0, c1)
+        if not window.any():
+            return center, has
+        # Padded so the FFT size is a multiple of 32 cells (fast, and kernels
+        # can be reused); the padding is beyond every cell's reach
+        pad = 2 * reach
+        layer = np.zeros((-(-(r1 - r0 + pad) // 32) * 32 - pad, -(-(c1 - c0 + pad) // 32) * 32 - pad))
+        layer[:r1 - r0, :c1 - c0] = window
+        cell_x = (np.arange(c0, c0 + layer.shape[1]) + 0.5) * field.cell_size
+        cell_y = (np.arange(r0, r0 + layer.shape[0]) + 0.5) * field.cell_size
+        total, weighted_x, weighted_y = self.convolve_influence(field, layer, cell_x, cell_y, 0)
+        local_rows, local_cols = rows - r0, cols - c0
+        total = total[local_rows, local_cols]
+        has = total > 1e-9
+        center = np.column_stack([weighted_x[local_rows, local_cols], weighted_y[local_rows, local_cols]])
+        center[has] /= total[has, None]
+        return center, has
+
+    def window_cost(self, field, rows, cols):
+        # FFT area window_centers would use for these cells
+        reach = self.influence_reach(field)
+        height = -(-(int(rows.max() - rows.min()) + 1 + 4 * reach) // 32) * 32
+        width = -(-(int(cols.max() - cols.min()) + 1 + 4 * reach) // 32) * 32
+        return height * width
+
+    def colony_centers(self, indices, field):
+        # influence_maps with several colonies, one window per colony around
+        # its own followers instead of a full-world map per colony
+        rows = np.clip((self.position[indices, 1] // field.cell_size).astype(np.intp), 0, field.rows - 1)
+        cols = np.clip((self.position[indices, 0] // field.cell_size).astype(np.intp), 0, field.cols - 1)
+        center = np.zeros((len(indices), 2))
+        has = np.zeros(len(indices), dtype=bool)
+        colonies = self.colony[indices]
+        for colony in np.unique(colonies).tolist():
+            mine = np.nonzero(colonies == colony)[0]
+            center[mine], has[mine] = self.window_centers(field, field.type_index[self.channels[colony]],
+                                                          rows[mine], cols[mine])
+        return center, has
+
+    def tiled_centers(self, indices, field):
+        # influence_maps for a TiledPheromoneField, per colony: one window
+        # around all of its followers when they are close together, otherwise
+        # one tile (plus a margin of perception_radius from its neighbours) at
+        # a time, only where the colony's ants are
+        size = field.tile_cells
+        reach = self.influence_reach(field)
+        rows = np.clip((self.position[indices, 1] // field.cell_size).astype(np.intp), 0, field.rows - 1)
+        cols = np.clip((self.position[indices, 0] // field.cell_size).astype(np.intp), 0, field.cols - 1)
+        center = np.zeros((len(indices), 2))
+        has = np.zeros(len(indices), dtype=bool)
+        colonies = self.colony[indices]
+        for colony in np.unique(colonies).tolist():
+            ants = np.nonzero(colonies == colony)[0]
+            layer_index = field.type_index[self.channels[colony]]
+            keys = (rows[ants] // size) * field.cols + cols[ants] // size
+            tiles = np.unique(keys)
+            if self.window_cost(field, rows[ants], cols[ants]) < len(tiles) * (size + 4 * reach) ** 2:
+                center[ants], has[ants] = self.window_centers(field, layer_index, rows[ants], cols[ants])
+                continue
+            for key in tiles.tolist():
+                mine = ants[keys == key]
+                top, left = (key // field.cols) * size, (key % field.cols) * size
+                r0, r1 = top - reach, top + size + reach
+                c0, c1 = left - reach, left + size + reach
+                # Window rows/cols outside the world stay zero
+                layer = np.zeros((r1 - r0, c1 - c0))
+                a0, a1 = max(r0, 0), min(r1, field.rows)
+                b0, b1 = max(c0, 0), min(c1, field.cols)
+                layer[a0 - r0:a1 - r0, b0 - c0:b1 - c0] = field.window(layer_index, a0, a1, b0, b1)
+                if not layer.any():
+                    continue
+                cell_x = (np.arange(c0, c1) + 0.5) * field.cell_size
+                cell_y = (np.arange(r0, r1) + 0.5) * field.cell_size
+                total, weighted_x, weighted_y = self.convolve_influence(field, layer, cell_x, cell_y, reach)
+                local_rows, local_cols = rows[mine] - top, cols[mine] - left
+                total = total[local_rows, local_cols]
+                seen = total > 1e-9
+                part = np.column_stack([weighted_x[local_rows, local_cols], weighted_y[local_rows, local_cols]])
+                part[seen] /= total[seen, None]
+                center[mine] = part
+                has[mine] = seen
+        return center, has
+
+    def headings(self, indices, groups, targets, offsets):
+        # Unit directions for the ants at indices (offsets = target - position):
+        # along the flow field toward targets[group].position (a nest or food
+        # spot) where an obstacle is in the way, else straight. Ants in group
+        # -1 always go straight.
+        directions = normalize(offsets)
+        if self.flow is None or len(indices) == 0:
+            return directions
+        for group in np.unique(groups[groups >= 0]):
+            members = np.nonzero(groups == group)[0]
+            steps, follow = self.flow.field(targets[group].position).steer_many(self.position[indices[members]])
+            directions[members[follow]] = steps[follow]
+        return directions
+
+    def pheromone_centers(self, indices, pheromones):
+        # Weighted pheromone centroid around each ant and whether it saw any
+        if isinstance(pheromones, TiledPheromoneField):
+            return self.tiled_centers(indices, pheromones)
+        if isinstance(pheromones, PheromoneField) and len(self.nests) > 1:
+            return self.colony_centers(indices, pheromones)
+        if isinstance(pheromones, PheromoneField):
+            total, weighted_x, weighted_y = self.influence_maps(pheromones)
+            rows = np.clip((self.position[indices, 1] // pheromones.cell_size).astype(np.intp),
+                           0, pheromones.rows - 1)
+            cols = np.clip((self.position[indices, 0] // pheromones.cell_size).astype(np.intp),
+                           0, pheromones.cols - 1)
+            total = total[rows, cols]
+            has = total > 1e-9
+            center = np.column_stack([weighted_x[rows, cols], weighted_y[rows, cols]])
+            center[has] /= total[has, None]
+            return center, has
+
+        # Plain pheromone lists are split by channel, then compared against
+        # every ant of that colony in chunks
+        pheromones = list(pheromones)
+        center = np.zeros((len(indices), 2))
+        has = np.zeros(len(indices), dtype=bool)
+        colonies = self.colony[indices]
+        for colony in np.unique(colonies).tolist():
+            mine = np.nonzero(colonies == colony)[0]
+            channel = [p for p in pheromones if p.type == self.channels[colony]]
+            center[mine], has[mine] = self.list_centers(indices[mine], channel)
+        return center, has
+
+    def list_centers(self, indices, pheromones):
+        xs = np.array([p.position.x for p in pheromones], dtype=float)
+        ys = np.array([p.position.y for p in pheromones], dtype=float)
+        strengths = np.array([p.strength for p in pheromones], dtype=float)
+        center = np.zeros((len(indices), 2))
+        has = np.zeros(len(indices), dtype=bool)
+        if len(pheromones) == 0:
+            return center, has
+        chunk = max(1, 2_000_000 // len(pheromones))
+        for start in range(0, len(indices), chunk):
+            batch = indices[start:start + chunk]
+            distance = np.hypot(xs - self.position[batch, 0:1], ys - self.position[batch, 1:2])
+            use = (distance < self.perception_radius) & (distance >= 10)
+            weights = np.where(use, strengths / np.maximum(distance, 1), 0)
+            weights[use] *= self.rng.uniform(1, 1.5, int(use.sum()))
+            total = weights.sum(axis=1)
+            seen = total > 0
+            part = np.column_stack([(weights * xs).sum(axis=1), (weights * ys).sum(axis=1)])
+            part[seen] /= total[seen, None]
+            center[start:start + chunk] = part
+            has[start:start + chunk] = seen
+        return center, has
+
+    def pheromone_influence(self, indices, pheromones):
+        # Ant.calculate_pheromone_influence for the given ants
+        influence = np.zeros((len(indices), 2))
+        if len(indices) == 0:
+            return influence
+        center, has = self.pheromone_centers(indices, pheromones)
+        direction = center - self.position[indices]
+        moved = has & (np.hypot(direction[:, 0], direction[:, 1]) > 0)
+        direction = normalize(direction) + self.rng.uniform(-0.3, 0.3, direction.shape)
+        influence[moved] = normalize(direction)[moved]
+        return influence
+
+    def step(self, obstacles, foods, pheromones, dt=1):
+        # One step of dt ticks (see Simulation.step)
+        if self.count == 0:
+            return
+        # Every ant records where it is, including ants the scheduler skips
+        self.update_movement_memory()
+        if self.lod is None:
+            if dt != 1:
+                self.dt = np.full(self.count, dt, dtype=np.int32)
+            try:
+                self.advance(obstacles, foods, pheromones)
+            finally:
+                self.dt = None
+            return
+
+        step = dt
+        active, dt = self.lod.plan(self.position, self.carrying_food, self.returning_to_food,
+                                   self.nest_positions()[self.colony], obstacles, foods, self.max_speed * step,
+                                   self.nest_radius)
+        if len(active) == 0:
+            return
+        # Step only the due ants, by gathering their state and scattering it back
+        full = {name: getattr(self, name) for name in ANT_ARRAYS}
+        for name, array in full.items():
+            setattr(self, name, array[active])
+        self.count, self.active, self.dt = len(active), active, (dt * step).astype(np.int32)
+        try:
+            self.advance(obstacles, foods, pheromones)
+        finally:
+            for name, array in full.items():
+                array[active] = getattr(self, name)
+                setattr(self, name, array)
+            self.count, self.active, self.dt = len(full['position']), None, None
+
+    def advance(self, obstacles, foods, pheromones):
+        # One update of every ant in the arrays, each moving dt ticks ahead
+        rng = self.rng
+        n = self.count
+        dt = self.dt if self.dt is not None else np.ones(n, dtype=np.int32)
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.lap()
+
+        self.handle_food_collection(foods)
+        self.handle_food_delivery()
+        if profiler is not None:
+            profiler.lap('ants.food')
+        self.drop_pheromones(pheromones, dt)
+        if profiler is not None:
+            profiler.lap('ants.pheromone_drop')
+
+        # Direction persistence
+        self.direction_timer += dt
+        renew = self.direction_timer >= self.direction_persistence
+        if renew.any():
+            k = int(renew.sum())
+            self.direction_timer[renew] = 0
+            self.direction_persistence[renew] = rng.integers(30, 61, k)
+            self.current_direction[renew] = self.random_directions(k)
+
+        wander_force = self.wander()
+        avoid_force = self.avoid_obstacles(obstacles) * 2
+        if profiler is not None:
+            profiler.lap('ants.steering')
+
+        # Movement force per state
+        movement_force = np.zeros((n, 2))
+        carrying = self.carrying_food
+        nest_xy = self.nest_positions()[self.colony]
+        to_nest = nest_xy - self.position
+        heading_home = carrying & (np.hypot(to_nest[:, 0], to_nest[:, 1]) > 0)
+        home = np.nonzero(heading_home)[0]
+        movement_force[home] = (self.headings(home, self.colony[home], self.nests, to_nest[home]) * 2.0 +
+                                rng.uniform(-0.1, 0.1, (len(home), 2)))
+
+        returning = ~carrying & self.returning_to_food & self.has_last_food
+        to_food = self.last_food_position - self.position
+        food_distance = np.hypot(to_food[:, 0], to_food[:, 1])
+        heading_food = returning & (food_distance > 0)
+        back = np.nonzero(heading_food)[0]
+        movement_force[back] = (self.headings(back, self.last_food_spot[back], self.food_spots, to_food[back]) * 1.5 +
+                                rng.uniform(-0.2, 0.2, (len(back), 2)))
+
+        # Give up once the spot is empty, or on arriving to find no food
+        give_up = np.zeros(n, dtype=bool)
+        stocked = np.array([spot.has_food() for spot in self.food_spots] + [True])  # Last entry: spot unknown
+        give_up[back] = ~stocked[self.last_food_spot[back]]
+        arrived = np.nonzero(heading_food & (food_distance < 20))[0]
+        if len(arrived):
+            give_up[arrived[~self.touching_food(foods, self.position[arrived])]] = True
+        exhausted = np.nonzero(give_up)[0]
+        self.returning_to_food[exhausted] = False
+        self.exploration_bias[exhausted] = rng.uniform(0.6, 0.9, len(exhausted))
+
+        following = ~carrying & ~returning
+        follow_idx = np.nonzero(following)[0]
+        movement_force[follow_idx] = (self.pheromone_influence(follow_idx, pheromones) *
+                                      np.where(self.has_found_food[follow_idx], 1.2, 0.4)[:, None])
+        if profiler is not None:
+            profiler.lap('ants.pheromone_influence')
+
+        # Stuck in circles
+        stuck = self.is_stuck(dt) & ~carrying
+        if stuck.any():
+            k = int(stuck.sum())
+            if self.recorder is not None:
+                indices = np.nonzero(stuck)[0]
+                self.recorder.events('stuck', self.ant_ids(indices).tolist(), self.position[indices, 0].tolist(),
+                                     self.position[indices, 1].tolist())
+            self.current_direction[stuck] = self.random_directions(k)
+            self.exploration_bias[stuck] = np.minimum(self.exploration_bias[stuck] * 1.5, 0.9)
+            wander_force[stuck] = self.current_direction[stuck] * 2.0
+            movement_force[stuck] *= 0.2
+
+        idle = ~carrying & ~self.returning_to_food
+        self.exploration_bias[idle] = rng.uniform(1.0, 1.5, int(idle.sum()))
+        self.exploration_bias[~idle & self.successful_trip] = 0.3
+
+        # Combine forces
+        direction_weight = np.where(carrying, 0.3, np.where(self.returning_to_food, 0.5, 0.4))
+        movement_weight = np.where(carrying, 2.0, np.where(self.returning_to_food, 1.5,
+                                   np.where(self.has_found_food, 0.8, 0.3)))
+        wander_weight = np.where(idle, self.exploration_bias, 0.0)
+        wander = wander_force * wander_weight[:, None]
+        steering = (wander + avoid_force +
+                    movement_force * movement_weight[:, None] +
+                    self.current_direction * direction_weight[:, None])
+        if self.dt is not None:
+            # dt ticks of steering in one update: the steady pulls act dt
+            # times, while dt random turns only spread like sqrt(dt) of them
+            scaled = dt != 1
+            steering[scaled] = ((steering - wander)[scaled] * dt[scaled, None] +
+                                wander[scaled] * np.sqrt(dt[scaled])[:, None])
+
+        # Update velocity
+        self.velocity += steering
+        moving = np.hypot(self.velocity[:, 0], self.velocity[:, 1]) > 0
+        self.velocity[moving] = (normalize(self.velocity[moving]) * self.max_speed +
+                                 rng.uniform(-0.1, 0.1, (int(moving.sum()), 2)))
+
+        if profiler is not None:
+            profiler.lap('ants.steering')
+
+        # Move with collision checking; blocked ants probe 36 headings
+        new_position = self.position + self.velocity * dt[:, None]
+        advance = np.ones(n, dtype=bool)
+        colliding = np.nonzero(self.blocked(new_position, obstacles))[0]
+        if len(colliding):
+            angles = np.radians(np.arange(0, 360, 10))
+            probes = np.column_stack([np.cos(angles), np.sin(angles)]) * self.max_speed
+            tests = self.position[colliding, None, :] + probes[None, :, :]
+            free = ~self.blocked(tests.reshape(-1, 2), obstacles).reshape(len(colliding), len(angles))
+            escaped = free.any(axis=1)
+            first = free.argmax(axis=1)
+            self.velocity[colliding[escaped]] = probes[first[escaped]]
+            new_position[colliding[escaped]] = tests[escaped, first[escaped]]
+            advance[colliding[~escaped]] = False
+        self.position[advance] = new_position[advance]
+        self.position[advance, 0] %= self.screen_width
+        self.position[advance, 1] %= self.screen_height
+        if profiler is not None:
+            profiler.lap('ants.collision')
+
+        # Soldiers: the nearest ant a soldier finds is always itself (distance 0),
+        # so SoldierAnt.update reduces to pulling strays back toward the nest
+        to_nest = nest_xy - self.position
+        nest_distance = np.hypot(to_nest[:, 0], to_nest[:, 1])
+        strays = self.soldier & (nest_distance >= self.max_distance_from_nest)
+        self.position[strays] += normalize(to_nest[strays]) * self.max_speed * 0.5 * dt[strays, None]
+        if profiler is not None:
+            profiler.lap('ants.soldier')
+
+    def image(self, color):
+        return shared_image((self.size, self.size), COLORS[color])
+
+    def draw(self, surface, view=None):
+        # With a view (world Rect drawn onto surface at its top-left corner)
+        # only the ants inside it are blitted
+        half = self.size // 2
+        topleft = np.floor(self.position).astype(int) - half
+        colors = self.color
+        if view is not None:
+            visible = ((topleft[:, 0] > view.left - self.size) & (topleft[:, 0] < view.right) &
+                       (topleft[:, 1] > view.top - self.size) & (topleft[:, 1] < view.bottom))
+            topleft = topleft[visible] - (view.left, view.top)
+            colors = colors[visible]
+        images = [self.image(c) for c in (BLACK, RED, BLUE)]
+        surface.blits([(images[c], (x, y)) for c, (x, y) in zip(colors.tolist(), topleft.tolist())],
+                      doreturn=False)
+
+def normalize(vectors):
+    lengths = np.hypot(vectors[:, 0], vectors[:, 1])[:, None]
+    return np.divide(vectors, lengths, out=np.zeros_like(vectors), where=lengths > 0)
+
+def clamp_magnitude(vectors, max_length):
+    lengths = np.hypot(vectors[:, 0], vectors[:, 1])[:, None]
+    scale = np.where(lengths > max_length, max_length / np.maximum(lengths, 1e-12), 1.0)
+    return vectors * scale
@@ -0,0 +1,207 @@
+# dirty_rects.py
+import numpy as np
+import pygame
+from camera import blit_visible
+from entity import blit_all
+
+class DirtyRenderer:
+    # Draws the simulation into a window that shows the whole world, but only
+    # repaints the tiles that changed since the last frame. Background, food
+    # spot areas and obstacles are painted once into a cached static layer.
+    # Each frame, the tiles under ants that moved (where they were and where
+    # they are) and under food that appeared or ran out are repainted from
+    # it; every pheromone_interval frames so are the tiles whose pheromone
+    # cells changed their drawn level. draw() returns the rects it repainted,
+    # for pygame.display.update().
+    def __init__(self, sim, tile_size=40, pheromone_interval=10):
+        self.sim = sim
+        self.tile_size = tile_size
+        self.pheromone_interval = pheromone_interval
+        self.bounds = pygame.Rect(0, 0, sim.screen_width, sim.screen_height)
+        self.rows = -(-sim.screen_height // tile_size)
+        self.cols = -(-sim.screen_width // tile_size)
+        self.dirty = np.zeros((self.rows, self.cols), dtype=bool)
+        self.full = True  # Repaint everything on the next frame
+        self.frames = 0
+
+        self.static = None
+        self.static_key = None  # Obstacle and food spot counts the static layer was painted with
+        self.ant_rects = np.zeros((0, 4), dtype=int)  # left, top, right, bottom as last drawn
+        self.ant_colors = np.zeros(0, dtype=int)
+        self.food = set()
+        self.food_version = None
+        self.levels = None  # Pheromone levels (or deposit positions) as last checked
+
+    def invalidate(self, *rects):
+        # Repaint these screen rects on the next frame (everything without any),
+        # e.g. where text was drawn over the simulation
+        if not rects:
+            self.full = True
+        for rect in rects:
+            rect = rect.clip(self.bounds)
+            if rect.width and rect.height:
+                self.dirty[rect.top // self.tile_size:(rect.bottom - 1) // self.tile_size + 1,
+                           rect.left // self.tile_size:(rect.right - 1) // self.tile_size + 1] = True
+
+    def mark(self, rects):
+        # Flags the tiles under (n, 4) left, top, right, bottom rects, none of
+        # them wider or taller than a tile, so their corners cover them
+        if len(rects) == 0:
+            return
+        c0 = np.clip(rects[:, 0] // self.tile_size, 0, self.cols - 1)
+        c1 = np.clip((rects[:, 2] - 1) // self.tile_size, 0, self.cols - 1)
+        r0 = np.clip(rects[:, 1] // self.tile_size, 0, self.rows - 1)
+        r1 = np.clip((rects[:, 3] - 1) // self.tile_size, 0, self.rows - 1)
+        for rows in (r0, r1):
+            for cols in (c0, c1):
+                self.dirty[rows, cols] = True
+
+    def current_ants(self):
+        # (rects, color codes, images) of every ant, in drawing order
+        engine = self.sim.engine
+        if engine is not None:
+            topleft = np.floor(engine.position).astype(int) - engine.size // 2
+            colors = engine.color.astype(int)
+            images = [engine.image(color) for color in range(colors.max(initial=0) + 1)]
+            return np.column_stack([topleft, topleft + engine.size]), colors, [images[c] for c in colors.tolist()]
+        ants = self.sim.ants.sprites()
+        rects = np.array([(a.rect.left, a.rect.top, a.rect.right, a.rect.bottom) for a in ants],
+                         dtype=int).reshape(-1, 4)
+        return rects, np.array([a.color for a in ants], dtype=int), [a.image for a in ants]
+
+    def mark_ants(self, rects, colors):
+        # Ants that moved or changed color, where they were drawn and where they are
+        previous = self.ant_rects
+        if len(previous) == len(rects):
+            changed = (previous != rects).any(axis=1) | (self.ant_colors != colors)
+            self.mark(previous[changed])
+            self.mark(rects[changed])
+        else:
+            self.mark(previous)
+            self.mark(rects)
+        self.ant_rects = rects
+        self.ant_colors = colors
+
+    def mark_food(self):
+        foods = self.sim.foods
+        if foods.version == self.food_version:
+            return
+        current = set(foods)
+        changed = current ^ self.food
+        self.mark(np.array([(f.rect.left, f.rect.top, f.rect.right, f.rect.bottom) for f in changed],
+                           dtype=int).reshape(-1, 4))
+        self.food = current
+        self.food_version = foods.version
+
+    def mark_pheromones(self):
+        pheromones = self.sim.pheromones
+        if hasattr(pheromones, 'levels'):
+            # Grid models: cells whose drawn color changed
+            levels = np.stack(pheromones.levels())
+            if self.levels is not None and self.levels.shape == levels.shape:
+                rows, cols = np.nonzero((levels != self.levels).any(axis=0))
+                size = pheromones.cell_size
+                self.mark(np.column_stack([cols * size, rows * size, (cols + 1) * size, (rows + 1) * size]))
+            self.levels = levels
+        else:
+            # PheromoneList: every deposit fades, so the dots now and those last checked
+            positions = np.array([(p.position.x, p.position.y) for p in pheromones], dtype=int).reshape(-1, 2)
+            dots = np.column_stack([positions - 2, positions + 2])
+            if self.levels is not None:
+                self.mark(self.levels)
+            self.mark(dots)
+            self.levels = dots
+
+    def build_static(self):
+        sim = self.sim
+        static = pygame.Surface(self.bounds.size)
+        static.fill((255, 255, 255))  # White background
+        for spot in sim.food_spots:
+            spot.draw(static)
+        blit_all(static, sim.obstacles)
+        return static
+
+    def regions(self):
+        # Dirty tiles merged into rects: runs along each row, then runs that
+        # line up with the one above
+        rects = []
+        above = {}  # (first, last column) -> rect ending on the row above
+        for row in range(self.rows):
+            flags = np.concatenate([[False], self.dirty[row], [False]])
+            edges = np.flatnonzero(flags[1:] != flags[:-1]).tolist()
+            runs = {}
+            for start, end in zip(edges[::2], edges[1::2]):
+                rect = above.get((start, end))
+                if rect is not None:
+                    rect.height += self.tile_size
+                else:
+                    rect = pygame.Rect(start * self.tile_size, row * self.tile_size,
+                                       (end - start) * self.tile_size, self.tile_size)
+                    rects.append(rect)
+                runs[(start, end)] = rect
+            above = runs
+        return [rect.clip(self.bounds) for rect in rects]
+
+    def paint(self, surface, rect):
+        # Everything under the ants, as Simulation.draw layers it
+        sim = self.sim
+        surface.blit(self.static, rect, rect)
+        canvas = surface.subsurface(rect)
+        sim.pheromones.draw(canvas, rect)
+        blit_visible(canvas, sim.obstacles, rect, padding=20)  # Back on top of trails
+        blit_visible(canvas, sim.foods, rect, padding=5)
+        blit_visible(canvas, sim.nest_group, rect)
+
+    def draw_ants(self, surface, rects, ant_rects, images):
+        # Ants over the repainted regions, each clipped to the regions it overlaps
+        owner = np.full((self.rows, self.cols), -1)
+        for index, rect in enumerate(rects):
+            owner[rect.top // self.tile_size:-(-rect.bottom // self.tile_size),
+                  rect.left // self.tile_size:-(-rect.right // self.tile_size)] = index
+        c0 = np.clip(ant_rects[:, 0] // self.tile_size, 0, self.cols - 1)
+        c1 = np.clip((ant_rects[:, 2] - 1) // self.tile_size, 0, self.cols - 1)
+        r0 = np.clip(ant_rects[:, 1] // self.tile_size, 0, self.rows - 1)
+        r1 = np.clip((ant_rects[:, 3] - 1) // self.tile_size, 0, self.rows - 1)
+        hits = np.stack([owner[r0, c0], owner[r0, c1], owner[r1, c0], owner[r1, c1]], axis=1)
+        ants, corners = np.nonzero(hits >= 0)
+        # (region, ant) pairs as one sorted key: by region, then in drawing order
+        keys = np.unique(hits[ants, corners] * len(ant_rects) + ants)
+        if len(keys) == 0:
+            return
+        regions, members = np.divmod(keys, len(ant_rects))
+        starts = np.flatnonzero(np.diff(regions, prepend=-1))
+        topleft = ant_rects[:, :2].tolist()
+        for region, members in zip(regions[starts].tolist(), np.split(members, starts[1:])):
+            surface.set_clip(rects[region])
+            surface.blits([(images[i], topleft[i]) for i in members.tolist()], doreturn=False)
+        surface.set_clip(None)
+
+    def draw(self, surface):
+        sim = self.sim
+        if sim.profiler is not None:
+            sim.profiler.lap()
+        key = (len(sim.obstacles), len(sim.food_spots))
+        if key != self.static_key:
+            self.static = self.build_static()
+            self.static_key = key
+            self.full = True
+
+        ant_rects, colors, images = self.current_ants()
+        self.mark_ants(ant_rects, colors)
+        self.mark_food()
+        if self.full or self.frames % self.pheromone_interval == 0:
+            self.mark_pheromones()
+        if self.full:
+            self.dirty[:] = True
+            self.full = False
+        self.frames += 1
+
+        rects = self.regions()
+        self.dirty[:] = False
+        for rect in rects:
+            self.paint(surface, rect)
+        self.draw_ants(surface, rects, ant_rects, images)
+        if sim.profiler is not None:
+            sim.profiler.lap('draw')
+            sim.profiler.gauge('dirty rects', len(rects))
+        return rects
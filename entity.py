@@ -0,0 +1,64 @@
+# entity.py
+import pygame
+
+# Ant colors by state, shared by the sprite ants, the ColonyEngine and replays
+BLACK, RED, BLUE = 0, 1, 2
+COLORS = {BLACK: (0, 0, 0), RED: (255, 0, 0), BLUE: (0, 0, 255)}
+
+_images = {}  # (width, height, color) -> Surface
+
+def shared_image(size, color):
+    # One filled Surface per size and color for every entity drawn with it.
+    # Shared images must never be drawn on.
+    key = (size[0], size[1], color)
+    image = _images.get(key)
+    if image is None:
+        image = pygame.Surface(size)
+        image.fill(color)
+        _images[key] = image
+    return image
+
+class Entity:
+    # Lightweight stand-in for pygame.sprite.Sprite. Subclasses keep their
+    # fields in __slots__ and return a shared image instead of owning a
+    # Surface; the small part of the Sprite protocol implemented here is all
+    # pygame groups (and SpatialGroup) need to hold entities, so groups stay
+    # usable as a view of them.
+    __slots__ = ('position', 'rect', '_groups')
+
+    def __init__(self):
+        self._groups = ()
+
+    # Called by pygame groups
+    def add_internal(self, group):
+        self._groups += (group,)
+
+    def remove_internal(self, group):
+        self._groups = tuple(g for g in self._groups if g is not group)
+
+    def groups(self):
+        return list(self._groups)
+
+    def alive(self):
+        return bool(self._groups)
+
+    def add(self, *groups):
+        for group in groups:
+            group.add(self)
+
+    def remove(self, *groups):
+        for group in groups:
+            group.remove(self)
+
+    def kill(self):
+        for group in self._groups:
+            group.remove_internal(self)
+        self._groups = ()
+
+    def update(self, *args, **kwargs):
+        pass
+
+def blit_all(surface, *groups):
+    # Draw several groups, in order, with one blits call. Unlike Group.draw
+    # no per-sprite dirty rects are kept, which nothing here uses.
+    surface.blits([(entity.image, entity.rect) for group in groups for entity in group], doreturn=False)
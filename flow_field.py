@@ -0,0 +1,184 @@
+# flow_field.py
+import numpy as np
+
+# Neighbour steps (row, col, cost). Straight steps cost 2 and diagonal ones 3,
+# close to 1 : sqrt(2) while keeping every distance a small integer
+STEPS = [(-1, 0, 2), (1, 0, 2), (0, -1, 2), (0, 1, 2), (-1, -1, 3), (-1, 1, 3), (1, -1, 3), (1, 1, 3)]
+UNREACHED = np.iinfo(np.int32).max
+
+def passable_cells(obstacles, left, top, rows, cols, cell_size, clearance):
+    # Cells not touched by any obstacle grown by clearance pixels (a negative
+    # clearance shrinks them, leaving only cells mostly covered blocked)
+    free = np.ones((rows, cols), dtype=bool)
+    right, bottom = left + cols * cell_size, top + rows * cell_size
+    for obstacle in obstacles:
+        rect = obstacle.rect.inflate(2 * clearance, 2 * clearance)
+        if rect.right <= left or rect.left >= right or rect.bottom <= top or rect.top >= bottom:
+            continue
+        c0 = max((rect.left - left) // cell_size, 0)
+        c1 = min(-(-(rect.right - left) // cell_size), cols)
+        r0 = max((rect.top - top) // cell_size, 0)
+        r1 = min(-(-(rect.bottom - top) // cell_size), rows)
+        free[r0:r1, c0:c1] = False
+    return free
+
+def distance_map(free, target):
+    # Shortest path distance from every free cell to target, by Dijkstra with
+    # one bucket per distance (Dial's algorithm); each bucket is expanded as a
+    # whole with array operations. Diagonal steps may not cut a blocked corner.
+    rows, cols = free.shape
+    width = cols + 2
+    padded = np.zeros((rows + 2, width), dtype=bool)  # Blocked border, so steps never leave the grid
+    padded[1:-1, 1:-1] = free
+    passable = padded.ravel()
+    distance = np.full(passable.size, UNREACHED, dtype=np.int32)
+    start = (target[0] + 1) * width + target[1] + 1
+    distance[start] = 0
+    buckets = {0: [np.array([start])]}
+    d = 0
+    while buckets:
+        while d not in buckets:
+            d += 1
+        cells = np.unique(np.concatenate(buckets.pop(d)))
+        cells = cells[distance[cells] == d]  # Drop cells reached more cheaply since they were queued
+        for drow, dcol, cost in STEPS:
+            neighbours = cells + drow * width + dcol
+            better = passable[neighbours] & (distance[neighbours] > d + cost)
+            if drow and dcol:
+                better &= passable[cells + drow * width] & passable[cells + dcol]
+            neighbours = neighbours[better]
+            if len(neighbours):
+                distance[neighbours] = d + cost
+                buckets.setdefault(d + cost, []).append(neighbours)
+    return distance.reshape(padded.shape)[1:-1, 1:-1]
+
+def successors(distance, free):
+    # Flat index of the next cell on the shortest path from every cell
+    # (the cell itself for the target and cells cut off from it)
+    rows, cols = distance.shape
+    padded = np.full((rows + 2, cols + 2), UNREACHED, dtype=np.int64)
+    padded[1:-1, 1:-1] = distance
+    open_cells = np.zeros((rows + 2, cols + 2), dtype=bool)
+    open_cells[1:-1, 1:-1] = free
+    best = np.full((rows, cols), UNREACHED, dtype=np.int64)
+    cells = np.arange(rows * cols).reshape(rows, cols)
+    successor = cells.copy()
+    for drow, dcol, cost in STEPS:
+        through = padded[1 + drow:rows + 1 + drow, 1 + dcol:cols + 1 + dcol] + cost
+        if drow and dcol:
+            corner = open_cells[1 + drow:rows + 1 + drow, 1:-1] & open_cells[1:-1, 1 + dcol:cols + 1 + dcol]
+            through[~corner] = UNREACHED
+        better = (through < best) & (distance > 0) & (distance != UNREACHED)
+        best[better] = through[better]
+        successor[better] = cells[better] + drow * cols + dcol
+    return successor.ravel()
+
+def lookahead(successor, free, reach=16):
+    # Unit direction (x, y) from every cell toward the farthest cell, at most
+    # reach steps down its shortest path, that it has a clear line to. Aiming
+    # ahead instead of at the next cell straightens the 8-way grid steps.
+    rows, cols = free.shape
+    row, col = np.divmod(np.arange(rows * cols), cols)
+    aim = successor.copy()
+    ahead, hops = successor, 1
+    while hops < reach:
+        ahead, hops = ahead[ahead], hops * 2
+        to_row, to_col = np.divmod(ahead, cols)
+        clear = np.ones(len(row), dtype=bool)
+        for t in np.arange(1, hops) / hops:
+            clear &= free[np.rint(row + (to_row - row) * t).astype(np.intp),
+                          np.rint(col + (to_col - col) * t).astype(np.intp)]
+        aim[clear] = ahead[clear]
+    to_row, to_col = np.divmod(aim, cols)
+    direction = np.stack([to_col - col, to_row - row], axis=-1).astype(np.float32)
+    lengths = np.hypot(direction[:, 0], direction[:, 1])[:, None]
+    np.divide(direction, lengths, out=direction, where=lengths > 0)
+    return direction.reshape(rows, cols, 2)
+
+def clear_ahead(free, target, steps):
+    # Cells from which the straight line to target crosses no blocked cell
+    # for the next steps cells. Each pass extends the clear stretch by one
+    # cell, through both cells straddling the line one square ring further in.
+    rows, cols = free.shape
+    drows, dcols = np.indices(free.shape)
+    drows -= target[0]
+    dcols -= target[1]
+    ring = np.maximum(np.abs(drows), np.abs(dcols))
+    scale = np.maximum(ring - 1, 0) / np.maximum(ring, 1)
+    inner_rows = target[0] + drows * scale
+    inner_cols = target[1] + dcols * scale
+    near = (np.floor(inner_rows + 1e-9).astype(np.intp) * cols + np.floor(inner_cols + 1e-9).astype(np.intp)).ravel()
+    far = (np.ceil(inner_rows - 1e-9).astype(np.intp) * cols + np.ceil(inner_cols - 1e-9).astype(np.intp)).ravel()
+    free = free.ravel()
+    clear = free.copy()
+    for _ in range(steps):
+        clear = free & clear[near] & clear[far]
+    return clear.reshape(rows, cols)
+
+class FlowField:
+    # Shortest paths around the obstacles toward one target, over a grid of
+    # cell_size pixel cells covering bounds (left, top, right, bottom). Ants
+    # whose straight line to the target is clear for the next lookout cells
+    # keep heading straight for it; the others follow the field around the
+    # obstacle. Ants outside bounds or cut off from the target also go straight.
+    def __init__(self, obstacles, target, bounds, cell_size=5, clearance=2, lookout=8):
+        left, top, right, bottom = bounds
+        self.left, self.top = left, top
+        self.cell_size = cell_size
+        self.rows = max(-(-(bottom - top) // cell_size), 1)
+        self.cols = max(-(-(right - left) // cell_size), 1)
+        free = passable_cells(obstacles, left, top, self.rows, self.cols, cell_size, clearance)
+        row = min(max(int((target[1] - top) // cell_size), 0), self.rows - 1)
+        col = min(max(int((target[0] - left) // cell_size), 0), self.cols - 1)
+        free[row, col] = True  # The target itself is always reachable, even right next to an obstacle
+        self.distance = distance_map(free, (row, col))
+        self.direction = lookahead(successors(self.distance, free), free)
+
+        # Ants only leave the straight line when a cell mostly covered by an
+        # obstacle lies on it within the next few cells
+        solid = ~passable_cells(obstacles, left, top, self.rows, self.cols, cell_size, -(cell_size // 2))
+        self.follow = (self.distance != UNREACHED) & ~clear_ahead(~solid, (row, col), lookout)
+
+    def steer(self, x, y):
+        # Direction to take from (x, y), or None to head straight for the target
+        row = int((y - self.top) // self.cell_size)
+        col = int((x - self.left) // self.cell_size)
+        if 0 <= row < self.rows and 0 <= col < self.cols and self.follow[row, col]:
+            return self.direction[row, col].tolist()
+        return None
+
+    def steer_many(self, points):
+        # steer() for an (n, 2) array: directions plus which points follow them
+        rows = np.floor((points[:, 1] - self.top) / self.cell_size).astype(np.intp)
+        cols = np.floor((points[:, 0] - self.left) / self.cell_size).astype(np.intp)
+        inside = (rows >= 0) & (rows < self.rows) & (cols >= 0) & (cols < self.cols)
+        rows, cols = rows.clip(0, self.rows - 1), cols.clip(0, self.cols - 1)
+        return self.direction[rows, cols], inside & self.follow[rows, cols]
+
+class FlowFields:
+    # FlowFields toward each nest and food spot, built the first time an ant
+    # heads for that target and then reused for the rest of the run, so new
+    # food spots cost nothing until ants head for them; invalidate() drops
+    # every field when the obstacles change. In large worlds a field only
+    # covers radius pixels around its target, which is where ants come back to it.
+    def __init__(self, obstacles, width, height, cell_size=5, radius=1000):
+        self.obstacles = obstacles
+        self.width = width
+        self.height = height
+        self.cell_size = cell_size
+        self.radius = radius
+        self.fields = {}
+        self.builds = 0
+
+    def field(self, target):
+        key = (int(target[0]), int(target[1]))
+        field = self.fields.get(key)
+        if field is None:
+            bounds = (max(key[0] - self.radius, 0), max(key[1] - self.radius, 0),
+                      min(key[0] + self.radius, self.width), min(key[1] + self.radius, self.height))
+            field = self.fields[key] = FlowField(self.obstacles, key, bounds, self.cell_size)
+            self.builds += 1
+        return field
+
+    def invalidate(self):
+        self.fields.clear()
@@ -2,44 +2,200 @@
 import pygame
 import random
 import math
+import numpy as np
+from entity import Entity, shared_image
+from spatial_hash import SpatialGroup
 
 class FoodSpot:
-    def __init__(self, x, y, radius=50):
+    # A pool of food items. food_items only holds items with food left, and
+    # remaining counts the portions in them, so whether a spot still has food
+    # is known without looking at any item.
+    overlays = {}  # radius -> shared semi-transparent area surface
+
+    def __init__(self, x, y, radius=50, rng=None):
+        self.rng = rng if rng is not None else random
         self.position = pygame.math.Vector2(x, y)
         self.radius = radius
         self.food_items = []
+        self.remaining = 0  # Portions left over all items
         self.max_food = 50  # Maximum food items in one spot
 
+    def has_food(self):
+        return self.remaining > 0
+
+    def add_item(self, food):
+        food.spot = self
+        self.food_items.append(food)
+        self.remaining += food.amount
+        return food
+
     def add_food(self, amount=10):
+        # Returns the items added, for the caller to put where ants find them
+        added = []
         for _ in range(amount):
             if len(self.food_items) >= self.max_food:
                 break
             # Generate food within the radius
-            angle = random.uniform(0, 2 * 3.14159)
-            distance = random.uniform(0, self.radius)
+            angle = self.rng.uniform(0, 2 * 3.14159)
+            distance = self.rng.uniform(0, self.radius)
             x = self.position.x + distance * math.cos(angle)
             y = self.position.y + distance * math.sin(angle)
-            self.food_items.append(Food(x, y))
+            added.append(self.add_item(Food(x, y)))
+        return added
+
+    def take(self, food, amount=1):
+        # True once the item is used up; it then leaves the spot
+        food.amount -= amount
+        self.remaining -= amount
+        if food.amount <= 0:
+            self.remaining -= food.amount  # Never count more than the item held
+            self.food_items.remove(food)
+            return True
+        return False
+
+    def draw(self, surface, offset=(0, 0)):
+        # Draw the food spot area (semi-transparent), built once per radius
+        spot_surface = FoodSpot.overlays.get(self.radius)
+        if spot_surface is None:
+            spot_surface = pygame.Surface((self.radius * 2, self.radius * 2), pygame.SRCALPHA)
+            pygame.draw.circle(spot_surface, (0, 255, 0, 30), (self.radius, self.radius), self.radius)
+            FoodSpot.overlays[self.radius] = spot_surface
+        surface.blit(spot_surface, (self.position.x - self.radius + offset[0],
+                                    self.position.y - self.radius + offset[1]))
 
-    def draw(self, surface):
-        # Draw the food spot area (semi-transparent)
-        spot_surface = pygame.Surface((self.radius * 2, self.radius * 2), pygame.SRCALPHA)
-        pygame.draw.circle(spot_surface, (0, 255, 0, 30), (self.radius, self.radius), self.radius)
-        surface.blit(spot_surface, (self.position.x - self.radius, self.position.y - self.radius))
+def spot_index(spots, point):
+    # Index of the spot whose area holds point, or -1
+    for index, spot in enumerate(spots):
+        if spot.position.distance_to(point) <= spot.radius + 1:
+            return index
+    return -1
+
+class Food(Entity):
+    __slots__ = ('amount', 'spot')
 
-class Food(pygame.sprite.Sprite):
     def __init__(self, x, y, amount=10):
-        super().__init__()
-        self.image = pygame.Surface((6, 6))
-        self.image.fill((0, 255, 0))  # Green color for food
-        self.rect = self.image.get_rect(center=(x, y))
+        Entity.__init__(self)
+        self.rect = pygame.Rect(0, 0, 6, 6)
+        self.rect.center = (x, y)
         self.position = pygame.math.Vector2(x, y)
         self.amount = amount
+        self.spot = None  # FoodSpot this item belongs to, if any
+
+    @property
+    def image(self):
+        return shared_image((6, 6), (0, 255, 0))  # Green color for food
 
     def reduce_amount(self, amount=1):
+        if self.spot is not None:
+            return self.spot.take(self, amount)
         self.amount -= amount
         return self.amount <= 0
 
+class FoodGroup(SpatialGroup):
+    # The food ants can find: filed by position for pickups, and also kept in
+    # slots for the ColonyEngine, LevelOfDetail and Recorder. Every item added
+    # takes the next slot of slot_items, slot_positions and slot_rects (left,
+    # top, right, bottom), and a removed one only clears its slot_alive flag,
+    # so neither costs more than the item itself; slots are compacted once
+    # half of them are dead. near() finds the live slots around many points
+    # at once through the slots sorted by cell. version counts additions and
+    # removals.
+    def __init__(self, *foods, cell_size=20):
+        self.version = 0
+        self.cell_size = cell_size
+        self.slot_items = []  # Item per slot, None once removed
+        self.slot_positions = np.zeros((0, 2))
+        self.slot_rects = np.zeros((0, 4))
+        self.slot_alive = np.zeros(0, dtype=bool)  # May be longer than slot_items: spare capacity
+        self._slot_of = {}
+        self._dead = 0
+        self._cells = None  # (live slots sorted by cell key, their keys), rebuilt after additions
+        self._arrays = None
+        self._arrays_version = None
+        super().__init__(*foods, cell_size=cell_size)
+
+    def add_internal(self, sprite, layer=None):
+        super().add_internal(sprite, layer)
+        slot = len(self.slot_items)
+        if slot == len(self.slot_alive):
+            extra = max(slot, 16)
+            self.slot_positions = np.concatenate([self.slot_positions, np.zeros((extra, 2))])
+            self.slot_rects = np.concatenate([self.slot_rects, np.zeros((extra, 4))])
+            self.slot_alive = np.concatenate([self.slot_alive, np.zeros(extra, dtype=bool)])
+        self.slot_items.append(sprite)
+        self.slot_positions[slot] = (sprite.position.x, sprite.position.y)
+        self.slot_rects[slot] = (sprite.rect.left, sprite.rect.top, sprite.rect.right, sprite.rect.bottom)
+        self.slot_alive[slot] = True
+        self._slot_of[sprite] = slot
+        self._cells = None
+        self.version += 1
+
+    def remove_internal(self, sprite):
+        super().remove_internal(sprite)
+        slot = self._slot_of.pop(sprite)
+        self.slot_items[slot] = None
+        self.slot_alive[slot] = False
+        self._dead += 1
+        if self._dead > 64 and 2 * self._dead > len(self.slot_items):
+            self.compact()
+        self.version += 1
+
+    def compact(self):
+        # Drop the dead slots. Slot arrays are replaced, not changed in place,
+        # so callers still holding the old ones keep consistent copies.
+        live = np.flatnonzero(self.slot_alive[:len(self.slot_items)])
+        self.slot_items = [self.slot_items[i] for i in live.tolist()]
+        self.slot_positions = self.slot_positions[live]
+        self.slot_rects = self.slot_rects[live]
+        self.slot_alive = np.ones(len(live), dtype=bool)
+        self._slot_of = {item: slot for slot, item in enumerate(self.slot_items)}
+        self._dead = 0
+        self._cells = None
+
+    def cell_keys(self, cols, rows):
+        return cols.astype(np.int64) * (1 << 32) + rows
+
+    def near(self, points, reach):
+        # (point, slot) index pairs of the live items filed in the cells
+        # within reach pixels of each of the (n, 2) points; callers still do
+        # their own exact test
+        if self._cells is None:
+            live = np.flatnonzero(self.slot_alive[:len(self.slot_items)])
+            cells = np.floor(self.slot_positions[live] / self.cell_size).astype(np.int64)
+            keys = self.cell_keys(cells[:, 0], cells[:, 1])
+            order = np.argsort(keys, kind='stable')
+            self._cells = (live[order], keys[order])
+        slots, keys = self._cells
+        cells = np.floor(points / self.cell_size).astype(np.int64)
+        span = range(-int(-(-reach // self.cell_size)), int(-(-reach // self.cell_size)) + 1)
+        found_points, found_slots = [], []
+        for dc in span:
+            for dr in span:
+                wanted = self.cell_keys(cells[:, 0] + dc, cells[:, 1] + dr)
+                first = np.searchsorted(keys, wanted, side='left')
+                counts = np.searchsorted(keys, wanted, side='right') - first
+                total = int(counts.sum())
+                if total == 0:
+                    continue
+                starts = np.repeat(first - (np.cumsum(counts) - counts), counts)
+                found_points.append(np.repeat(np.arange(len(points)), counts))
+                found_slots.append(slots[starts + np.arange(total)])
+        if not found_points:
+            return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp)
+        found_points, found_slots = np.concatenate(found_points), np.concatenate(found_slots)
+        alive = self.slot_alive[found_slots]
+        return found_points[alive], found_slots[alive]
+
+    def arrays(self):
+        # (items, positions, rects as left, top, right, bottom) of the live
+        # items, in the order they were added; do not modify
+        if self._arrays_version != self.version:
+            live = np.flatnonzero(self.slot_alive[:len(self.slot_items)])
+            items = [self.slot_items[i] for i in live.tolist()]
+            self._arrays = (items, self.slot_positions[live], self.slot_rects[live])
+            self._arrays_version = self.version
+        return self._arrays
+
 class Nest(pygame.sprite.Sprite):
     def __init__(self, x, y):
         super().__init__()
@@ -48,28 +204,37 @@ class Nest(pygame.sprite.Sprite):
         self.rect = self.image.get_rect(center=(x, y))
         self.position = pygame.math.Vector2(x, y)
         self.food_stored = 0
+        self.trips_completed = 0
 
-    def store_food(self, amount):
+    def store_food(self, amount, trips=1):
         self.food_stored += amount
+        self.trips_completed += trips
 
 class Pheromone:
+    dots = {}  # (type, strength) -> shared dot surface
+
     def __init__(self, x, y, strength=100, type='food'):
         self.position = pygame.math.Vector2(x, y)
         self.strength = strength
         self.type = type  # 'food' or 'home'
         self.decay_rate = 0.2  # Reduced decay rate for longer-lasting trails
 
-    def update(self):
-        self.strength -= self.decay_rate
+    def update(self, dt=1):
+        self.strength -= self.decay_rate * dt
         return self.strength <= 0
 
-    def draw(self, surface):
-        if self.type == 'food':
-            color = (0, min(255, int(self.strength)), 0, min(255, int(self.strength)))
-        else:  # home
-            color = (min(255, int(self.strength)), 0, 0, min(255, int(self.strength)))
-        
-        # Create a surface with alpha for transparency
-        pheromone_surface = pygame.Surface((4, 4), pygame.SRCALPHA)
-        pygame.draw.circle(pheromone_surface, color, (2, 2), 2)
-        surface.blit(pheromone_surface, (self.position.x - 2, self.position.y - 2))
\ No newline at end of file
+    def draw(self, surface, offset=(0, 0)):
+        level = max(0, min(255, int(self.strength)))
+        pheromone_surface = Pheromone.dots.get((self.type, level))
+        if pheromone_surface is None:
+            if self.type == 'food' or self.type.startswith('food.'):  # Any colony's food trail
+                color = (0, level, 0, level)
+            else:  # home
+                color = (level, 0, 0, level)
+
+            # Create a surface with alpha for transparency, shared by every pheromone at this level
+            pheromone_surface = pygame.Surface((4, 4), pygame.SRCALPHA)
+            pygame.draw.circle(pheromone_surface, color, (2, 2), 2)
+            Pheromone.dots[(self.type, level)] = pheromone_surface
+        # Rounded in world pixels, so a dot lands on the same pixels whatever the offset
+        surface.blit(pheromone_surface, (int(self.position.x - 2) + offset[0], int(self.position.y - 2) + offset[1]))
\ No newline at end of file
@@ -0,0 +1,123 @@
+# lod.py
+import numpy as np
+from obstacle import ObstacleMap
+
+# Detail tiers, as reported by LevelOfDetail.report()
+FULL, STEADY, FAR = 0, 1, 2
+TIERS = ['full', 'steady', 'far']
+
+class LevelOfDetail:
+    # Level-of-detail scheduler. Every tick plan() picks the ants that are
+    # due and how many ticks each of them advances in this update (its dt);
+    # the ant then sleeps until those ticks have passed. An ant stays at full
+    # detail (dt = 1) while it is inside the focus rect (the camera view,
+    # padded by focus_margin), close enough to an obstacle to reach it in a
+    # reduced step (plus clearance), close to food it could pick up or close
+    # to its nest with food to deliver. Otherwise ants in a steady state
+    # (carrying food home or heading back to a known food spot) advance
+    # steady_interval ticks at a time and all others far_interval ticks.
+    # Those rules keep every pickup and delivery at full detail, so
+    # Nest.food_stored stays accurate; what a slower ant loses is how often
+    # it steers, which the ants make up for by scaling their steering by dt.
+    def __init__(self, far_interval=4, steady_interval=2, focus_margin=100, clearance=10, food_margin=10,
+                 nest_margin=30):
+        self.far_interval = far_interval
+        self.steady_interval = steady_interval
+        self.focus = None  # World Rect kept at full detail; None when nothing is watched
+        self.focus_margin = focus_margin
+        self.clearance = clearance  # Margin kept from obstacles on top of the distance a reduced step covers
+        self.food_margin = food_margin
+        self.nest_margin = nest_margin
+        self.next_update = np.zeros(0, dtype=np.int64)  # Per ant, tick of its next update
+
+        # Running totals for report()
+        self.ticks = 0
+        self.ant_ticks = 0  # Ants alive summed over ticks: the updates a full-detail run makes
+        self.updates = 0
+        self.tier_updates = [0] * len(TIERS)
+        self.last_updates = 0
+
+        self._food_key = None
+        self._food_positions = None
+
+    def food_positions(self, foods):
+        # Food never moves, so positions are only unpacked when the group
+        # changes; FoodGroups keep them already
+        arrays = getattr(foods, 'arrays', None)
+        if arrays is not None:
+            return arrays()[1]
+        key = (id(foods), len(foods))
+        if self._food_key != key:
+            self._food_positions = np.array([(f.position.x, f.position.y) for f in foods],
+                                            dtype=float).reshape(-1, 2)
+            self._food_key = key
+        return self._food_positions
+
+    def near_food(self, points, foods, radius):
+        near = np.zeros(len(points), dtype=bool)
+        food = self.food_positions(foods)
+        if len(food) == 0 or len(points) == 0:
+            return near
+        chunk = max(1, 2_000_000 // len(food))
+        for start in range(0, len(points), chunk):
+            batch = points[start:start + chunk]
+            dx = food[:, 0] - batch[:, 0:1]
+            dy = food[:, 1] - batch[:, 1:2]
+            near[start:start + chunk] = (dx * dx + dy * dy < radius[start:start + chunk, None] ** 2).any(axis=1)
+        return near
+
+    def in_focus(self, points):
+        if self.focus is None:
+            return np.zeros(len(points), dtype=bool)
+        view = self.focus.inflate(2 * self.focus_margin, 2 * self.focus_margin)
+        return ((points[:, 0] >= view.left) & (points[:, 0] < view.right) &
+                (points[:, 1] >= view.top) & (points[:, 1] < view.bottom))
+
+    def plan(self, positions, carrying, returning, nest_positions, obstacles, foods, speed,
+             nest_radius=20, food_reach=6):
+        # Indices of the ants to update this tick and the dt of each, called
+        # once per tick. Arrays are per ant: positions and nest_positions
+        # (n, 2), the flags (n,).
+        tick = self.ticks
+        n = len(positions)
+        if len(self.next_update) < n:
+            # New ants are due at once
+            self.next_update = np.concatenate([self.next_update, np.full(n - len(self.next_update), tick)])
+        due = np.nonzero(self.next_update[:n] <= tick)[0]
+        points = positions[due]
+        steady = carrying[due] | returning[due]
+        interval = np.where(steady, self.steady_interval, self.far_interval)
+        travel = interval * speed
+
+        full = self.in_focus(points)
+        if isinstance(obstacles, ObstacleMap):
+            full |= obstacles.distance_many(points) < np.minimum(self.clearance + travel, obstacles.reach)
+        else:
+            full[:] = True  # Without a baked map there is no cheap way to tell open terrain
+        hungry = np.nonzero(~full & ~carrying[due])[0]
+        full[hungry] |= self.near_food(points[hungry], foods, self.food_margin + food_reach + travel[hungry])
+        to_nest = nest_positions[due] - points
+        full |= carrying[due] & (np.hypot(to_nest[:, 0], to_nest[:, 1]) < nest_radius + self.nest_margin + travel)
+
+        # Reduced ants are spread over the ticks of their interval, so the
+        # updates of a large colony do not all land on the same tick
+        dt = np.where(full, 1, interval - (tick + due) % interval)
+        self.next_update[due] = tick + dt
+
+        tiers = np.where(full, FULL, np.where(steady, STEADY, FAR))
+        for tier, count in enumerate(np.bincount(tiers, minlength=len(TIERS)).tolist()):
+            self.tier_updates[tier] += count
+        self.ticks += 1
+        self.ant_ticks += n
+        self.updates += len(due)
+        self.last_updates = len(due)
+        return due, dt
+
+    def report(self):
+        # Updates run against what full detail would have run, and by tier
+        return {
+            'ticks': self.ticks,
+            'updates_per_tick': round(self.updates / max(self.ticks, 1), 1),
+            'update_ratio': round(self.updates / max(self.ant_ticks, 1), 3),
+            'tier_updates': dict(zip(TIERS, self.tier_updates)),
+        }
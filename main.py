@@ -1,126 +1,169 @@
 # main.py
+import argparse
 import pygame
-import random
-import math
-from ant import Ant, SoldierAnt
-from obstacle import Obstacle, generate_obstacles
-from food import Food, Nest, Pheromone, FoodSpot
-from utils import is_valid_nest_position, is_valid_food_spot, create_food_spots
+from camera import Camera, handle_camera_event, pan_camera
+from pipeline import SimulationThread, FrameRenderer
+from dirty_rects import DirtyRenderer
+from simulation import Simulation
+from profiler import draw_hud
+from time_control import TimeControl
 
 # Screen dimensions
 screen_width = 800
 screen_height = 600
 
-# Initialize Pygame
-pygame.init()
-screen = pygame.display.set_mode((screen_width, screen_height))
-pygame.display.set_caption("Ant Colony Simulation")
-
-def main():
-    # Create obstacle group
-    obstacles = pygame.sprite.Group()
-    generate_obstacles(obstacles, screen_width, screen_height)
-
-    # Create a valid nest position
-    while True:
-        nest_x = random.randint(50, screen_width - 50)
-        nest_y = random.randint(50, screen_height - 50)
-        if is_valid_nest_position(nest_x, nest_y, obstacles):
-            break
-    nest = Nest(nest_x, nest_y)
-    nest_group = pygame.sprite.GroupSingle(nest)
-
-
-    # Create food spots and food sources
-    food_spots = create_food_spots(2, obstacles, screen_width, screen_height)
-    foods = pygame.sprite.Group()
-    for spot in food_spots:
-        for food_item in spot.food_items:
-            foods.add(food_item)
-
-    # Create ants
-    ants = pygame.sprite.Group()
-    for i in range(30):
-        while True:
-            x = nest.rect.centerx + random.randint(-20, 20)
-            y = nest.rect.centery + random.randint(-20, 20)
-            if not any(obstacle.rect.collidepoint(x, y) for obstacle in obstacles):
-                # Randomly assign as worker ant or soldier ant
-                if random.random() < 0.7:  # 70% chance to be a worker ant
-                    ants.add(Ant(x, y, screen_width, screen_height, nest))
-                else:  # 30% chance to be a soldier ant
-                    ants.add(SoldierAnt(x, y, screen_width, screen_height, nest))
-                break
-
-    # Initialize pheromone list
-    pheromones = []
+TIME_KEYS = (pygame.K_SPACE, pygame.K_PERIOD, *TimeControl.SPEEDS)
+
+def main(vectorized=False, profile=False, world_size=None, colonies=1, lod=False, pipelined=False,
+         flow_fields=False, dirty_rects=False):
+    # Initialize Pygame
+    pygame.init()
+    screen = pygame.display.set_mode((screen_width, screen_height))
+    pygame.display.set_caption("Ant Colony Simulation")
+
+    world_width, world_height = world_size or (screen_width, screen_height)
+    sim = Simulation(world_width, world_height, vectorized=vectorized, num_colonies=colonies)
+    if profile:
+        sim.enable_profiling()
+    if lod:
+        sim.enable_lod()
+    if flow_fields:
+        sim.enable_flow_fields()
+    show_hud = profile
+
+    # Worlds larger than the window are explored with a camera (WASD, wheel, middle drag)
+    camera = None
+    if (world_width, world_height) != (screen_width, screen_height):
+        camera = Camera(screen_width, screen_height, world_width, world_height)
+        camera.center_on(sim.nest.position.x, sim.nest.position.y)
+
+    # Ticks run at a fixed rate whatever the frame rate (space pauses,
+    # period steps, 1-4 pick the speed)
+    time_control = TimeControl()
+
+    # Pipelined: the simulation ticks on a worker thread and this loop only
+    # handles events and draws the latest finished tick
+    pipeline = renderer = None
+    if pipelined:
+        pipeline = SimulationThread(sim, time_control=time_control)
+        pipeline.view = camera.view_rect() if camera is not None else screen.get_rect()
+        renderer = FrameRenderer(sim)
+        pipeline.start()
+    shown = None  # Frame, view, HUD and speed state on screen in pipelined mode
+
+    # Dirty rects: only the parts of the window that changed are redrawn and
+    # presented. Needs a window showing the whole world, drawn by this loop.
+    dirty = None
+    if dirty_rects and camera is None and pipeline is None:
+        dirty = DirtyRenderer(sim)
 
     # Main game loop
     running = True
     clock = pygame.time.Clock()
     font = pygame.font.Font(None, 36)
-    replenish_timer = 0
-    replenish_interval = 300  # Frames between food replenishment
+    hud_font = pygame.font.Font(None, 20)
 
     while running:
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 running = False
-            elif event.type == pygame.MOUSEBUTTONDOWN:
-                if event.button == 3:  # Right click
-                    mouse_x, mouse_y = pygame.mouse.get_pos()
-                    if is_valid_food_spot(mouse_x, mouse_y, obstacles, food_spots):
-                        # Create new food spot
-                        new_spot = FoodSpot(mouse_x, mouse_y)
-                        new_spot.add_food(30)  # Add initial food items
-                        food_spots.append(new_spot)
-                        # Add food items to the foods group
-                        for food_item in new_spot.food_items:
-                            foods.add(food_item)
-
-        # Update ants
-        for ant in ants:
-            ant.update(obstacles, foods, pheromones)
-
-        # Update pheromones
-        pheromones = [p for p in pheromones if not p.update()]
-
-        # Replenish food periodically
-        replenish_timer += 1
-        if replenish_timer >= replenish_interval:
-            replenish_timer = 0
-            for spot in food_spots:
-                if len(spot.food_items) < spot.max_food // 2:  # Replenish if below half capacity
-                    spot.add_food(5)  # Add 5 new food items
-                    for food_item in spot.food_items:
-                        if food_item not in foods:
-                            foods.add(food_item)
-
-        # Draw everything
-        screen.fill((255, 255, 255))  # White background
-        
-        # Draw food spots first
-        for spot in food_spots:
-            spot.draw(screen)
-        
-        # Draw pheromones
-        for pheromone in pheromones:
-            pheromone.draw(screen)
-        
-        # Draw other sprites
-        obstacles.draw(screen)
-        foods.draw(screen)
-        nest_group.draw(screen)
-        ants.draw(screen)
+            elif event.type == pygame.WINDOWEXPOSED and dirty is not None:
+                dirty.invalidate()  # The window contents were lost
+            elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 3:  # Right click
+                mouse_x, mouse_y = pygame.mouse.get_pos()
+                if camera is not None:
+                    mouse_x, mouse_y = camera.screen_to_world((mouse_x, mouse_y))
+                if pipeline is not None:
+                    pipeline.submit(sim.add_food_spot, mouse_x, mouse_y)
+                else:
+                    sim.add_food_spot(mouse_x, mouse_y)
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                # Toggle the profiler HUD, starting the profiler on first use
+                if sim.profiler is None:
+                    if pipeline is not None:
+                        pipeline.submit(sim.enable_profiling)
+                    else:
+                        sim.enable_profiling()
+                show_hud = not show_hud
+            elif event.type == pygame.KEYDOWN and event.key in TIME_KEYS:
+                if pipeline is not None:
+                    pipeline.submit(time_control.handle_event, event)
+                else:
+                    time_control.handle_event(event)
+            elif camera is not None:
+                handle_camera_event(camera, event)
+        if camera is not None:
+            pan_camera(camera, pygame.key.get_pressed())
+
+        if pipeline is not None:
+            pipeline.check()
+            view = camera.view_rect() if camera is not None else screen.get_rect()
+            pipeline.view = view
+            frame = pipeline.frames.front()
+            state = (frame, view, show_hud, time_control.paused, time_control.speed)
+            if state == shown:
+                # Nothing new to show: leave the time to the simulation thread
+                clock.tick(60)
+                continue
+            shown = state
+            renderer.draw(screen, frame, camera)
+            stored, report = list(frame.stored), frame.report
+        else:
+            if sim.lod is not None:
+                # Ants on screen keep full detail
+                sim.lod.focus = camera.view_rect() if camera is not None else screen.get_rect()
+            time_control.advance(sim)
+
+            # Draw everything, or just what changed
+            if dirty is not None:
+                updated = dirty.draw(screen)
+            else:
+                sim.draw(screen, camera)
+            stored, report = [nest.food_stored for nest in sim.nests], sim.profiler
 
         # Draw food counter
-        food_text = font.render(f"Food Stored: {nest.food_stored}", True, (0, 0, 0))
-        screen.blit(food_text, (10, 10))
-
-        pygame.display.flip()
+        label = f"Food Stored: {stored[0]}" if len(stored) == 1 else f"Food Stored: {sum(stored)} {stored}"
+        label += f"   {time_control.label()}"
+        food_text = font.render(label, True, (0, 0, 0))
+        overlays = [screen.blit(food_text, (10, 10))]
+        if show_hud and report is not None:
+            overlays.append(draw_hud(screen, hud_font, report))
+
+        if dirty is not None:
+            dirty.invalidate(*overlays)  # Repainted next frame, under the new text
+            pygame.display.update(updated + overlays)
+        else:
+            pygame.display.flip()
+        if pipeline is None and sim.profiler is not None:
+            sim.profiler.lap('present')
         clock.tick(60)
 
+    if pipeline is not None:
+        pipeline.stop()
     pygame.quit()
 
+def parse_world(text):
+    # "WIDTHxHEIGHT", e.g. 3200x2400
+    width, x, height = text.partition('x')
+    if not (x and width.isdigit() and height.isdigit() and int(width) > 0 and int(height) > 0):
+        raise argparse.ArgumentTypeError(f"expected WIDTHxHEIGHT, got {text!r}")
+    return int(width), int(height)
+
+def run(argv=None):
+    parser = argparse.ArgumentParser(description="Run the ant colony simulation in a window.")
+    parser.add_argument('--vectorized', action='store_true', help="use the array-based ColonyEngine")
+    parser.add_argument('--profile', action='store_true', help="start the profiler and show its HUD (F3 toggles)")
+    parser.add_argument('--world', type=parse_world, default=None, metavar='WIDTHxHEIGHT',
+                        help="world size, explored with a camera when larger than the window")
+    parser.add_argument('--colonies', type=int, default=1, help="number of competing colonies")
+    parser.add_argument('--lod', action='store_true', help="update off-screen and steady ants less often")
+    parser.add_argument('--pipelined', action='store_true', help="tick the simulation on a worker thread")
+    parser.add_argument('--flow-fields', action='store_true', help="route ants home and back to food around obstacles")
+    parser.add_argument('--dirty-rects', action='store_true', help="redraw only the parts of the window that changed")
+    args = parser.parse_args(argv)
+
+    main(vectorized=args.vectorized, profile=args.profile, world_size=args.world, colonies=args.colonies,
+         lod=args.lod, pipelined=args.pipelined, flow_fields=args.flow_fields, dirty_rects=args.dirty_rects)
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    run()
@@ -0,0 +1,205 @@
+# metrics.py
+import csv
+import json
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+from recorder import ant_columns, CARRYING, RETURNING
+
+# Columns of every sample, in file order
+FIELDS = ['tick', 'time', 'interval_ticks', 'ants', 'food_stored', 'food_delivered', 'trips', 'trip_ticks_mean',
+          'exploring', 'carrying_food', 'returning_to_food', 'stuck', 'pheromone_count', 'pheromone_strength',
+          'tick_ms_p50', 'tick_ms_p90', 'tick_ms_p99', 'tick_ms_max', 'alerts']
+
+class ColonyMetrics:
+    # Colony throughput and health, summed up every interval ticks into one
+    # sample (a dict with the FIELDS keys): food delivered and trips made in
+    # the interval, how long those trips took (ticks since the ant's previous
+    # delivery, or since metrics started), which share of the ants is
+    # exploring, carrying food or heading back to a known spot at the end of
+    # it and which share was stuck on average (stuck checks that found an ant
+    # stuck, over the checks all ants had in the interval), the pheromone
+    # population, and percentiles of the wall time of each step. The last
+    # history samples are kept for the in-process API (latest(), samples)
+    # and each new one is handed to the writers. Ants report their pickups,
+    # deliveries and stuck checks here in place of the Recorder, which gets
+    # them passed on.
+    def __init__(self, interval=100, history=1000, min_food_delivered=None, max_pheromones=None):
+        self.interval = interval
+        self.samples = deque(maxlen=history)
+        self.writers = []  # Objects with write(sample) and close(), see MetricsFile
+        self.recorder = None  # Recorder events are forwarded to
+
+        # Alert thresholds, None for off: a sample with less food delivered
+        # or more pheromones than this lists it in 'alerts'
+        self.min_food_delivered = min_food_delivered
+        self.max_pheromones = max_pheromones
+
+        self.tick = 0
+        self.start_tick = 0
+        self.sample_tick = 0  # Tick of the previous sample
+        self.food_stored = 0  # Food stored at the previous sample
+        self.trip_start = {}  # Ant id -> tick its current trip started, if not when metrics started
+        self._clear()
+
+    def _clear(self):
+        self.trip_ticks = []
+        self.stuck = 0  # Stuck checks that found an ant stuck
+        self.latencies = []
+
+    def start(self, sim):
+        self.tick = self.start_tick = self.sample_tick = sim.ticks
+        self.food_stored = sum(nest.food_stored for nest in sim.nests)
+
+    # Same interface as Recorder.event/events
+    def event(self, kind, ant, x, y):
+        self.events(kind, [ant], [x], [y])
+
+    def events(self, kind, ants, xs, ys):
+        if kind == 'delivery':
+            for ant in ants:
+                self.trip_ticks.append(self.tick - self.trip_start.get(ant, self.start_tick))
+                self.trip_start[ant] = self.tick
+        elif kind == 'stuck':
+            self.stuck += len(ants)
+        if self.recorder is not None:
+            self.recorder.events(kind, ants, xs, ys)
+
+    def record(self, sim, seconds):
+        # Called after every step with the wall time it took
+        previous, self.tick = self.tick, sim.ticks
+        self.latencies.append(seconds)
+        if self.tick // self.interval != previous // self.interval:
+            self.add_sample(self.sample(sim))
+
+    def sample(self, sim):
+        _, states, _ = ant_columns(sim)
+        ants = len(states)
+        carrying = int(np.count_nonzero(states & CARRYING))
+        returning = int(np.count_nonzero(states & RETURNING))  # Never while carrying
+        food_stored = sum(nest.food_stored for nest in sim.nests)
+        ticks = sim.ticks - self.sample_tick
+        check_interval = sim.engine.stuck_check_interval if sim.engine is not None else \
+            next((ant.stuck_check_interval for ant in sim.ants), 1)
+        checks = ants * ticks / check_interval
+        latencies = 1000 * np.array(self.latencies)
+        p50, p90, p99 = np.percentile(latencies, [50, 90, 99]).tolist() if len(latencies) else (None,) * 3
+        sample = {
+            'tick': sim.ticks,
+            'time': round(time.time(), 3),
+            'interval_ticks': ticks,
+            'ants': ants,
+            'food_stored': food_stored,
+            'food_delivered': food_stored - self.food_stored,
+            'trips': len(self.trip_ticks),
+            'trip_ticks_mean': round(float(np.mean(self.trip_ticks)), 1) if self.trip_ticks else None,
+            'exploring': round((ants - carrying - returning) / ants, 4) if ants else 0.0,
+            'carrying_food': round(carrying / ants, 4) if ants else 0.0,
+            'returning_to_food': round(returning / ants, 4) if ants else 0.0,
+            'stuck': round(min(self.stuck / checks, 1.0), 4) if checks else 0.0,
+            'pheromone_count': len(sim.pheromones),
+            'pheromone_strength': round(sim.pheromones.total_strength(), 1),
+            'tick_ms_p50': round(p50, 3) if p50 is not None else None,
+            'tick_ms_p90': round(p90, 3) if p90 is not None else None,
+            'tick_ms_p99': round(p99, 3) if p99 is not None else None,
+            'tick_ms_max': round(float(latencies.max()), 3) if len(latencies) else None,
+        }
+        sample['alerts'] = self.alerts(sample)
+        self.sample_tick = sim.ticks
+        self.food_stored = food_stored
+        self._clear()
+        return sample
+
+    def alerts(self, sample):
+        alerts = []
+        if self.min_food_delivered is not None and sample['food_delivered'] < self.min_food_delivered:
+            alerts.append(f"food_delivered {sample['food_delivered']} < {self.min_food_delivered}")
+        if self.max_pheromones is not None and sample['pheromone_count'] > self.max_pheromones:
+            alerts.append(f"pheromone_count {sample['pheromone_count']} > {self.max_pheromones}")
+        return alerts
+
+    def add_sample(self, sample):
+        self.samples.append(sample)
+        for writer in self.writers:
+            writer.write(sample)
+
+    def latest(self):
+        return self.samples[-1] if self.samples else None
+
+    def close(self):
+        for writer in self.writers:
+            writer.close()
+
+class MetricsFile:
+    # Appends every sample to a local file as it is taken: CSV for a .csv
+    # path (alerts joined with '; '), JSON lines otherwise. Lines are flushed
+    # straight away, so the file can be tailed while the run goes on.
+    def __init__(self, path):
+        self.path = path
+        self.csv = path.endswith('.csv')
+        self.file = open(path, 'w', newline='' if self.csv else None)
+        if self.csv:
+            self.writer = csv.DictWriter(self.file, fieldnames=FIELDS)
+            self.writer.writeheader()
+
+    def write(self, sample):
+        if self.csv:
+            self.writer.writerow(dict(sample, alerts='; '.join(sample['alerts'])))
+        else:
+            self.file.write(json.dumps(sample) + '\n')
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+class MetricsServer:
+    # Serves the samples over HTTP on a background thread, for local
+    # monitoring: GET /metrics is the latest sample, /metrics/history all
+    # kept samples, and /health answers 200 or, while the latest sample has
+    # alerts, 503 with them. Port 0 picks a free port (see self.port).
+    def __init__(self, metrics, port=8000, host='127.0.0.1'):
+        self.metrics = metrics
+        self.server = ThreadingHTTPServer((host, port), self.handler())
+        self.port = self.server.server_address[1]
+        self._thread = None
+
+    def handler(self):
+        metrics = self.metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                latest = metrics.latest()
+                status = 200
+                if self.path == '/metrics':
+                    body = latest
+                elif self.path == '/metrics/history':
+                    body = list(metrics.samples)
+                elif self.path == '/health':
+                    alerts = latest['alerts'] if latest is not None else []
+                    status = 503 if alerts else 200
+                    body = {'status': 'alert' if alerts else 'ok', 'alerts': alerts}
+                else:
+                    self.send_error(404)
+                    return
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass  # Keep polling out of the simulation's output
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name='metrics', daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
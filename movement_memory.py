@@ -0,0 +1,123 @@
+# movement_memory.py
+import numpy as np
+
+# Pushes between recomputing running sums from the stored points, which
+# drop the rounding error they pick up over long runs
+RESYNC_INTERVAL = 1024
+
+class MovementMemory:
+    # Last `length` positions of one ant in a fixed ring buffer. Pushing
+    # overwrites the oldest slot and keeps a running sum, so the centroid is
+    # O(1); only spread() looks at every stored point.
+    __slots__ = ('length', 'points', 'head', 'count', 'sum_x', 'sum_y', 'pushes')
+
+    def __init__(self, length):
+        self.length = length
+        self.points = np.zeros((length, 2))
+        self.head = 0  # Slot the next push writes
+        self.count = 0
+        self.sum_x = 0.0
+        self.sum_y = 0.0
+        self.pushes = 0
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def full(self):
+        return self.count >= self.length
+
+    def push(self, x, y):
+        slot = self.points[self.head]
+        if self.count >= self.length:
+            self.sum_x -= slot[0]
+            self.sum_y -= slot[1]
+        else:
+            self.count += 1
+        slot[0] = x
+        slot[1] = y
+        self.sum_x += x
+        self.sum_y += y
+        self.head = (self.head + 1) % self.length
+        self.pushes += 1
+        if self.pushes % RESYNC_INTERVAL == 0:
+            self.sum_x, self.sum_y = self.points[:self.count].sum(axis=0).tolist()
+
+    def extend(self, points):
+        for x, y in points:
+            self.push(x, y)
+
+    def centroid(self):
+        if self.count == 0:
+            return 0.0, 0.0
+        return self.sum_x / self.count, self.sum_y / self.count
+
+    def ordered(self):
+        # Stored points, oldest first
+        if self.count < self.length:
+            return self.points[:self.count]
+        return np.roll(self.points, -self.head, axis=0)
+
+    def spread(self):
+        # Average distance of the stored points from their centroid
+        if self.count == 0:
+            return 0.0
+        points = self.points[:self.count]
+        cx, cy = self.centroid()
+        return float(np.hypot(points[:, 0] - cx, points[:, 1] - cy).mean())
+
+class MovementMemoryBatch:
+    # MovementMemory for a whole colony: one (ants, length, 2) ring that every
+    # ant writes at the same head each tick, with per-ant running sums.
+    def __init__(self, count, length):
+        self.length = length
+        self.points = np.zeros((count, length, 2))
+        self.count = np.zeros(count, dtype=np.int32)
+        self.sums = np.zeros((count, 2))
+        self.head = 0
+        self.pushes = 0
+
+    def __len__(self):
+        return len(self.count)
+
+    @property
+    def full(self):
+        return self.count >= self.length
+
+    def grow(self, n):
+        # New ants start with an empty memory
+        self.points = np.concatenate([self.points, np.zeros((n, self.length, 2))])
+        self.count = np.concatenate([self.count, np.zeros(n, dtype=np.int32)])
+        self.sums = np.concatenate([self.sums, np.zeros((n, 2))])
+
+    def push(self, positions):
+        slot = self.points[:, self.head]
+        full = self.count >= self.length
+        self.sums[full] -= slot[full]
+        self.sums += positions
+        slot[:] = positions
+        self.head = (self.head + 1) % self.length
+        np.minimum(self.count + 1, self.length, out=self.count)
+        self.pushes += 1
+        if self.pushes % RESYNC_INTERVAL == 0:
+            self.resync()
+
+    def resync(self):
+        # Recompute the running sums from the stored points (after loading
+        # them, and every RESYNC_INTERVAL pushes)
+        # Ants added mid-run filled the slots just behind the shared head
+        age = (self.head - 1 - np.arange(self.length)) % self.length
+        filled = age < self.count[:, None]
+        self.sums = (self.points * filled[:, :, None]).sum(axis=1)
+
+    def centroid(self, indices):
+        return self.sums[indices] / np.maximum(self.count[indices], 1)[:, None]
+
+    def spread(self, indices):
+        # Average distance from the centroid for full memories of the given ants
+        if len(indices) == 0:
+            return np.zeros(0)
+        points = self.points[indices]
+        center = self.centroid(indices)[:, None, :]
+        offsets = points - center
+        return np.hypot(offsets[:, :, 0], offsets[:, :, 1]).mean(axis=1)
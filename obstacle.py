@@ -2,13 +2,22 @@
 import pygame
 import math
 import random
+import numpy as np
+from collections import OrderedDict
+from spatial_hash import SpatialHash
+from entity import Entity, shared_image
+
+class Obstacle(Entity):
+    __slots__ = ()
 
-class Obstacle(pygame.sprite.Sprite):
     def __init__(self, x, y, width, height):
-        super().__init__()
-        self.image = pygame.Surface((width, height))
-        self.image.fill((128, 128, 128))  # Grey color for obstacles
-        self.rect = self.image.get_rect(topleft=(x, y))
+        Entity.__init__(self)
+        self.rect = pygame.Rect(x, y, width, height)
+        self.position = pygame.math.Vector2(self.rect.center)  # For spatial indexing
+
+    @property
+    def image(self):
+        return shared_image(self.rect.size, (128, 128, 128))  # Grey color for obstacles
 
 def heart_shape_coordinates(center_x, center_y, scale, num_points=100):
     points = []
@@ -49,35 +58,242 @@ def square_coordinates(center_x, center_y, side_length, num_points=30):
         points.append((x, y))
     return points
 
-def random_coordinates(screen_width, screen_height, num_points=50):
+def random_coordinates(screen_width, screen_height, num_points=50, rng=random):
     points = []
     for _ in range(num_points):
-        x = random.randint(0, screen_width)
-        y = random.randint(0, screen_height)
+        x = rng.randint(0, screen_width)
+        y = rng.randint(0, screen_height)
         points.append((x, y))
     return points
 
-def generate_obstacles(obstacles, screen_width, screen_height):
-    # Choose a shape type at random
-    shape_choice = random.choice(['heart', 'circle', 'square', 'random'])
+SHAPES = ['heart', 'circle', 'square', 'random']
+
+def generate_obstacles(obstacles, screen_width, screen_height, shape=None, rng=random):
+    # Choose a shape type at random unless one is requested
+    shape_choice = shape if shape is not None else rng.choice(SHAPES)
     print(f"Chosen shape: {shape_choice}")
+    place_shape(obstacles, shape_choice, 0, 0, screen_width, screen_height, rng)
 
+def place_shape(obstacles, shape_choice, left, top, width, height, rng=random):
+    # One obstacle layout centered in the region (left, top, width, height)
     size = 10; # Default size of obstacles
     
     
     if shape_choice == 'heart':
-        points = heart_shape_coordinates(screen_width // 2, screen_height // 2, scale=15, num_points=50)
+        points = heart_shape_coordinates(width // 2, height // 2, scale=15, num_points=50)
         size = 10;
     elif shape_choice == 'circle':
-        points = circle_coordinates(screen_width // 2, screen_height // 2, radius=250, num_points=50)
+        points = circle_coordinates(width // 2, height // 2, radius=250, num_points=50)
         size = 10;
     elif shape_choice == 'square':
-        points = square_coordinates(screen_width // 2, screen_height // 2, side_length=450, num_points=50)
+        points = square_coordinates(width // 2, height // 2, side_length=450, num_points=50)
         size = 12;
     else:
-        points = random_coordinates(screen_width, screen_height, num_points=30)
+        points = random_coordinates(width, height, num_points=30, rng=rng)
         size = 20;
 
     for (x, y) in points:
         width = height = size;
-        obstacles.add(Obstacle(x, y, width, height))
\ No newline at end of file
+        obstacles.add(Obstacle(left + x, top + y, width, height))
+
+def generate_world_obstacles(obstacles, world_width, world_height, shape=None, rng=random, region=(800, 600)):
+    # Large worlds are covered region by region, each with its own layout
+    for top in range(0, world_height - region[1] + 1, region[1]):
+        for left in range(0, world_width - region[0] + 1, region[0]):
+            shape_choice = shape if shape is not None else rng.choice(SHAPES)
+            place_shape(obstacles, shape_choice, left, top, region[0], region[1], rng)
+
+class ObstacleMap:
+    # Obstacles never move, so everything Steering.avoid_obstacles and the
+    # collision checks need is baked once into per-pixel lookups: occupancy,
+    # signed distance to the nearest obstacle edge (with its gradient) and the
+    # summed center-repulsion force. A small margin covers ants stepping just
+    # past the screen edge before they wrap around. origin places the map's
+    # top-left corner in the world when it only covers part of it.
+    def __init__(self, obstacles, width, height, perception_radius=50, ant_size=5, margin=8, origin=(0, 0)):
+        self.obstacles = obstacles
+        self.width = width
+        self.height = height
+        self.left, self.top = origin
+        self.perception_radius = perception_radius
+        self.touch_distance = ant_size / 2 + 1  # Same 1 pixel buffer as Steering
+        self.margin = margin
+
+        shape = (height + 2 * margin, width + 2 * margin)
+        self.occupancy = np.zeros(shape, dtype=bool)
+        self.reach = perception_radius + max((o.rect.width for o in obstacles), default=0)
+        self.distance = np.full(shape, self.reach, dtype=np.float32)  # Capped at reach
+        self.repulsion = np.zeros(shape + (2,), dtype=np.float32)
+
+        # Pixel centers in world coordinates
+        xs = np.arange(shape[1], dtype=np.float32) - margin + 0.5 + self.left
+        ys = np.arange(shape[0], dtype=np.float32) - margin + 0.5 + self.top
+        for obstacle in obstacles:
+            self.bake(obstacle.rect, xs, ys)
+
+        gy, gx = np.gradient(self.distance)
+        self.gradient = np.stack([gx, gy], axis=-1)
+
+    def bake(self, rect, xs, ys):
+        # Only the window an obstacle can influence is touched
+        reach = self.perception_radius + rect.width / 2
+        c0 = max(int(rect.centerx - reach) - self.left + self.margin, 0)
+        c1 = min(int(rect.centerx + reach) - self.left + self.margin + 2, len(xs))
+        r0 = max(int(rect.centery - reach) - self.top + self.margin, 0)
+        r1 = min(int(rect.centery + reach) - self.top + self.margin + 2, len(ys))
+        if c0 >= c1 or r0 >= r1:
+            return
+        px = xs[c0:c1][None, :]
+        py = ys[r0:r1][:, None]
+
+        inside = (px >= rect.left) & (px < rect.right) & (py >= rect.top) & (py < rect.bottom)
+        self.occupancy[r0:r1, c0:c1] |= inside
+
+        outside_x = np.maximum(np.maximum(rect.left - px, px - rect.right), 0)
+        outside_y = np.maximum(np.maximum(rect.top - py, py - rect.bottom), 0)
+        depth = np.minimum(np.minimum(px - rect.left, rect.right - px),
+                           np.minimum(py - rect.top, rect.bottom - py))
+        signed = np.where(inside, -depth, np.hypot(outside_x, outside_y))
+        window = self.distance[r0:r1, c0:c1]
+        np.minimum(window, signed, out=window)
+
+        # Center repulsion applies where this obstacle is near but not touching
+        to_x = rect.centerx - px
+        to_y = rect.centery - py
+        center_distance = np.hypot(to_x, to_y)
+        near = ((np.hypot(outside_x, outside_y) >= self.touch_distance) &
+                (center_distance < reach) & (center_distance > 0))
+        scale = np.where(near, (self.perception_radius - center_distance) /
+                         (self.perception_radius * np.maximum(center_distance, 1e-6)), 0)
+        self.repulsion[r0:r1, c0:c1, 0] -= to_x * scale
+        self.repulsion[r0:r1, c0:c1, 1] -= to_y * scale
+
+    def cell(self, x, y):
+        col = int(math.floor(x)) - self.left + self.margin
+        row = int(math.floor(y)) - self.top + self.margin
+        if 0 <= row < self.occupancy.shape[0] and 0 <= col < self.occupancy.shape[1]:
+            return row, col
+        return None
+
+    def collidepoint(self, point):
+        cell = self.cell(point[0], point[1])
+        return cell is not None and bool(self.occupancy[cell])
+
+    def avoidance(self, position, max_force, rng=random):
+        # Baked equivalent of Steering.avoid_obstacles
+        cell = self.cell(position.x, position.y)
+        if cell is None:
+            return pygame.math.Vector2(0, 0)
+        steering = pygame.math.Vector2(*self.repulsion[cell].tolist())
+        distance = self.distance[cell]
+        if distance <= 0:
+            steering += pygame.math.Vector2(rng.uniform(-1, 1), rng.uniform(-1, 1)).normalize() * max_force * 2
+        elif distance < self.touch_distance:
+            away = pygame.math.Vector2(*self.gradient[cell].tolist())
+            if away.length_squared() > 0:
+                steering += away.normalize() * max_force * 3
+        if steering.length_squared() > 0:
+            return steering.clamp_magnitude(max_force)
+        return steering
+
+    def lookup(self, points):
+        # Row/column indices for an (n, 2) array of points, plus which are on the map
+        cols = np.floor(points[:, 0]).astype(np.intp) - self.left + self.margin
+        rows = np.floor(points[:, 1]).astype(np.intp) - self.top + self.margin
+        valid = (rows >= 0) & (rows < self.occupancy.shape[0]) & (cols >= 0) & (cols < self.occupancy.shape[1])
+        return rows.clip(0, self.occupancy.shape[0] - 1), cols.clip(0, self.occupancy.shape[1] - 1), valid
+
+    def blocked_many(self, points):
+        rows, cols, valid = self.lookup(points)
+        return self.occupancy[rows, cols] & valid
+
+    def distance_many(self, points):
+        # Distance to the nearest obstacle for an (n, 2) array of points, reach outside the map
+        rows, cols, valid = self.lookup(points)
+        return np.where(valid, self.distance[rows, cols], self.reach)
+
+class TiledObstacleMap(ObstacleMap):
+    # ObstacleMap for worlds too large to bake whole: the world is cut into
+    # square tiles that are baked on first use from the obstacles near them,
+    # and the least recently used tiles are dropped beyond max_tiles. Points
+    # are answered by the tile they fall in.
+    def __init__(self, obstacles, width, height, perception_radius=50, ant_size=5, tile_size=256, max_tiles=128):
+        self.obstacles = obstacles
+        self.width = width
+        self.height = height
+        self.perception_radius = perception_radius
+        self.ant_size = ant_size
+        self.touch_distance = ant_size / 2 + 1
+        self.tile_size = tile_size
+        self.max_tiles = max_tiles
+        self.cols = math.ceil(width / tile_size)
+        self.rows = math.ceil(height / tile_size)
+        self.tiles = OrderedDict()  # (col, row) -> ObstacleMap, least recently used first
+        self.baked = 0  # Tiles baked so far, including ones baked again after unloading
+
+        # Obstacles filed by tile, so baking a tile only looks at its neighbourhood
+        self.index = SpatialHash(tile_size)
+        for obstacle in obstacles:
+            self.index.insert(obstacle, obstacle.rect.centerx, obstacle.rect.centery)
+        self.reach = perception_radius + max((o.rect.width for o in obstacles), default=0)
+
+    def tile_key(self, x, y):
+        col = min(max(int(x // self.tile_size), 0), self.cols - 1)
+        row = min(max(int(y // self.tile_size), 0), self.rows - 1)
+        return col, row
+
+    def tile(self, key):
+        tile = self.tiles.get(key)
+        if tile is not None:
+            self.tiles.move_to_end(key)
+            return tile
+        col, row = key
+        half = self.tile_size / 2
+        center_x, center_y = (col + 0.5) * self.tile_size, (row + 0.5) * self.tile_size
+        nearby = [o for o in self.index.query(center_x, center_y, half + self.reach)
+                  if abs(o.rect.centerx - center_x) < half + self.reach and
+                  abs(o.rect.centery - center_y) < half + self.reach]
+        tile = ObstacleMap(nearby, self.tile_size, self.tile_size, self.perception_radius, self.ant_size,
+                           origin=(col * self.tile_size, row * self.tile_size))
+        self.tiles[key] = tile
+        self.baked += 1
+        if len(self.tiles) > self.max_tiles:
+            self.tiles.popitem(last=False)
+        return tile
+
+    def at(self, x, y):
+        return self.tile(self.tile_key(x, y))
+
+    def collidepoint(self, point):
+        return self.at(point[0], point[1]).collidepoint(point)
+
+    def avoidance(self, position, max_force, rng=random):
+        return self.at(position.x, position.y).avoidance(position, max_force, rng)
+
+    def split(self, points):
+        # (tile map, indices) for every tile that an (n, 2) array of points falls in
+        cols = np.clip((points[:, 0] // self.tile_size).astype(np.intp), 0, self.cols - 1)
+        rows = np.clip((points[:, 1] // self.tile_size).astype(np.intp), 0, self.rows - 1)
+        keys = rows * self.cols + cols
+        order = np.argsort(keys, kind='stable')
+        unique, starts = np.unique(keys[order], return_index=True)
+        for key, indices in zip(unique.tolist(), np.split(order, starts[1:])):
+            yield self.tile((key % self.cols, key // self.cols)), indices
+
+    def blocked_many(self, points):
+        hit = np.zeros(len(points), dtype=bool)
+        for tile, indices in self.split(points):
+            hit[indices] = tile.blocked_many(points[indices])
+        return hit
+
+    def distance_many(self, points):
+        distance = np.zeros(len(points), dtype=np.float32)
+        for tile, indices in self.split(points):
+            distance[indices] = tile.distance_many(points[indices])
+        return distance
+
+def point_blocked(obstacles, point):
+    # Collision test against either a baked ObstacleMap or a plain obstacle group
+    if isinstance(obstacles, ObstacleMap):
+        return obstacles.collidepoint(point)
+    return any(obstacle.rect.collidepoint(point) for obstacle in obstacles)
@@ -0,0 +1,279 @@
+# pheromone_field.py
+import math
+import numpy as np
+import pygame
+
+def colony_channel(colony):
+    # Pheromone type a colony's ants deposit and follow; the first colony keeps 'food'
+    return 'food' if colony == 0 else f'food.{colony}'
+
+class PheromoneField:
+    def __init__(self, width, height, cell_size=5, types=('food',), decay_rate=0.2, max_strength=1000):
+        self.width = width
+        self.height = height
+        self.cell_size = cell_size
+        self.cols = math.ceil(width / cell_size)
+        self.rows = math.ceil(height / cell_size)
+        self.types = tuple(types)
+        self.type_index = {t: i for i, t in enumerate(self.types)}
+        self.decay_rate = decay_rate  # Same per-frame decay as a single Pheromone
+        self.max_strength = max_strength  # Keeps busy trail cells from saturating forever
+
+        # One layer per pheromone type, indexed [type, row, col]
+        self.grid = np.zeros((len(self.types), self.rows, self.cols), dtype=np.float32)
+
+        # World coordinates of the cell centers, used when sampling
+        self.cell_x = (np.arange(self.cols, dtype=np.float32) + 0.5) * cell_size
+        self.cell_y = (np.arange(self.rows, dtype=np.float32) + 0.5) * cell_size
+
+        self._image = None
+
+    def __len__(self):
+        # Number of active (non-zero) cells, the grid analogue of the pheromone list length
+        return int(np.count_nonzero(self.grid))
+
+    def cell_of(self, x, y):
+        col = min(max(int(x // self.cell_size), 0), self.cols - 1)
+        row = min(max(int(y // self.cell_size), 0), self.rows - 1)
+        return row, col
+
+    def deposit(self, x, y, strength, type='food'):
+        row, col = self.cell_of(x, y)
+        layer = self.grid[self.type_index[type]]
+        layer[row, col] = min(layer[row, col] + strength, self.max_strength)
+
+    def deposit_many(self, xs, ys, strengths, type='food'):
+        # Batched deposit for array-based callers; repeated cells accumulate
+        cols = np.clip((np.asarray(xs) // self.cell_size).astype(np.intp), 0, self.cols - 1)
+        rows = np.clip((np.asarray(ys) // self.cell_size).astype(np.intp), 0, self.rows - 1)
+        layer = self.grid[self.type_index[type]]
+        np.add.at(layer, (rows, cols), strengths)
+        np.minimum(layer, self.max_strength, out=layer)
+
+    def update(self, dt=1):
+        # dt ticks of linear decay of every cell at once, clamped at zero
+        self.grid -= self.decay_rate * dt
+        np.maximum(self.grid, 0, out=self.grid)
+
+    def total_strength(self, type=None):
+        if type is None:
+            return float(self.grid.sum())
+        return float(self.grid[self.type_index[type]].sum())
+
+    def window(self, layer, r0, r1, c0, c1):
+        # Cells [r0:r1, c0:c1] of one layer (indices already inside the grid)
+        return self.grid[layer, r0:r1, c0:c1]
+
+    def nearby(self, position, radius, type='food'):
+        # Active cells of one layer within radius of position, as parallel arrays
+        c0 = max(int((position.x - radius) // self.cell_size), 0)
+        c1 = min(int((position.x + radius) // self.cell_size) + 1, self.cols)
+        r0 = max(int((position.y - radius) // self.cell_size), 0)
+        r1 = min(int((position.y + radius) // self.cell_size) + 1, self.rows)
+        empty = np.empty(0, dtype=np.float32)
+        if c0 >= c1 or r0 >= r1:
+            return empty, empty, empty, empty
+
+        window = self.window(self.type_index[type], r0, r1, c0, c1)
+        rows, cols = np.nonzero(window)
+        if len(rows) == 0:
+            return empty, empty, empty, empty
+
+        xs = self.cell_x[c0:c1][cols]
+        ys = self.cell_y[r0:r1][rows]
+        distances = np.hypot(xs - position.x, ys - position.y)
+        inside = distances < radius
+        return xs[inside], ys[inside], window[rows, cols][inside], distances[inside]
+
+    def levels(self, r0=0, r1=None, c0=0, c1=None):
+        # Cells [r0:r1, c0:c1] (the whole field by default) as 8-bit color
+        # levels: green for 'food' (the strongest of every colony's channel),
+        # red for a 'home' layer if the field has one
+        r1 = self.rows if r1 is None else r1
+        c1 = self.cols if c1 is None else c1
+        blank = np.zeros((r1 - r0, c1 - c0), dtype=np.float32)
+        food, home = blank, blank
+        for type, index in self.type_index.items():
+            if type == 'home':
+                home = self.window(index, r0, r1, c0, c1)
+            elif type == 'food' or type.startswith('food.'):
+                food = np.maximum(food, self.window(index, r0, r1, c0, c1))
+        return np.minimum(food, 255).astype(np.uint8), np.minimum(home, 255).astype(np.uint8)
+
+    def image(self, r0=0, r1=None, c0=0, c1=None):
+        # levels() as one RGBA surface at cell resolution, alpha from the stronger
+        self._image = level_image(*self.levels(r0, r1, c0, c1), self._image)
+        return self._image
+
+    def view_cells(self, view):
+        # Rows and columns of cells inside a world Rect, or None if there are none
+        c0 = max(view.left // self.cell_size, 0)
+        c1 = min(-(-view.right // self.cell_size), self.cols)
+        r0 = max(view.top // self.cell_size, 0)
+        r1 = min(-(-view.bottom // self.cell_size), self.rows)
+        if c0 >= c1 or r0 >= r1:
+            return None
+        return r0, r1, c0, c1
+
+    def draw(self, surface, view=None):
+        # One scaled blit per frame, independent of how many cells are active.
+        # With a view (world Rect drawn onto surface at its top-left corner)
+        # only the cells inside it are converted.
+        if view is None:
+            scaled = pygame.transform.scale(self.image(), (self.cols * self.cell_size, self.rows * self.cell_size))
+            surface.blit(scaled, (0, 0))
+            return
+        cells = self.view_cells(view)
+        if cells is not None:
+            blit_cells(surface, self.image(*cells), cells, self.cell_size, view)
+
+def level_image(food, home, image=None):
+    # RGBA surface of (rows, cols) green and red levels; image is reused if it has the right size
+    rows, cols = food.shape
+    if image is None or image.get_size() != (cols, rows):
+        image = pygame.Surface((cols, rows), pygame.SRCALPHA)
+    rgb = pygame.surfarray.pixels3d(image)
+    rgb[..., 0] = home.T
+    rgb[..., 1] = food.T
+    rgb[..., 2] = 0
+    del rgb
+    alpha = pygame.surfarray.pixels_alpha(image)
+    alpha[...] = np.maximum(food, home).T
+    del alpha
+    return image
+
+def blit_cells(surface, image, cells, cell_size, view):
+    # Draws a cell-resolution image of cells (r0, r1, c0, c1) scaled up to world pixels
+    r0, r1, c0, c1 = cells
+    scaled = pygame.transform.scale(image, ((c1 - c0) * cell_size, (r1 - r0) * cell_size))
+    surface.blit(scaled, (c0 * cell_size - view.left, r0 * cell_size - view.top))
+
+class PheromoneTile:
+    __slots__ = ('grid', 'stamp', 'peak')
+
+    def __init__(self, grid, stamp):
+        self.grid = grid  # [type, row, col] like PheromoneField.grid
+        self.stamp = stamp  # Field tick the grid is decayed up to
+        self.peak = 0.0  # Upper bound of any cell as of stamp
+
+class TiledPheromoneField(PheromoneField):
+    # PheromoneField for large worlds: cells live in square tiles that only
+    # exist where something was deposited. Decay is linear and clamped at
+    # zero, so a tile is brought up to date only when it is read or written
+    # (update() itself is O(1)), and tiles that must have decayed to nothing
+    # are dropped every sweep_interval ticks.
+    def __init__(self, width, height, cell_size=5, types=('food',), decay_rate=0.2, max_strength=1000,
+                 tile_cells=64, sweep_interval=100):
+        self.width = width
+        self.height = height
+        self.cell_size = cell_size
+        self.cols = math.ceil(width / cell_size)
+        self.rows = math.ceil(height / cell_size)
+        self.types = tuple(types)
+        self.type_index = {t: i for i, t in enumerate(self.types)}
+        self.decay_rate = decay_rate
+        self.max_strength = max_strength
+        self.cell_x = (np.arange(self.cols, dtype=np.float32) + 0.5) * cell_size
+        self.cell_y = (np.arange(self.rows, dtype=np.float32) + 0.5) * cell_size
+
+        self.tile_cells = tile_cells
+        self.sweep_interval = sweep_interval
+        self.tiles = {}  # (tile_row, tile_col) -> PheromoneTile
+        self.tick = 0
+        self._image = None
+
+    def sync(self, tile):
+        elapsed = self.tick - tile.stamp
+        if elapsed:
+            tile.grid -= self.decay_rate * elapsed
+            np.maximum(tile.grid, 0, out=tile.grid)
+            tile.peak = max(tile.peak - self.decay_rate * elapsed, 0.0)
+            tile.stamp = self.tick
+        return tile
+
+    def tile(self, key, create=False):
+        tile = self.tiles.get(key)
+        if tile is None:
+            if not create:
+                return None
+            tile = PheromoneTile(np.zeros((len(self.types), self.tile_cells, self.tile_cells), dtype=np.float32),
+                                 self.tick)
+            self.tiles[key] = tile
+        return self.sync(tile)
+
+    def update(self, dt=1):
+        self.tick += dt
+        if self.tick // self.sweep_interval != (self.tick - dt) // self.sweep_interval:
+            # Unload tiles whose strongest cell has certainly run out
+            for key in [key for key, tile in self.tiles.items()
+                        if tile.peak - self.decay_rate * (self.tick - tile.stamp) <= 0]:
+                del self.tiles[key]
+
+    def deposit(self, x, y, strength, type='food'):
+        row, col = self.cell_of(x, y)
+        tile = self.tile((row // self.tile_cells, col // self.tile_cells), create=True)
+        layer = tile.grid[self.type_index[type]]
+        r, c = row % self.tile_cells, col % self.tile_cells
+        layer[r, c] = min(layer[r, c] + strength, self.max_strength)
+        tile.peak = max(tile.peak, float(layer[r, c]))
+
+    def deposit_many(self, xs, ys, strengths, type='food'):
+        cols = np.clip((np.asarray(xs) // self.cell_size).astype(np.intp), 0, self.cols - 1)
+        rows = np.clip((np.asarray(ys) // self.cell_size).astype(np.intp), 0, self.rows - 1)
+        strengths = np.broadcast_to(np.asarray(strengths, dtype=np.float32), rows.shape)
+        keys = (rows // self.tile_cells) * self.cols + cols // self.tile_cells
+        layer_index = self.type_index[type]
+        for key in np.unique(keys).tolist():
+            mine = keys == key
+            tile = self.tile((key // self.cols, key % self.cols), create=True)
+            layer = tile.grid[layer_index]
+            np.add.at(layer, (rows[mine] % self.tile_cells, cols[mine] % self.tile_cells), strengths[mine])
+            np.minimum(layer, self.max_strength, out=layer)
+            tile.peak = max(tile.peak, float(layer.max()))
+
+    def window(self, layer, r0, r1, c0, c1):
+        # Assembled from the tiles overlapping the window; missing tiles are zero
+        out = np.zeros((r1 - r0, c1 - c0), dtype=np.float32)
+        size = self.tile_cells
+        for tile_row in range(r0 // size, (r1 - 1) // size + 1):
+            for tile_col in range(c0 // size, (c1 - 1) // size + 1):
+                tile = self.tile((tile_row, tile_col))
+                if tile is None:
+                    continue
+                top, left = tile_row * size, tile_col * size
+                a0, a1 = max(r0, top), min(r1, top + size)
+                b0, b1 = max(c0, left), min(c1, left + size)
+                out[a0 - r0:a1 - r0, b0 - c0:b1 - c0] = tile.grid[layer, a0 - top:a1 - top, b0 - left:b1 - left]
+        return out
+
+    def __len__(self):
+        return sum(int(np.count_nonzero(self.sync(tile).grid)) for tile in self.tiles.values())
+
+    def total_strength(self, type=None):
+        if type is None:
+            return float(sum(self.sync(tile).grid.sum(dtype=np.float64) for tile in self.tiles.values()))
+        layer = self.type_index[type]
+        return float(sum(self.sync(tile).grid[layer].sum(dtype=np.float64) for tile in self.tiles.values()))
+
+    @property
+    def grid(self):
+        # Dense copy of the whole field (for snapshots and small worlds)
+        return np.stack([self.window(layer, 0, self.rows, 0, self.cols) for layer in range(len(self.types))])
+
+    @grid.setter
+    def grid(self, grid):
+        self.tiles = {}
+        size = self.tile_cells
+        for row in range(0, self.rows, size):
+            for col in range(0, self.cols, size):
+                block = np.asarray(grid[:, row:row + size, col:col + size], dtype=np.float32)
+                if not block.any():
+                    continue
+                tile = self.tile((row // size, col // size), create=True)
+                tile.grid[:, :block.shape[1], :block.shape[2]] = block
+                tile.peak = float(block.max())
+
+    def draw(self, surface, view=None):
+        if view is None:
+            view = pygame.Rect(0, 0, self.width, self.height)
+        super().draw(surface, view)
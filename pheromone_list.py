@@ -0,0 +1,122 @@
+# pheromone_list.py
+import numpy as np
+from spatial_hash import SpatialHash
+
+class PheromoneList:
+    # The per-object pheromone model (a list of Pheromones) with bounded
+    # memory. A deposit landing within merge_radius of one of the same type
+    # is added into it instead of becoming a new object; the merged deposit
+    # keeps both the total strength and the total left over its lifetime, so
+    # trails are as strong, for as long, as with the separate objects. Past
+    # max_deposits the weakest deposits are evicted, a batch at a time so the
+    # scan for them stays cheap. Ants find deposits through query(), like any
+    # other indexed collection (see spatial_hash.nearby).
+    def __init__(self, decay_rate=0.2, merge_radius=2, max_deposits=20000, cell_size=50):
+        self.decay_rate = decay_rate  # Given to every deposit, like PheromoneField.decay_rate
+        self.merge_radius = merge_radius
+        self.max_deposits = max_deposits  # None for no cap
+        self.deposits = {}  # Pheromone -> None, dicts keep insertion order
+        self.index = SpatialHash(cell_size)
+        self.slots = {}  # (type, col, row) of merge_radius cells -> live deposits filed there
+
+        self.merges = 0
+        self.evictions = 0
+        self.expired = 0
+        self.peak = 0
+
+    def __len__(self):
+        return len(self.deposits)
+
+    def __iter__(self):
+        return iter(self.deposits)
+
+    def slot(self, pheromone):
+        return (pheromone.type, int(pheromone.position.x // self.merge_radius),
+                int(pheromone.position.y // self.merge_radius))
+
+    def find_merge(self, pheromone):
+        # Strongest deposit of the same type within merge_radius, looking in
+        # the 3x3 slots around it
+        kind, col, row = self.slot(pheromone)
+        best = None
+        for dc in (-1, 0, 1):
+            for dr in (-1, 0, 1):
+                for other in self.slots.get((kind, col + dc, row + dr), ()):
+                    if (best is None or other.strength > best.strength) and \
+                            other.position.distance_to(pheromone.position) <= self.merge_radius:
+                        best = other
+        return best
+
+    def append(self, pheromone):
+        pheromone.decay_rate = self.decay_rate
+        other = self.find_merge(pheromone)
+        if other is not None:
+            # Linear decay: a deposit of strength s fading at rate r has
+            # s * s / (2 * r) strength-ticks left, and the merge keeps the sum
+            remaining = other.strength ** 2 / other.decay_rate + pheromone.strength ** 2 / pheromone.decay_rate
+            other.strength += pheromone.strength
+            other.decay_rate = other.strength ** 2 / remaining
+            self.merges += 1
+            return
+        self.deposits[pheromone] = None
+        self.index.insert(pheromone, pheromone.position.x, pheromone.position.y)
+        self.slots.setdefault(self.slot(pheromone), []).append(pheromone)
+        if self.max_deposits is not None and len(self.deposits) > self.max_deposits:
+            self.evict(len(self.deposits) - self.max_deposits + max(self.max_deposits // 100, 1))
+        self.peak = max(self.peak, len(self.deposits))
+
+    def extend(self, pheromones):
+        for pheromone in pheromones:
+            self.append(pheromone)
+
+    def remove(self, pheromone):
+        del self.deposits[pheromone]
+        self.index.remove(pheromone)
+        slot = self.slot(pheromone)
+        filed = self.slots[slot]
+        filed.remove(pheromone)
+        if not filed:
+            del self.slots[slot]
+
+    def evict(self, count):
+        # Drop the count weakest deposits
+        pheromones = list(self.deposits)
+        count = min(count, len(pheromones))
+        strengths = np.fromiter((p.strength for p in pheromones), dtype=np.float64, count=len(pheromones))
+        for i in np.argpartition(strengths, count - 1)[:count].tolist():
+            self.remove(pheromones[i])
+        self.evictions += count
+
+    def update(self, dt=1):
+        # dt ticks of decay; deposits that fade out are dropped
+        expired = [p for p in self.deposits if p.update(dt)]
+        for pheromone in expired:
+            self.remove(pheromone)
+        self.expired += len(expired)
+
+    def query(self, position, radius):
+        return self.index.query(position.x, position.y, radius)
+
+    def total_strength(self, type=None):
+        return float(sum(p.strength for p in self.deposits if type is None or p.type == type))
+
+    def stats(self):
+        return {
+            'deposits': len(self.deposits),
+            'peak': self.peak,
+            'merges': self.merges,
+            'evictions': self.evictions,
+            'expired': self.expired,
+        }
+
+    def draw(self, surface, view=None):
+        # With a view (world Rect drawn onto surface at its top-left corner)
+        # only the deposits inside it are drawn
+        if view is None:
+            for pheromone in self.deposits:
+                pheromone.draw(surface)
+            return
+        offset = (-view.left, -view.top)
+        # Padded by a dot's radius, for dots that reach in from just outside
+        for pheromone in self.index.query_rect(view.left - 2, view.top - 2, view.right + 2, view.bottom + 2):
+            pheromone.draw(surface, offset)
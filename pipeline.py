@@ -0,0 +1,174 @@
+# pipeline.py
+import queue
+import threading
+import time
+import pygame
+from camera import blit_visible
+from pheromone_field import PheromoneField, level_image, blit_cells
+from recorder import ant_columns
+from replay import ant_images, draw_ants
+
+class Frame:
+    # Everything needed to draw one finished tick. Arrays are copies marked
+    # read-only and the sprites it refers to (food, spots) never change once
+    # created, so a Frame can be drawn on one thread while the simulation
+    # moves on on another.
+    __slots__ = ('tick', 'positions', 'states', 'foods', 'spots', 'stored', 'pheromone_cells',
+                 'pheromone_levels', 'report')
+
+    def __init__(self, tick, positions, states, foods, spots, stored, pheromone_cells, pheromone_levels,
+                 report=None):
+        self.tick = tick
+        self.positions = positions
+        self.states = states
+        self.foods = foods  # Tuple of Food sprites
+        self.spots = spots  # Tuple of FoodSpots
+        self.stored = stored  # food_stored per nest
+        self.pheromone_cells = pheromone_cells  # (r0, r1, c0, c1) captured, or None
+        self.pheromone_levels = pheromone_levels  # (food, home) uint8 levels of those cells
+        self.report = report  # TickProfiler.report() when profiling
+
+def capture(sim, view=None, margin=64):
+    # Frame of the current state of sim. Pheromones are only converted around
+    # view (a world Rect, the whole world when None), with a margin so a
+    # camera that pans before the next frame still finds them.
+    positions, states, _ = ant_columns(sim)
+    positions, states = positions.copy(), states.copy()
+    positions.flags.writeable = False
+    states.flags.writeable = False
+    field = sim.pheromones
+    area = view.inflate(2 * margin, 2 * margin) if view is not None else \
+        pygame.Rect(0, 0, sim.screen_width, sim.screen_height)
+    cells = field.view_cells(area)
+    levels = field.levels(*cells) if cells is not None else None
+    report = sim.profiler.report() if sim.profiler is not None else None
+    return Frame(sim.ticks, positions, states, tuple(sim.foods), tuple(sim.food_spots),
+                 tuple(nest.food_stored for nest in sim.nests), cells, levels, report)
+
+class FrameBuffer:
+    # Double buffer of Frames: the simulation fills the back slot while the
+    # renderer reads the front one, and publish() swaps them. Frames are
+    # immutable, so a renderer still drawing the previous front frame is not
+    # disturbed when its slot is reused.
+    def __init__(self):
+        self._slots = [None, None]
+        self._front = 0
+        self._lock = threading.Lock()
+        self.published = 0
+
+    def publish(self, frame):
+        back = 1 - self._front
+        self._slots[back] = frame
+        with self._lock:
+            self._front = back
+            self.published += 1
+
+    def front(self):
+        with self._lock:
+            return self._slots[self._front]
+
+class SimulationThread:
+    # Runs Simulation.step() on a worker thread, publishing a Frame after
+    # every tick, so drawing and event handling on the main thread overlap
+    # with the next tick instead of adding to it. Anything that changes the
+    # world from outside (right-click food, enabling the profiler) goes
+    # through submit() and runs on the worker between two ticks. With a
+    # TimeControl the worker runs the ticks it says are due and publishes a
+    # Frame after each batch instead.
+    def __init__(self, sim, ticks_per_second=60, time_control=None):
+        if not isinstance(sim.pheromones, PheromoneField):
+            raise ValueError("pipelined rendering needs the grid pheromone model")
+        self.sim = sim
+        self.ticks_per_second = ticks_per_second  # Upper bound; None runs as fast as the CPU allows
+        self.time_control = time_control
+        self.frames = FrameBuffer()
+        self.commands = queue.Queue()
+        self.view = None  # World Rect being shown, set by the renderer
+        self.error = None  # Exception that stopped the worker, re-raised by check()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def submit(self, function, *args):
+        self.commands.put((function, args))
+
+    def start(self):
+        self.frames.publish(capture(self.sim, self.view))
+        self._thread = threading.Thread(target=self._run, name='simulation', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def check(self):
+        if self.error is not None:
+            raise RuntimeError("simulation thread stopped") from self.error
+
+    def apply_commands(self):
+        while True:
+            try:
+                function, args = self.commands.get_nowait()
+            except queue.Empty:
+                return
+            function(*args)
+
+    def _run(self):
+        sim = self.sim
+        interval = 1 / self.ticks_per_second if self.ticks_per_second else 0
+        next_tick = time.perf_counter()
+        try:
+            while not self._stop.is_set():
+                self.apply_commands()
+                view = self.view
+                if sim.lod is not None:
+                    sim.lod.focus = view  # Ants on screen keep full detail
+                if self.time_control is not None:
+                    if self.time_control.advance(sim):
+                        self.frames.publish(capture(sim, view))
+                    else:
+                        self._stop.wait(0.002)  # Nothing due yet
+                    continue
+                sim.step()
+                self.frames.publish(capture(sim, view))
+                if interval:
+                    next_tick += interval
+                    delay = next_tick - time.perf_counter()
+                    if delay > 0:
+                        self._stop.wait(delay)
+                    else:
+                        next_tick = time.perf_counter()  # Running behind: do not try to catch up
+        except Exception as error:
+            self.error = error
+
+class FrameRenderer:
+    # Draws Frames with the same layers as Simulation.draw/draw_view.
+    # Obstacles and nests never change after the world is built, so they are
+    # drawn straight from the simulation's groups.
+    def __init__(self, sim):
+        if not isinstance(sim.pheromones, PheromoneField):
+            raise ValueError("pipelined rendering needs the grid pheromone model")
+        self.obstacles = sim.obstacles
+        self.nest_group = sim.nest_group
+        self.cell_size = sim.pheromones.cell_size
+        self._pheromone_image = None
+        self._ant_images = ant_images()
+
+    def draw(self, surface, frame, camera=None):
+        view = camera.view_rect() if camera is not None else pygame.Rect(0, 0, *surface.get_size())
+        canvas = camera.canvas() if camera is not None else surface
+        canvas.fill((255, 255, 255))
+        offset = (-view.left, -view.top)
+        for spot in frame.spots:
+            if view.inflate(2 * spot.radius, 2 * spot.radius).collidepoint(spot.position):
+                spot.draw(canvas, offset)
+        if frame.pheromone_cells is not None:
+            self._pheromone_image = level_image(*frame.pheromone_levels, self._pheromone_image)
+            blit_cells(canvas, self._pheromone_image, frame.pheromone_cells, self.cell_size, view)
+        blit_visible(canvas, self.obstacles, view, padding=20)
+        blit_visible(canvas, frame.foods, view)
+        blit_visible(canvas, self.nest_group, view)
+        draw_ants(canvas, self._ant_images, frame.positions, frame.states, view)
+        if camera is not None:
+            camera.present(canvas, surface)
@@ -0,0 +1,75 @@
+# profiler.py
+import time
+from collections import deque
+import pygame
+
+class TickProfiler:
+    # Opt-in per-phase timer. Code being measured calls lap(phase) at the end
+    # of each phase, which books the time since the previous lap to that phase;
+    # totals are kept per tick and averaged over a rolling window.
+    def __init__(self, window=120):
+        self.window = window
+        self.history = {}  # phase -> deque of per-tick seconds
+        self.current = {}  # phase -> seconds booked in the tick in progress
+        self.gauges = {}  # name -> latest value (entity counts and such)
+        self.intervals = deque(maxlen=window)  # wall time between tick starts
+        self.ticks = 0
+        self._last = time.perf_counter()
+        self._tick_start = None
+
+    def begin_tick(self):
+        # Closes the previous tick (including any drawing done after it) and starts a new one
+        now = time.perf_counter()
+        if self._tick_start is not None:
+            self.intervals.append(now - self._tick_start)
+            for phase in self.history.keys() | self.current.keys():
+                samples = self.history.setdefault(phase, deque(maxlen=self.window))
+                samples.append(self.current.get(phase, 0.0))
+            self.current.clear()
+        self.ticks += 1  # Ticks started, including the one in progress
+        self._tick_start = now
+        self._last = now
+
+    def lap(self, phase=None):
+        now = time.perf_counter()
+        if phase is not None:
+            self.current[phase] = self.current.get(phase, 0.0) + now - self._last
+        self._last = now
+
+    def gauge(self, name, value):
+        self.gauges[name] = value
+
+    def averages(self):
+        # Rolling average milliseconds per tick for every phase
+        return {phase: 1000 * sum(samples) / len(samples)
+                for phase, samples in sorted(self.history.items()) if samples}
+
+    def fps(self):
+        if not self.intervals:
+            return 0.0
+        return len(self.intervals) / sum(self.intervals)
+
+    def report(self):
+        return {'ticks': self.ticks, 'fps': round(self.fps(), 1),
+                'phase_ms': {phase: round(ms, 3) for phase, ms in self.averages().items()},
+                'gauges': dict(self.gauges)}
+
+def draw_hud(surface, font, profiler, position=(10, 50)):
+    # Semi-transparent panel with FPS, per-phase averages and gauges; profiler
+    # may also be a report() taken earlier (see pipeline.Frame)
+    report = profiler.report() if isinstance(profiler, TickProfiler) else profiler
+    lines = [f"FPS: {report['fps']:.1f}"]
+    lines += [f"{phase}: {ms:.2f} ms" for phase, ms in report['phase_ms'].items()]
+    lines += [f"{name}: {value}" for name, value in report['gauges'].items()]
+    rendered = [font.render(line, True, (0, 0, 0)) for line in lines]
+    width = max(text.get_width() for text in rendered) + 10
+    height = sum(text.get_height() for text in rendered) + 10
+
+    panel = pygame.Surface((width, height), pygame.SRCALPHA)
+    panel.fill((255, 255, 255, 200))
+    surface.blit(panel, position)
+    y = position[1] + 5
+    for text in rendered:
+        surface.blit(text, (position[0] + 5, y))
+        y += text.get_height()
+    return pygame.Rect(position, (width, height))
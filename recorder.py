@@ -0,0 +1,238 @@
+# recorder.py
+import json
+import os
+import queue
+import threading
+import numpy as np
+from ant import SoldierAnt
+from pheromone_field import PheromoneField, TiledPheromoneField
+
+EVENT_KINDS = ['pickup', 'delivery', 'stuck', 'replenish']
+
+# Bits of the per-ant state column
+CARRYING, RETURNING, FOUND_FOOD, SOLDIER = 1, 2, 4, 8
+
+class Recorder:
+    # Streams a run to a directory: header.json describes the world, then
+    # every chunk_frames recorded ticks are written as one .npz of columns
+    # (ant positions and states, pheromone grids, food layout, events) and
+    # listed in index.jsonl. Only the chunk being filled is held in memory;
+    # full chunks are compressed and written by a background thread. A chunk
+    # is also closed early once it holds chunk_frames pheromone grids or
+    # chunk_bytes of columns, so sparse frames next to frequent or large
+    # grids cannot grow it without bound.
+    def __init__(self, path, every=1, chunk_frames=256, compress=True, pheromone_every=10,
+                 chunk_bytes=16 * 2 ** 20):
+        self.path = path
+        self.every = every  # Record ant positions every N ticks (events are always kept)
+        self.chunk_frames = chunk_frames
+        self.chunk_bytes = chunk_bytes
+        self.compress = compress
+        self.pheromone_every = pheromone_every  # Pheromone grid every N ticks, 0 to skip
+        self.tick = 0
+        self.chunks = 0
+        self.frames_written = 0
+        self.events_written = 0
+        self._layout_key = None
+        self._queue = queue.Queue(maxsize=2)  # Bounds memory if the disk falls behind
+        self._writer = None
+        self.error = None  # Exception that stopped the writer, re-raised by flush() and close()
+        self._clear()
+
+    def _clear(self):
+        self._frame_ticks = []
+        self._positions = []
+        self._states = []
+        self._colonies = None  # Ant -> colony, fixed within a chunk
+        self._pheromone_ticks = []
+        self._pheromones = []
+        self._layout_ticks = []
+        self._food = []
+        self._spots = []
+        self._events = {'tick': [], 'kind': [], 'ant': [], 'x': [], 'y': []}
+        self._layout_key = None  # Every chunk starts with the food layout, so it can be read alone
+        self._bytes = 0  # Size of the columns buffered so far
+
+    def start(self, sim):
+        field = sim.pheromones
+        if not isinstance(field, PheromoneField):
+            raise ValueError("recordings need the grid pheromone model")
+        os.makedirs(self.path, exist_ok=True)
+        if isinstance(field, TiledPheromoneField):
+            self.pheromone_every = 0  # Dense grids of tiled worlds are too large to keep recording
+        header = {
+            'version': 1,
+            'seed': sim.seed,
+            'width': sim.screen_width,
+            'height': sim.screen_height,
+            'start_tick': sim.ticks,
+            'every': self.every,
+            'pheromone_every': self.pheromone_every,
+            'event_kinds': EVENT_KINDS,
+            'nest': [sim.nest.position.x, sim.nest.position.y],
+            'nests': [[nest.position.x, nest.position.y] for nest in sim.nests],
+            'obstacles': [[o.rect.x, o.rect.y, o.rect.width, o.rect.height] for o in sim.obstacles],
+            'pheromones': {'cell_size': field.cell_size, 'types': list(field.types),
+                           'max_strength': field.max_strength},
+        }
+        with open(os.path.join(self.path, 'header.json'), 'w') as f:
+            json.dump(header, f)
+        open(os.path.join(self.path, 'index.jsonl'), 'w').close()
+        self.tick = sim.ticks
+        self._writer = threading.Thread(target=self._write_chunks, daemon=True)
+        self._writer.start()
+
+    def event(self, kind, ant, x, y):
+        events = self._events
+        events['tick'].append(self.tick)
+        events['kind'].append(EVENT_KINDS.index(kind))
+        events['ant'].append(ant)
+        events['x'].append(x)
+        events['y'].append(y)
+
+    def events(self, kind, ants, xs, ys):
+        # Batched event() for the array engine
+        events = self._events
+        events['tick'].extend([self.tick] * len(ants))
+        events['kind'].extend([EVENT_KINDS.index(kind)] * len(ants))
+        events['ant'].extend(ants)
+        events['x'].extend(xs)
+        events['y'].extend(ys)
+
+    def record(self, sim):
+        # Called after every step; sim.ticks is the number of ticks simulated
+        # so far. A step of several ticks records once if it passed a multiple.
+        previous, tick = self.tick, sim.ticks
+        self.tick = tick
+        if tick // self.every != previous // self.every:
+            positions, states, colonies = ant_columns(sim)
+            if self._positions and len(positions) != len(self._positions[-1]):
+                self.flush()  # Colony size changed: columns need a new chunk
+            if self._colonies is None:
+                self._colonies = np.array(colonies, dtype=np.int16)
+            self._frame_ticks.append(tick)
+            self._positions.append(positions)
+            self._states.append(states)
+            self._bytes += positions.nbytes + states.nbytes
+
+        if self.pheromone_every and tick // self.pheromone_every != previous // self.pheromone_every:
+            grid = sim.pheromones.grid.astype(np.float16)
+            self._pheromone_ticks.append(tick)
+            self._pheromones.append(grid)
+            self._bytes += grid.nbytes
+
+        # Food only changes when items run out, spots are added or food is replenished
+        layout_key = (sim.foods.version, len(sim.food_spots))
+        if layout_key != self._layout_key:
+            self._layout_key = layout_key
+            self._layout_ticks.append(tick)
+            self._food.append(sim.foods.arrays()[1].astype(np.float32))
+            self._spots.append(np.array([(s.position.x, s.position.y, s.radius) for s in sim.food_spots],
+                                        dtype=np.float32).reshape(-1, 3))
+            self._bytes += self._food[-1].nbytes + self._spots[-1].nbytes
+
+        if (len(self._frame_ticks) >= self.chunk_frames or len(self._pheromones) >= self.chunk_frames or
+                self._bytes >= self.chunk_bytes):
+            self.flush()
+
+    def check(self):
+        if self.error is not None:
+            raise RuntimeError("recording writer stopped") from self.error
+
+    def flush(self):
+        self.check()
+        if not self._frame_ticks and not self._events['tick'] and not self._pheromone_ticks:
+            return
+        columns = {
+            'frame_ticks': np.array(self._frame_ticks, dtype=np.int64),
+            'positions': np.array(self._positions, dtype=np.float32).reshape(len(self._frame_ticks), -1, 2),
+            'states': np.array(self._states, dtype=np.uint8).reshape(len(self._frame_ticks), -1),
+            'colonies': self._colonies if self._colonies is not None else np.zeros(0, dtype=np.int16),
+            'pheromone_ticks': np.array(self._pheromone_ticks, dtype=np.int64),
+            'layout_ticks': np.array(self._layout_ticks, dtype=np.int64),
+            'food_offsets': np.cumsum([0] + [len(f) for f in self._food]),
+            'food': np.concatenate(self._food) if self._food else np.zeros((0, 2), dtype=np.float32),
+            'spot_offsets': np.cumsum([0] + [len(s) for s in self._spots]),
+            'spots': np.concatenate(self._spots) if self._spots else np.zeros((0, 3), dtype=np.float32),
+            'event_tick': np.array(self._events['tick'], dtype=np.int64),
+            'event_kind': np.array(self._events['kind'], dtype=np.uint8),
+            'event_ant': np.array(self._events['ant'], dtype=np.int32),
+            'event_x': np.array(self._events['x'], dtype=np.float32),
+            'event_y': np.array(self._events['y'], dtype=np.float32),
+        }
+        if self._pheromones:
+            columns['pheromones'] = np.stack(self._pheromones)
+        ticks = [columns[name] for name in ('frame_ticks', 'event_tick', 'pheromone_ticks')]
+        entry = {
+            'file': f"chunk_{self.chunks:06d}.npz",
+            'first_tick': int(min(t[0] for t in ticks if len(t))),
+            'last_tick': int(max(t[-1] for t in ticks if len(t))),
+            'frames': len(self._frame_ticks),
+            'events': len(self._events['tick']),
+        }
+        self.chunks += 1
+        self.frames_written += entry['frames']
+        self.events_written += entry['events']
+        self._clear()
+        self._queue.put((entry, columns))
+
+    def _write_chunks(self):
+        save = np.savez_compressed if self.compress else np.savez
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            if self.error is not None:
+                continue  # Keep draining the queue, so the simulation never blocks on it
+            entry, columns = item
+            try:
+                save(os.path.join(self.path, entry['file']), **columns)
+                # Indexed only once the chunk is complete on disk
+                with open(os.path.join(self.path, 'index.jsonl'), 'a') as f:
+                    f.write(json.dumps(entry) + '\n')
+            except Exception as error:
+                self.error = error
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            if self._writer is not None:
+                self._queue.put(None)
+                self._writer.join()
+                self._writer = None
+        self.check()
+
+def read_header(path):
+    with open(os.path.join(path, 'header.json')) as f:
+        return json.load(f)
+
+def read_index(path):
+    with open(os.path.join(path, 'index.jsonl')) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def load_chunk(path, entry):
+    with np.load(os.path.join(path, entry['file'])) as data:
+        return {name: data[name] for name in data.files}
+
+def load_events(path):
+    # All events of a recording as columns (events are small next to frames)
+    chunks = [load_chunk(path, entry) for entry in read_index(path)]
+    names = ['tick', 'kind', 'ant', 'x', 'y']
+    if not chunks:
+        return {name: np.zeros(0) for name in names}
+    return {name: np.concatenate([c['event_' + name] for c in chunks]) for name in names}
+
+def ant_columns(sim):
+    # Ant positions, state bits and colonies, from either the engine or the sprites
+    if sim.engine is not None:
+        engine = sim.engine
+        states = (engine.carrying_food * CARRYING | engine.returning_to_food * RETURNING |
+                  engine.has_found_food * FOUND_FOOD | engine.soldier * SOLDIER)
+        return engine.position.astype(np.float32), states.astype(np.uint8), engine.colony
+    ants = sim.ants.sprites()
+    positions = np.array([(a.position.x, a.position.y) for a in ants], dtype=np.float32).reshape(-1, 2)
+    states = np.array([a.carrying_food * CARRYING | a.returning_to_food * RETURNING |
+                       a.has_found_food * FOUND_FOOD | isinstance(a, SoldierAnt) * SOLDIER
+                       for a in ants], dtype=np.uint8)
+    return positions, states, [a.colony for a in ants]
@@ -0,0 +1,272 @@
+# replay.py
+import argparse
+import bisect
+from collections import OrderedDict
+import numpy as np
+import pygame
+from camera import Camera, blit_visible, handle_camera_event, pan_camera
+from food import Nest, FoodSpot, Food
+from obstacle import Obstacle
+from pheromone_field import PheromoneField
+from recorder import read_header, read_index, load_chunk, CARRYING, FOUND_FOOD, SOLDIER
+from spatial_hash import SpatialGroup
+from entity import shared_image
+
+ANT_COLORS = [(0, 0, 0), (255, 0, 0), (0, 0, 255)]  # Black, red while carrying, blue for fresh soldiers
+
+class Recording:
+    # Random access to the frames of a recorder directory. Only the index is
+    # read up front; chunks are loaded when a frame inside them is asked for
+    # and a few recently used ones are kept.
+    def __init__(self, path, cached_chunks=3):
+        self.path = path
+        self.header = read_header(path)
+        self.index = read_index(path)
+        self.numbers = [number for number, entry in enumerate(self.index) if entry['frames'] > 0]  # Chunks with frames
+        self.starts = np.cumsum([0] + [self.index[number]['frames'] for number in self.numbers]).tolist()
+        self.cached_chunks = cached_chunks
+        self._chunks = OrderedDict()
+
+    def __len__(self):
+        return self.starts[-1]
+
+    def chunk(self, number):
+        data = self._chunks.get(number)
+        if data is None:
+            data = load_chunk(self.path, self.index[number])
+            self._chunks[number] = data
+            if len(self._chunks) > self.cached_chunks:
+                self._chunks.popitem(last=False)
+        else:
+            self._chunks.move_to_end(number)
+        return data
+
+    def locate(self, frame):
+        position = bisect.bisect_right(self.starts, frame) - 1
+        return self.numbers[position], frame - self.starts[position]
+
+    def frame(self, frame):
+        # Everything needed to draw one recorded tick; the pheromone grid and
+        # food layout are the latest ones recorded at or before it (every
+        # chunk starts with its layout)
+        number, row = self.locate(frame)
+        data = self.chunk(number)
+        tick = int(data['frame_ticks'][row])
+        return {'tick': tick, 'positions': data['positions'][row], 'states': data['states'][row],
+                'layout': (number, max(latest(data['layout_ticks'], tick), 0)),
+                'pheromones': self.pheromones(number, tick)}
+
+    def pheromones(self, number, tick):
+        # Latest grid sampled at or before tick, from an earlier chunk when
+        # this one has none that early; None before the first sample
+        if not self.header.get('pheromone_every', 1):
+            return None
+        for number in range(number, -1, -1):
+            data = self.chunk(number)
+            if 'pheromones' in data:
+                row = latest(data['pheromone_ticks'], tick)
+                if row >= 0:
+                    return data['pheromones'][row]
+        return None
+
+    def layout(self, key):
+        number, row = key
+        data = self.chunk(number)
+        food = data['food'][data['food_offsets'][row]:data['food_offsets'][row + 1]]
+        spots = data['spots'][data['spot_offsets'][row]:data['spot_offsets'][row + 1]]
+        return food, spots
+
+    def frame_of_tick(self, tick):
+        # First frame at or after tick, found from the chunk index without loading chunks
+        for position, number in enumerate(self.numbers):
+            if self.index[number]['last_tick'] >= tick:
+                ticks = self.chunk(number)['frame_ticks']
+                return self.starts[position] + min(int(np.searchsorted(ticks, tick)), len(ticks) - 1)
+        return max(len(self) - 1, 0)
+
+def latest(ticks, tick):
+    # Row of the last tick at or before tick, -1 if there is none
+    return int(np.searchsorted(ticks, tick, side='right')) - 1
+
+class ReplayScene:
+    # Draws recorded frames with the same sprites and drawing code as Simulation.draw
+    def __init__(self, recording):
+        header = recording.header
+        self.recording = recording
+        self.obstacles = SpatialGroup((Obstacle(*rect) for rect in header['obstacles']), cell_size=100)
+        self.nest_group = pygame.sprite.Group(Nest(*xy) for xy in header.get('nests', [header['nest']]))
+        settings = header['pheromones']
+        self.pheromones = PheromoneField(header['width'], header['height'], settings['cell_size'],
+                                         settings['types'], max_strength=settings['max_strength'])
+        self.foods = pygame.sprite.Group()
+        self.food_spots = []
+        self._layout_key = None
+        self._ant_images = ant_images()
+
+    def set_layout(self, key):
+        if key == self._layout_key:
+            return
+        self._layout_key = key
+        food, spots = self.recording.layout(key)
+        self.foods.empty()
+        self.foods.add(Food(x, y) for x, y in food.tolist())
+        self.food_spots = [FoodSpot(x, y, int(radius)) for x, y, radius in spots.tolist()]
+
+    def draw(self, surface, frame, camera=None):
+        # With a camera only its view is drawn, like Simulation.draw_view
+        self.set_layout(frame['layout'])
+        if frame['pheromones'] is not None:
+            self.pheromones.grid = frame['pheromones'].astype(np.float32)
+        view = camera.view_rect() if camera is not None else pygame.Rect(0, 0, *surface.get_size())
+        canvas = camera.canvas() if camera is not None else surface
+
+        canvas.fill((255, 255, 255))
+        for spot in self.food_spots:
+            spot.draw(canvas, (-view.left, -view.top))
+        if frame['pheromones'] is not None:
+            self.pheromones.draw(canvas, view)
+        blit_visible(canvas, self.obstacles, view, padding=20)
+        blit_visible(canvas, self.foods, view)
+        blit_visible(canvas, self.nest_group, view)
+        draw_ants(canvas, self._ant_images, frame['positions'], frame['states'], view)
+        if camera is not None:
+            camera.present(canvas, surface)
+
+def ant_images(size=5):
+    return [shared_image((size, size), color) for color in ANT_COLORS]
+
+def draw_ants(canvas, images, positions, states, view, raster_above=500):
+    # Ants from position and state columns (see recorder.ant_columns), colored
+    # like the live sprites; only those inside the view are drawn. Beyond
+    # raster_above visible ants, the squares that fit the canvas are written
+    # straight into its pixels with NumPy, which is much faster than one blit
+    # per ant and leaves the GIL free for a simulation thread.
+    size = images[0].get_width()
+    colors = np.where(states & CARRYING, 1, np.where((states & SOLDIER) & ~(states & FOUND_FOOD), 2, 0))
+    topleft = np.floor(positions).astype(int) - size // 2
+    visible = ((topleft[:, 0] > view.left - size) & (topleft[:, 0] < view.right) &
+               (topleft[:, 1] > view.top - size) & (topleft[:, 1] < view.bottom))
+    colors, topleft = colors[visible], topleft[visible] - (view.left, view.top)
+    if len(colors) > raster_above:
+        width, height = canvas.get_size()
+        whole = ((topleft[:, 0] >= 0) & (topleft[:, 0] <= width - size) &
+                 (topleft[:, 1] >= 0) & (topleft[:, 1] <= height - size))
+        dx, dy = np.divmod(np.arange(size * size), size)
+        mapped = np.array([canvas.map_rgb(image.get_at((0, 0))) for image in images], dtype=np.uint32)
+        pixels = pygame.surfarray.pixels2d(canvas)
+        pixels[(topleft[whole, 0, None] + dx).ravel(), (topleft[whole, 1, None] + dy).ravel()] = \
+            np.repeat(mapped[colors[whole]], size * size)  # Later ants land on top, as with blits
+        del pixels
+        colors, topleft = colors[~whole], topleft[~whole]
+    canvas.blits([(images[c], (x, y)) for c, (x, y) in zip(colors.tolist(), topleft.tolist())], doreturn=False)
+
+class Player:
+    # Playback position in frames, advanced by wall time so slow draws skip
+    # frames instead of slowing the replay down
+    SPEEDS = [0.25, 0.5, 1, 2, 4, 8, 16, 32, 64]
+
+    def __init__(self, recording, ticks_per_second=60, speed=1):
+        self.recording = recording
+        self.frames_per_second = ticks_per_second / recording.header['every']
+        self.speed = speed
+        self.position = 0.0
+        self.paused = False
+
+    @property
+    def frame(self):
+        return min(int(self.position), max(len(self.recording) - 1, 0))
+
+    def advance(self, seconds):
+        if not self.paused:
+            self.position = min(self.position + seconds * self.frames_per_second * self.speed,
+                                len(self.recording) - 1)
+
+    def seek(self, frame):
+        self.position = float(min(max(frame, 0), len(self.recording) - 1))
+
+    def faster(self, steps=1):
+        index = min(max(self.SPEEDS.index(self.speed) + steps, 0), len(self.SPEEDS) - 1)
+        self.speed = self.SPEEDS[index]
+
+def draw_timeline(surface, font, player, tick, height=24):
+    # Progress bar along the bottom edge; clicking it seeks
+    width, bottom = surface.get_width(), surface.get_height()
+    panel = pygame.Surface((width, height), pygame.SRCALPHA)
+    panel.fill((255, 255, 255, 200))
+    surface.blit(panel, (0, bottom - height))
+    done = int(width * player.frame / max(len(player.recording) - 1, 1))
+    pygame.draw.rect(surface, (80, 80, 200), (0, bottom - 4, done, 4))
+    state = "paused" if player.paused else f"{player.speed}x"
+    text = font.render(f"tick {tick}  frame {player.frame + 1}/{len(player.recording)}  {state}", True, (0, 0, 0))
+    surface.blit(text, (5, bottom - height + 4))
+
+def main(path, speed=1, start_tick=0, window=(800, 600)):
+    recording = Recording(path)
+    if len(recording) == 0:
+        raise SystemExit(f"{path} has no recorded frames")
+    header = recording.header
+
+    pygame.init()
+    size = (min(header['width'], window[0]), min(header['height'], window[1]))
+    screen = pygame.display.set_mode(size)
+    pygame.display.set_caption(f"Ant Colony Replay - {path}")
+    camera = None
+    if size != (header['width'], header['height']):
+        # Worlds larger than the window are explored with a camera
+        camera = Camera(size[0], size[1], header['width'], header['height'])
+        camera.center_on(*header['nest'])
+    scene = ReplayScene(recording)
+    player = Player(recording, speed=speed)
+    player.seek(recording.frame_of_tick(start_tick))
+    font = pygame.font.Font(None, 20)
+    clock = pygame.time.Clock()
+
+    running = True
+    while running:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+            elif event.type == pygame.KEYDOWN:
+                # Space pauses, arrows step (shift: 100 frames), up/down change speed
+                jump = 100 if event.mod & pygame.KMOD_SHIFT else 1
+                if event.key == pygame.K_SPACE:
+                    player.paused = not player.paused
+                elif event.key == pygame.K_RIGHT:
+                    player.seek(player.frame + jump)
+                elif event.key == pygame.K_LEFT:
+                    player.seek(player.frame - jump)
+                elif event.key == pygame.K_UP:
+                    player.faster()
+                elif event.key == pygame.K_DOWN:
+                    player.faster(-1)
+                elif event.key == pygame.K_HOME:
+                    player.seek(0)
+                elif event.key == pygame.K_END:
+                    player.seek(len(recording) - 1)
+            elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+                if event.pos[1] >= screen.get_height() - 24:
+                    player.seek(event.pos[0] * (len(recording) - 1) // max(screen.get_width() - 1, 1))
+            elif camera is not None:
+                handle_camera_event(camera, event)
+
+        if camera is not None:
+            pan_camera(camera, pygame.key.get_pressed())
+        frame = recording.frame(player.frame)
+        scene.draw(screen, frame, camera)
+        draw_timeline(screen, font, player, frame['tick'])
+        pygame.display.flip()
+        player.advance(clock.tick(60) / 1000)
+
+    pygame.quit()
+
+def run(argv=None):
+    parser = argparse.ArgumentParser(description="Play back a run recorded with simulation.py --record.")
+    parser.add_argument('path', help="recording directory")
+    parser.add_argument('--speed', type=float, default=1, choices=Player.SPEEDS, help="initial playback speed")
+    parser.add_argument('--start', type=int, default=0, help="tick to start playing from")
+    parser.add_argument('--window', default='800x600', help="largest window size, WIDTHxHEIGHT")
+    args = parser.parse_args(argv)
+    main(args.path, args.speed, args.start, tuple(int(n) for n in args.window.split('x')))
+
+if __name__ == "__main__":
+    run()
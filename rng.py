@@ -0,0 +1,62 @@
+# rng.py
+import random
+import zlib
+import numpy as np
+
+class SimulationRNG:
+    # All randomness of one simulation, derived from a single seed. Each
+    # subsystem asks for its own named substream, so adding draws in one
+    # subsystem never shifts the numbers another one sees, and runs with
+    # different seeds are statistically independent (NumPy SeedSequence).
+    def __init__(self, seed=None):
+        self.seed_sequence = np.random.SeedSequence(seed)
+        self.seed = self.seed_sequence.entropy  # Fresh entropy is recorded, so any run can be repeated
+        self.streams = {}
+        self.generators = {}
+
+    def child(self, name):
+        key = zlib.crc32(name.encode('utf-8'))  # Stable across processes, unlike hash()
+        return np.random.SeedSequence(self.seed, spawn_key=(key,))
+
+    def stream(self, name):
+        # random.Random for per-sprite code (uniform, randint, choice, ...)
+        stream = self.streams.get(name)
+        if stream is None:
+            state = self.child(name).generate_state(4, np.uint64)
+            stream = random.Random(int.from_bytes(state.tobytes(), 'little'))
+            self.streams[name] = stream
+        return stream
+
+    def generator(self, name):
+        # NumPy Generator for batched draws
+        generator = self.generators.get(name)
+        if generator is None:
+            generator = np.random.Generator(np.random.PCG64(self.child(name)))
+            self.generators[name] = generator
+        return generator
+
+    def reseed(self, seed=None):
+        # Restart every stream from a new seed in place, so objects already
+        # holding a stream (ants, food spots) follow the new sequence too
+        self.seed_sequence = np.random.SeedSequence(seed)
+        self.seed = self.seed_sequence.entropy
+        for name, stream in self.streams.items():
+            state = self.child(name).generate_state(4, np.uint64)
+            stream.seed(int.from_bytes(state.tobytes(), 'little'))
+        for name, generator in self.generators.items():
+            generator.bit_generator.state = np.random.PCG64(self.child(name)).state
+
+    def getstate(self):
+        return {
+            'seed': self.seed,
+            'streams': {name: stream.getstate() for name, stream in self.streams.items()},
+            'generators': {name: generator.bit_generator.state for name, generator in self.generators.items()},
+        }
+
+    def setstate(self, state):
+        self.seed_sequence = np.random.SeedSequence(state['seed'])
+        self.seed = self.seed_sequence.entropy
+        for name, stream_state in state['streams'].items():
+            self.stream(name).setstate(stream_state)
+        for name, generator_state in state['generators'].items():
+            self.generator(name).bit_generator.state = generator_state
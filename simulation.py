@@ -0,0 +1,472 @@
+# simulation.py
+import argparse
+import math
+import time
+import numpy as np
+import pygame
+from ant import Ant, SoldierAnt
+from colony_engine import ColonyEngine
+from camera import blit_visible
+from entity import blit_all
+from obstacle import generate_obstacles, generate_world_obstacles, ObstacleMap, TiledObstacleMap, SHAPES
+from flow_field import FlowFields
+from food import Nest, FoodSpot, FoodGroup
+from lod import LevelOfDetail
+from metrics import ColonyMetrics, MetricsFile, MetricsServer
+from pheromone_field import PheromoneField, TiledPheromoneField, colony_channel
+from pheromone_list import PheromoneList
+from profiler import TickProfiler
+from recorder import Recorder
+from rng import SimulationRNG
+from spatial_hash import SpatialGroup
+from utils import is_valid_nest_position, is_valid_food_spot, create_food_spots
+
+# Worlds larger than this (in pixels) keep obstacles and pheromones in tiles by default
+TILED_AREA = 1920 * 1200
+
+class Simulation:
+    # The colony world without any window: builds obstacles, nest, food and
+    # ants, and advances them one fixed tick at a time. With build=False only
+    # the empty containers are set up (used when restoring a snapshot).
+    # screen_width/screen_height are the size of the world, which for tiled
+    # worlds is usually much larger than the window showing it.
+    # With num_colonies > 1 several nests of num_ants ants each compete for
+    # the same food spots; each colony lays and follows its own pheromone
+    # channel (see colony_channel) and keeps its own food stockpile.
+    # pheromone_model='list' keeps pheromones as individual deposits in a
+    # PheromoneList instead of the grid.
+    def __init__(self, screen_width=800, screen_height=600, num_ants=30, num_food_spots=2, vectorized=False,
+                 seed=None, shape=None, soldier_ratio=0.3, pheromone_drop_interval=20, decay_rate=0.2,
+                 perception_radius=100, build=True, tiled=None, num_colonies=1, pheromone_model='grid'):
+        # Independent random substreams per subsystem, all derived from one seed
+        self.rng = SimulationRNG(seed)
+        self.seed = self.rng.seed
+        self.screen_width = screen_width
+        self.screen_height = screen_height
+        self.tiled = tiled if tiled is not None else screen_width * screen_height > TILED_AREA
+        self.soldier_ratio = soldier_ratio
+        self.ant_params = {
+            'pheromone_drop_interval': pheromone_drop_interval,
+            'perception_radius': perception_radius,
+        }
+        self.ticks = 0
+        self.replenish_timer = 0
+        self.replenish_interval = 300  # Ticks between food replenishment
+
+        self.obstacles = SpatialGroup(cell_size=100)
+        self.obstacle_map = None
+        self.nests = []  # One per colony, indexed by colony
+        self.nest = None  # The first colony's nest
+        self.nest_group = pygame.sprite.Group()
+        self.channels = [colony_channel(colony) for colony in range(num_colonies)]
+        self.food_spots = []
+        self.foods = FoodGroup(cell_size=20)
+        self.ants = SpatialGroup(cell_size=50)
+        self.engine = None
+
+        # Initialize pheromone field (bounded by world size, not colony age)
+        if pheromone_model == 'list':
+            self.pheromones = PheromoneList(decay_rate=decay_rate)
+        else:
+            field = TiledPheromoneField if self.tiled else PheromoneField
+            self.pheromones = field(screen_width, screen_height, types=tuple(self.channels),
+                                    decay_rate=decay_rate)
+
+        # Per-phase timing, off unless enable_profiling() is called
+        self.profiler = None
+
+        # Trajectory and event stream, off unless enable_recording() is called
+        self.recorder = None
+
+        # Throughput and health samples, off unless enable_metrics() is called
+        self.metrics = None
+
+        # Level-of-detail scheduling, off (every ant every tick) unless enable_lod() is called
+        self.lod = None
+
+        # Obstacle-aware routes home and back to food, off unless enable_flow_fields() is called
+        self.flow = None
+
+        if build:
+            self.build_world(num_ants, num_food_spots, shape, vectorized)
+
+    def build_world(self, num_ants, num_food_spots, shape, vectorized):
+        world_rng = self.rng.stream('world')
+
+        # Create obstacle group
+        if self.tiled:
+            generate_world_obstacles(self.obstacles, self.screen_width, self.screen_height, shape, rng=world_rng)
+        else:
+            generate_obstacles(self.obstacles, self.screen_width, self.screen_height, shape, rng=world_rng)
+        self.obstacle_map = self.make_obstacle_map()
+
+        # Create a valid nest position for each colony, spaced out so small
+        # worlds still fit every nest
+        spacing = min(150, math.sqrt(self.screen_width * self.screen_height / len(self.channels)) / 2)
+        for _ in self.channels:
+            while True:
+                nest_x = world_rng.randint(50, self.screen_width - 50)
+                nest_y = world_rng.randint(50, self.screen_height - 50)
+                if is_valid_nest_position(nest_x, nest_y, self.obstacles, nests=self.nests, nest_distance=spacing):
+                    break
+            self.add_nest(Nest(nest_x, nest_y))
+
+        # Create food spots and food sources
+        for spot in create_food_spots(num_food_spots, self.obstacles, self.screen_width, self.screen_height,
+                                      rng=self.rng.stream('food')):
+            self.add_spot(spot)
+
+        # Create ants
+        for colony in range(len(self.nests)):
+            self.spawn_ants(num_ants, colony)
+
+        # Optionally hand the colonies over to the array-based engine
+        if vectorized:
+            self.use_engine(ColonyEngine.from_sprites(self.ants, self.nests, self.screen_width,
+                                                      self.screen_height, self.rng.generator('engine')))
+
+    def make_obstacle_map(self):
+        kind = TiledObstacleMap if self.tiled else ObstacleMap
+        return kind(self.obstacles, self.screen_width, self.screen_height)
+
+    def add_nest(self, nest):
+        if self.nest is None:
+            self.nest = nest
+        self.nests.append(nest)
+        self.nest_group.add(nest)
+
+    def add_spot(self, spot):
+        self.food_spots.append(spot)
+        self.foods.add(*spot.food_items)
+
+    def use_engine(self, engine):
+        self.engine = engine
+        for name, value in self.ant_params.items():
+            setattr(engine, name, value)
+        engine.profiler = self.profiler
+        engine.recorder = self.event_sink()
+        engine.lod = self.lod
+        engine.flow = self.flow
+        engine.food_spots = self.food_spots
+
+    def enable_profiling(self, window=120):
+        self.profiler = TickProfiler(window)
+        for ant in self.ants:
+            ant.profiler = self.profiler
+        if self.engine is not None:
+            self.engine.profiler = self.profiler
+        return self.profiler
+
+    def event_sink(self):
+        # Where ants report pickups, deliveries and stuck checks: the metrics
+        # when enabled (they pass them on to the recorder), else the recorder
+        if self.metrics is not None:
+            self.metrics.recorder = self.recorder
+            return self.metrics
+        return self.recorder
+
+    def connect_events(self):
+        sink = self.event_sink()
+        for ant in self.ants:
+            ant.recorder = sink
+        if self.engine is not None:
+            self.engine.recorder = sink
+
+    def enable_recording(self, recorder):
+        self.recorder = recorder
+        self.connect_events()
+        recorder.start(self)
+        return recorder
+
+    def enable_metrics(self, metrics=None):
+        # Sample colony throughput and health every metrics.interval ticks
+        self.metrics = metrics if metrics is not None else ColonyMetrics()
+        self.connect_events()
+        self.metrics.start(self)
+        return self.metrics
+
+    def enable_lod(self, lod=None):
+        # Update distant and steady ants less often; set lod.focus to the
+        # visible world Rect so the ants on screen keep full detail
+        self.lod = lod if lod is not None else LevelOfDetail()
+        if self.engine is not None:
+            self.engine.lod = self.lod
+        return self.lod
+
+    def enable_flow_fields(self, flow=None):
+        # Route ants heading home or back to food around obstacles. Fields are
+        # built per nest and food spot on first use and cached from then on.
+        self.flow = flow if flow is not None else FlowFields(self.obstacles, self.screen_width, self.screen_height)
+        for ant in self.ants:
+            ant.flow = self.flow
+        if self.engine is not None:
+            self.engine.flow = self.flow
+        return self.flow
+
+    def make_ant(self, x, y, soldier, colony=0):
+        kind = SoldierAnt if soldier else Ant
+        ant = kind(x, y, self.screen_width, self.screen_height, self.nests[colony],
+                   self.rng.stream('ants'), self.rng.generator('ants'))
+        ant.colony = colony
+        ant.pheromone_type = self.channels[colony]
+        for name, value in self.ant_params.items():
+            setattr(ant, name, value)
+        ant.profiler = self.profiler
+        ant.recorder = self.event_sink()
+        ant.flow = self.flow
+        ant.ant_id = len(self.ants)
+        self.ants.add(ant)
+        return ant
+
+    def spawn_ants(self, count, colony=0):
+        spawn_rng = self.rng.stream('spawn')
+        nest = self.nests[colony]
+        for i in range(count):
+            while True:
+                x = nest.rect.centerx + spawn_rng.randint(-20, 20)
+                y = nest.rect.centery + spawn_rng.randint(-20, 20)
+                if not self.obstacle_map.collidepoint((x, y)):
+                    # Randomly assign as worker ant or soldier ant
+                    self.make_ant(x, y, soldier=spawn_rng.random() >= 1 - self.soldier_ratio, colony=colony)
+                    break
+
+    @property
+    def ant_count(self):
+        return len(self.engine) if self.engine is not None else len(self.ants)
+
+    def add_food_spot(self, x, y):
+        if not is_valid_food_spot(x, y, self.obstacles, self.food_spots):
+            return False
+        new_spot = FoodSpot(x, y, rng=self.rng.stream('food'))
+        new_spot.add_food(30)  # Add initial food items
+        self.add_spot(new_spot)
+        return True
+
+    def update_ants(self, dt=1):
+        if self.engine is not None:
+            self.engine.step(self.obstacle_map, self.foods, self.pheromones, dt)
+        else:
+            self.ants.reindex()
+            if self.lod is not None:
+                self.update_ants_lod(dt)
+                return
+            for ant in self.ants:
+                ant.update(self.obstacle_map, self.foods, self.pheromones, dt)
+
+    def update_ants_lod(self, step=1):
+        # Sprite ants the LevelOfDetail scheduler says are due, each covering
+        # its dt; the scheduler counts in steps of step ticks
+        ants = self.ants.sprites()
+        positions = np.array([(a.position.x, a.position.y) for a in ants]).reshape(-1, 2)
+        carrying = np.array([a.carrying_food for a in ants], dtype=bool)
+        returning = np.array([a.returning_to_food for a in ants], dtype=bool)
+        nests = np.array([(a.nest.position.x, a.nest.position.y) for a in ants]).reshape(-1, 2)
+        speed = ants[0].max_speed * step if ants else 0
+        active, dt = self.lod.plan(positions, carrying, returning, nests, self.obstacle_map, self.foods, speed)
+        for index, ticks in zip(active.tolist(), (dt * step).tolist()):
+            ants[index].update(self.obstacle_map, self.foods, self.pheromones, ticks)
+        # Skipped ants still record where they are, so stuck detection sees ticks, not updates
+        skipped = np.ones(len(ants), dtype=bool)
+        skipped[active] = False
+        for index in np.nonzero(skipped)[0].tolist():
+            ants[index].update_movement_memory()
+
+    def update_pheromones(self, dt=1):
+        self.pheromones.update(dt)
+
+    def replenish_food(self, dt=1):
+        # Replenish food periodically
+        self.replenish_timer += dt
+        if self.replenish_timer >= self.replenish_interval:
+            self.replenish_timer -= self.replenish_interval
+            for spot in self.food_spots:
+                if len(spot.food_items) < spot.max_food // 2:  # Replenish if below half capacity
+                    self.foods.add(*spot.add_food(5))  # Add 5 new food items
+                    if self.recorder is not None:
+                        self.recorder.event('replenish', -1, spot.position.x, spot.position.y)
+
+    def step(self, n=1, dt=1):
+        # n steps of dt ticks each. In a step of several ticks every ant
+        # moves, steers and drops pheromones for all of them at once (as ants
+        # slowed down by LevelOfDetail do), and decay and replenishment run
+        # on ticks, so speeds and rates per tick do not depend on the step.
+        # Ants move max_speed * dt pixels per step, so steps much above 4
+        # ticks let them pass food or thin walls between two checks.
+        profiler = self.profiler
+        for _ in range(n):
+            if self.metrics is not None:
+                started = time.perf_counter()
+            if profiler is not None:
+                profiler.begin_tick()
+            self.update_ants(dt)
+            if profiler is not None:
+                profiler.lap()
+            self.update_pheromones(dt)
+            if profiler is not None:
+                profiler.lap('pheromones')
+            self.replenish_food(dt)
+            if profiler is not None:
+                profiler.lap('replenish')
+                profiler.gauge('ants', self.ant_count)
+                profiler.gauge('food items', len(self.foods))
+                profiler.gauge('pheromone cells', len(self.pheromones))
+                if self.lod is not None:
+                    profiler.gauge('ant updates', self.lod.last_updates)
+            self.ticks += dt
+            if self.recorder is not None:
+                self.recorder.record(self)
+            if self.metrics is not None:
+                self.metrics.record(self, time.perf_counter() - started)
+
+    def stats(self):
+        stats = {
+            'seed': self.seed,
+            'ticks': self.ticks,
+            'food_stored': sum(nest.food_stored for nest in self.nests),
+            'trips_completed': sum(nest.trips_completed for nest in self.nests),
+            'colony_food_stored': [nest.food_stored for nest in self.nests],
+            'ants': self.ant_count,
+            'food_items': len(self.foods),
+            'food_spots': len(self.food_spots),
+            'pheromone_cells': len(self.pheromones),
+            'pheromone_strength': round(self.pheromones.total_strength(), 1),
+        }
+        if isinstance(self.pheromones, PheromoneList):
+            stats.update({'pheromone_' + name: value for name, value in self.pheromones.stats().items()
+                          if name != 'deposits'})
+        return stats
+
+    def draw(self, surface, camera=None):
+        if camera is not None:
+            self.draw_view(surface, camera)
+            return
+        if self.profiler is not None:
+            self.profiler.lap()
+        surface.fill((255, 255, 255))  # White background
+
+        # Draw food spots first
+        for spot in self.food_spots:
+            spot.draw(surface)
+
+        # Draw pheromones
+        self.pheromones.draw(surface)
+
+        # Draw other sprites in one batch
+        if self.engine is not None:
+            blit_all(surface, self.obstacles, self.foods, self.nest_group)
+            self.engine.draw(surface)
+        else:
+            blit_all(surface, self.obstacles, self.foods, self.nest_group, self.ants)
+        if self.profiler is not None:
+            self.profiler.lap('draw')
+
+    def draw_view(self, surface, camera):
+        # Same layers as draw(), limited to what the camera can see
+        if self.profiler is not None:
+            self.profiler.lap()
+        view = camera.view_rect()
+        canvas = camera.canvas()
+        canvas.fill((255, 255, 255))
+        offset = (-view.left, -view.top)
+
+        for spot in self.food_spots:
+            if view.inflate(2 * spot.radius, 2 * spot.radius).collidepoint(spot.position):
+                spot.draw(canvas, offset)
+        self.pheromones.draw(canvas, view)
+        blit_visible(canvas, self.obstacles, view, padding=20)
+        blit_visible(canvas, self.foods, view, padding=5)
+        blit_visible(canvas, self.nest_group, view)
+        if self.engine is not None:
+            self.engine.draw(canvas, view)
+        else:
+            blit_visible(canvas, self.ants, view, padding=10)
+        camera.present(canvas, surface)
+        if self.profiler is not None:
+            self.profiler.lap('draw')
+
+def run(argv=None):
+    parser = argparse.ArgumentParser(description="Run the ant colony simulation without a window.")
+    parser.add_argument('--ticks', type=int, default=1000, help="number of ticks to simulate")
+    parser.add_argument('--ants', type=int, default=30, help="number of ants to spawn per colony")
+    parser.add_argument('--colonies', type=int, default=1, help="number of competing colonies")
+    parser.add_argument('--food-spots', type=int, default=2, help="number of initial food spots")
+    parser.add_argument('--width', type=int, default=800, help="world width")
+    parser.add_argument('--height', type=int, default=600, help="world height")
+    parser.add_argument('--tiled', action='store_true', default=None,
+                        help="keep obstacles and pheromones in tiles (default for worlds over 1920x1200)")
+    parser.add_argument('--vectorized', action='store_true', help="use the array-based ColonyEngine")
+    parser.add_argument('--seed', type=int, default=None, help="seed for a reproducible run")
+    parser.add_argument('--shape', choices=SHAPES, default=None, help="obstacle layout (random by default)")
+    parser.add_argument('--report-every', type=int, default=0, help="print stats every N ticks (0: only at the end)")
+    parser.add_argument('--profile', action='store_true', help="time each phase of the tick and report averages")
+    parser.add_argument('--lod', action='store_true', help="update distant and steady ants less often")
+    parser.add_argument('--lod-far', type=int, default=4, help="ticks between updates of idle off-screen ants")
+    parser.add_argument('--lod-steady', type=int, default=2, help="ticks between updates of ants in a steady state")
+    parser.add_argument('--flow-fields', action='store_true', help="route ants home and back to food around obstacles")
+    parser.add_argument('--pheromones', choices=['grid', 'list'], default='grid',
+                        help="pheromone model: a grid of cells, or individual merged deposits")
+    parser.add_argument('--pheromone-cap', type=int, default=20000,
+                        help="most deposits kept by the list model before the weakest are evicted")
+    parser.add_argument('--record', default=None, help="directory to stream trajectories and events to")
+    parser.add_argument('--record-every', type=int, default=1, help="record ant positions every N ticks")
+    parser.add_argument('--no-compress', action='store_true', help="write recording chunks uncompressed")
+    parser.add_argument('--metrics', default=None, help="file to append metrics samples to (.csv, else JSON lines)")
+    parser.add_argument('--metrics-every', type=int, default=100, help="ticks between metrics samples")
+    parser.add_argument('--metrics-port', type=int, default=None, help="serve metrics over HTTP on this local port")
+    parser.add_argument('--alert-min-food', type=int, default=None,
+                        help="flag samples with less food delivered in their interval")
+    parser.add_argument('--alert-max-pheromones', type=int, default=None,
+                        help="flag samples with more pheromone cells (or deposits)")
+    args = parser.parse_args(argv)
+
+    sim = Simulation(args.width, args.height, args.ants, args.food_spots, args.vectorized,
+                     seed=args.seed, shape=args.shape, tiled=args.tiled, num_colonies=args.colonies,
+                     pheromone_model=args.pheromones)
+    if args.pheromones == 'list':
+        sim.pheromones.max_deposits = args.pheromone_cap
+    if args.profile:
+        sim.enable_profiling()
+    if args.lod:
+        sim.enable_lod(LevelOfDetail(far_interval=args.lod_far, steady_interval=args.lod_steady))
+    if args.flow_fields:
+        sim.enable_flow_fields()
+    if args.record:
+        sim.enable_recording(Recorder(args.record, every=args.record_every, compress=not args.no_compress))
+    server = None
+    if args.metrics or args.metrics_port is not None:
+        metrics = sim.enable_metrics(ColonyMetrics(args.metrics_every, min_food_delivered=args.alert_min_food,
+                                                   max_pheromones=args.alert_max_pheromones))
+        if args.metrics:
+            metrics.writers.append(MetricsFile(args.metrics))
+        if args.metrics_port is not None:
+            server = MetricsServer(metrics, args.metrics_port).start()
+    start = time.perf_counter()
+    remaining = args.ticks
+    while remaining > 0:
+        n = min(remaining, args.report_every) if args.report_every > 0 else remaining
+        sim.step(n)
+        remaining -= n
+        if remaining > 0:
+            print(sim.stats())
+            if sim.profiler is not None:
+                print(sim.profiler.report())
+
+    if sim.recorder is not None:
+        sim.recorder.close()
+    if sim.metrics is not None:
+        sim.metrics.close()
+    if server is not None:
+        server.close()
+    elapsed = time.perf_counter() - start
+    stats = sim.stats()
+    stats['seconds'] = round(elapsed, 3)
+    stats['ticks_per_second'] = round(sim.ticks / elapsed, 1) if elapsed > 0 else None
+    print(stats)
+    if sim.profiler is not None:
+        print(sim.profiler.report())
+    if sim.lod is not None:
+        print(sim.lod.report())
+    return stats
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,296 @@
+# snapshot.py
+import argparse
+import json
+import struct
+import numpy as np
+import pygame
+from colony_engine import ColonyEngine, ANT_ARRAYS as ENGINE_ARRAYS
+from entity import COLORS
+from food import Nest, FoodSpot, Food, spot_index
+from obstacle import Obstacle
+from pheromone_field import PheromoneField
+from simulation import Simulation
+
+# File layout: magic, format version, header length, JSON header, then raw
+# little-endian arrays at 64-byte aligned offsets recorded in the header, so
+# a loader can memory-map them instead of reading the whole file.
+MAGIC = b'ANTSNAP\0'
+VERSION = 1
+ALIGN = 64
+
+ANT_VECTORS = ['position', 'velocity', 'current_direction']
+ANT_FLAGS = ['carrying_food', 'has_found_food', 'returning_to_food', 'successful_trip']
+ANT_COUNTERS = ['pheromone_timer', 'direction_timer', 'direction_persistence',
+                'direction_change_interval', 'last_direction_change', 'last_stuck_check']
+
+def write_file(path, meta, arrays):
+    header = {'meta': meta, 'arrays': {}}
+    offset = 0
+    blobs = []
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        array = array.astype(array.dtype.newbyteorder('<'), copy=False)
+        header['arrays'][name] = {'offset': offset, 'dtype': array.dtype.str, 'shape': list(array.shape)}
+        blobs.append(array)
+        offset += -(-array.nbytes // ALIGN) * ALIGN
+
+    encoded = json.dumps(header).encode('utf-8')
+    data_start = -(-(len(MAGIC) + 8 + len(encoded)) // ALIGN) * ALIGN
+    with open(path, 'wb') as f:
+        f.write(MAGIC + struct.pack('<II', VERSION, len(encoded)) + encoded)
+        f.write(b'\0' * (data_start - f.tell()))
+        for array in blobs:
+            f.write(array.tobytes())
+            f.write(b'\0' * (-array.nbytes % ALIGN))
+    return data_start + offset
+
+def read_file(path, mmap=True):
+    with open(path, 'rb') as f:
+        magic = f.read(len(MAGIC))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a colony snapshot")
+        version, header_length = struct.unpack('<II', f.read(8))
+        if version > VERSION:
+            raise ValueError(f"{path} uses snapshot format {version}, newer than supported {VERSION}")
+        header = json.loads(f.read(header_length).decode('utf-8'))
+        data_start = -(-(len(MAGIC) + 8 + header_length) // ALIGN) * ALIGN
+
+        arrays = {}
+        for name, spec in header['arrays'].items():
+            dtype = np.dtype(spec['dtype'])
+            shape = tuple(spec['shape'])
+            if mmap and int(np.prod(shape)) > 0:
+                # Copy-on-write: the simulation may modify them without touching the file
+                arrays[name] = np.memmap(path, dtype=dtype, mode='c', offset=data_start + spec['offset'],
+                                         shape=shape).view(np.ndarray)
+            else:
+                f.seek(data_start + spec['offset'])
+                count = int(np.prod(shape))
+                arrays[name] = np.frombuffer(f.read(count * dtype.itemsize), dtype=dtype).reshape(shape).copy()
+    return header['meta'], arrays
+
+def encode_rng_state(state):
+    # random.Random states are nested tuples; JSON turns them into lists
+    return {'seed': state['seed'], 'streams': state['streams'], 'generators': state['generators']}
+
+def decode_rng_state(state):
+    streams = {name: (version, tuple(internal), gauss)
+               for name, (version, internal, gauss) in state['streams'].items()}
+    return {'seed': state['seed'], 'streams': streams, 'generators': state['generators']}
+
+def capture(sim):
+    # Everything needed to continue the run, split into JSON metadata and arrays
+    field = sim.pheromones
+    if not isinstance(field, PheromoneField):
+        raise ValueError("snapshots need the grid pheromone model")
+    meta = {
+        'width': sim.screen_width,
+        'height': sim.screen_height,
+        'ticks': sim.ticks,
+        'replenish_timer': sim.replenish_timer,
+        'replenish_interval': sim.replenish_interval,
+        'soldier_ratio': sim.soldier_ratio,
+        'tiled': sim.tiled,
+        'flow_fields': sim.flow is not None,
+        'ant_params': sim.ant_params,
+        'rng': encode_rng_state(sim.rng.getstate()),
+        'nests': [{'x': nest.position.x, 'y': nest.position.y, 'food_stored': nest.food_stored,
+                   'trips_completed': nest.trips_completed} for nest in sim.nests],
+        'pheromones': {'cell_size': field.cell_size, 'types': list(field.types),
+                       'decay_rate': field.decay_rate, 'max_strength': field.max_strength},
+        'food_spots': [{'radius': spot.radius, 'max_food': spot.max_food} for spot in sim.food_spots],
+        'engine': None,
+    }
+
+    arrays = {
+        'obstacles': np.array([(o.rect.x, o.rect.y, o.rect.width, o.rect.height) for o in sim.obstacles],
+                              dtype=np.int32).reshape(-1, 4),
+        'pheromone_grid': field.grid,
+        'spot_positions': np.array([(s.position.x, s.position.y) for s in sim.food_spots]).reshape(-1, 2),
+    }
+
+    # Food items: owning spot, position, remaining amount and whether ants can
+    # still find it (always, since spots drop used up items; older files kept them)
+    items = [(index, food.position.x, food.position.y, food.amount, food in sim.foods)
+             for index, spot in enumerate(sim.food_spots) for food in spot.food_items]
+    arrays['food_spot_index'] = np.array([item[0] for item in items], dtype=np.int32)
+    arrays['food_positions'] = np.array([item[1:3] for item in items], dtype=float).reshape(-1, 2)
+    arrays['food_amounts'] = np.array([item[3] for item in items], dtype=np.int32)
+    arrays['food_active'] = np.array([item[4] for item in items], dtype=bool)
+
+    if sim.engine is not None:
+        engine = sim.engine
+        meta['engine'] = {'memory_head': engine.memory.head, 'rng': engine.rng.bit_generator.state}
+        for name in ENGINE_ARRAYS:
+            arrays['engine_' + name] = getattr(engine, name)
+        arrays['engine_memory'] = engine.memory.points
+        arrays['engine_memory_count'] = engine.memory.count
+        return meta, arrays
+
+    ants = sim.ants.sprites()
+    for name in ANT_VECTORS:
+        arrays['ant_' + name] = np.array([(getattr(a, name).x, getattr(a, name).y) for a in ants]).reshape(-1, 2)
+    for name in ANT_FLAGS:
+        arrays['ant_' + name] = np.array([getattr(a, name) for a in ants], dtype=bool)
+    for name in ANT_COUNTERS:
+        arrays['ant_' + name] = np.array([getattr(a, name) for a in ants], dtype=np.int32)
+    arrays['ant_exploration_bias'] = np.array([a.exploration_bias for a in ants], dtype=float)
+    arrays['ant_soldier'] = np.array([hasattr(a, 'protection_radius') for a in ants], dtype=bool)
+    arrays['ant_colony'] = np.array([a.colony for a in ants], dtype=np.int32)
+    arrays['ant_color'] = np.array([COLORS[a.color] for a in ants], dtype=np.uint8).reshape(-1, 3)
+    arrays['ant_last_food'] = np.array([(a.last_food_position.x, a.last_food_position.y)
+                                        if a.last_food_position is not None else (0, 0)
+                                        for a in ants], dtype=float).reshape(-1, 2)
+    arrays['ant_has_last_food'] = np.array([a.last_food_position is not None for a in ants], dtype=bool)
+
+    # Movement memory padded to memory_length, oldest first
+    length = max((a.memory_length for a in ants), default=0)
+    memory = np.zeros((len(ants), length, 2))
+    memory_count = np.zeros(len(ants), dtype=np.int32)
+    for i, ant in enumerate(ants):
+        points = ant.movement_memory.ordered()
+        memory_count[i] = len(points)
+        memory[i, :len(points)] = points
+    arrays['ant_memory'] = memory
+    arrays['ant_memory_count'] = memory_count
+    return meta, arrays
+
+def save_snapshot(sim, path):
+    meta, arrays = capture(sim)
+    return write_file(path, meta, arrays)
+
+def load_snapshot(path, reseed=None, mmap=True):
+    # Rebuild a Simulation from a snapshot; reseed gives a fork its own random future
+    meta, arrays = read_file(path, mmap)
+    params = meta['ant_params']
+    nests = meta['nests'] if 'nests' in meta else [meta['nest']]  # Single-colony snapshots have one 'nest'
+    sim = Simulation(meta['width'], meta['height'], soldier_ratio=meta['soldier_ratio'],
+                     pheromone_drop_interval=params['pheromone_drop_interval'],
+                     perception_radius=params['perception_radius'],
+                     decay_rate=meta['pheromones']['decay_rate'], build=False, tiled=meta.get('tiled', False),
+                     num_colonies=len(nests))
+    sim.ticks = meta['ticks']
+    sim.replenish_timer = meta['replenish_timer']
+    sim.replenish_interval = meta['replenish_interval']
+
+    for x, y, width, height in arrays['obstacles'].tolist():
+        sim.obstacles.add(Obstacle(x, y, width, height))
+    sim.obstacle_map = sim.make_obstacle_map()
+
+    for spec in nests:
+        nest = Nest(spec['x'], spec['y'])
+        nest.food_stored = spec['food_stored']
+        nest.trips_completed = spec['trips_completed']
+        sim.add_nest(nest)
+
+    field = sim.pheromones
+    field.cell_size = meta['pheromones']['cell_size']
+    field.max_strength = meta['pheromones']['max_strength']
+    grid = arrays['pheromone_grid']
+    saved = meta['pheromones']['types']
+    if list(saved) != list(field.types):
+        grid = grid[[saved.index(type) for type in field.types]]  # Older snapshots also kept an empty 'home' layer
+    field.grid = grid
+
+    food_rng = sim.rng.stream('food')
+    spots = []
+    for (x, y), spec in zip(arrays['spot_positions'].tolist(), meta['food_spots']):
+        spot = FoodSpot(x, y, spec['radius'], rng=food_rng)
+        spot.max_food = spec['max_food']
+        spots.append(spot)
+    active = []
+    for index, (x, y), amount, live in zip(arrays['food_spot_index'].tolist(), arrays['food_positions'].tolist(),
+                                           arrays['food_amounts'].tolist(), arrays['food_active'].tolist()):
+        if live:
+            active.append(spots[index].add_item(Food(x, y, amount)))
+    sim.food_spots = spots
+    sim.foods.add(*active)
+
+    if meta['engine'] is not None:
+        engine = ColonyEngine(sim.nests, sim.screen_width, sim.screen_height, sim.rng.generator('engine'))
+        if 'engine_stuck_timer' not in arrays:  # Saved before stuck checks ran on an interval
+            arrays['engine_stuck_timer'] = np.zeros(len(arrays['engine_position']), dtype=np.int32)
+        if 'engine_colony' not in arrays:  # Saved before colonies
+            arrays['engine_colony'] = np.zeros(len(arrays['engine_position']), dtype=np.int32)
+        if 'engine_last_food_spot' not in arrays:  # Saved before ants remembered their food spot
+            arrays['engine_last_food_spot'] = np.array(
+                [spot_index(spots, point) if known else -1 for point, known in
+                 zip(arrays['engine_last_food_position'].tolist(), arrays['engine_has_last_food'].tolist())],
+                dtype=np.int32)
+        for name in ENGINE_ARRAYS:
+            setattr(engine, name, arrays['engine_' + name])
+        engine.count = len(engine.position)
+        engine.memory.points = arrays['engine_memory']
+        engine.memory.count = arrays['engine_memory_count']
+        engine.memory.head = meta['engine']['memory_head']
+        engine.memory.resync()
+        sim.use_engine(engine)
+    else:
+        restore_ants(sim, arrays)
+
+    if meta.get('flow_fields'):
+        sim.enable_flow_fields()  # Fields are rebuilt on first use
+
+    # Random state last: building the objects above draws from the streams
+    sim.rng.setstate(decode_rng_state(meta['rng']))
+    sim.seed = sim.rng.seed
+    if reseed is not None:
+        sim.rng.reseed(reseed)
+        sim.seed = sim.rng.seed
+    return sim
+
+def restore_ants(sim, arrays):
+    count = len(arrays['ant_position'])
+    color_codes = {rgb: code for code, rgb in COLORS.items()}  # Saved as RGB, like the old per-ant images
+    colonies = arrays['ant_colony'] if 'ant_colony' in arrays else np.zeros(count, dtype=np.int32)
+    for i in range(count):
+        x, y = arrays['ant_position'][i].tolist()
+        ant = sim.make_ant(x, y, bool(arrays['ant_soldier'][i]), int(colonies[i]))
+        for name in ANT_VECTORS:
+            setattr(ant, name, pygame.math.Vector2(*arrays['ant_' + name][i].tolist()))
+        for name in ANT_FLAGS:
+            setattr(ant, name, bool(arrays['ant_' + name][i]))
+        for name in ANT_COUNTERS:
+            setattr(ant, name, int(arrays['ant_' + name][i]))
+        ant.exploration_bias = float(arrays['ant_exploration_bias'][i])
+        if arrays['ant_has_last_food'][i]:
+            ant.last_food_position = pygame.math.Vector2(*arrays['ant_last_food'][i].tolist())
+            spot = spot_index(sim.food_spots, ant.last_food_position)
+            ant.last_food_spot = sim.food_spots[spot] if spot >= 0 else None
+        ant.movement_memory.extend(arrays['ant_memory'][i, :arrays['ant_memory_count'][i]].tolist())
+        ant.color = color_codes[tuple(arrays['ant_color'][i].tolist())]
+        ant.rect.center = ant.position
+    return count
+
+def run(argv=None):
+    parser = argparse.ArgumentParser(description="Save or resume colony snapshots.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    save = commands.add_parser('save', help="simulate a new colony and save it")
+    save.add_argument('path')
+    save.add_argument('--ticks', type=int, default=1000, help="warm-up ticks before saving")
+    save.add_argument('--ants', type=int, default=30)
+    save.add_argument('--colonies', type=int, default=1)
+    save.add_argument('--seed', type=int, default=None)
+    save.add_argument('--vectorized', action='store_true')
+    resume = commands.add_parser('resume', help="load a snapshot and keep simulating")
+    resume.add_argument('path')
+    resume.add_argument('--ticks', type=int, default=1000)
+    resume.add_argument('--reseed', type=int, default=None, help="fork with a new random future")
+    resume.add_argument('--out', default=None, help="save the resumed colony here afterwards")
+    args = parser.parse_args(argv)
+
+    if args.command == 'save':
+        sim = Simulation(num_ants=args.ants, seed=args.seed, vectorized=args.vectorized,
+                         num_colonies=args.colonies)
+        sim.step(args.ticks)
+        size = save_snapshot(sim, args.path)
+        print(f"Saved tick {sim.ticks} to {args.path} ({size} bytes)")
+    else:
+        sim = load_snapshot(args.path, reseed=args.reseed)
+        sim.step(args.ticks)
+        print(sim.stats())
+        if args.out:
+            save_snapshot(sim, args.out)
+
+if __name__ == "__main__":
+    run()
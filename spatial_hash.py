@@ -0,0 +1,98 @@
+# spatial_hash.py
+import pygame
+
+class SpatialHash:
+    def __init__(self, cell_size=50):
+        self.cell_size = cell_size
+        self.cells = {}  # (col, row) -> {item: None}, dicts keep insertion order
+        self.item_cells = {}  # item -> (col, row) it is currently filed under
+
+    def __len__(self):
+        return len(self.item_cells)
+
+    def key(self, x, y):
+        return (int(x // self.cell_size), int(y // self.cell_size))
+
+    def insert(self, item, x, y):
+        key = self.key(x, y)
+        self.cells.setdefault(key, {})[item] = None
+        self.item_cells[item] = key
+
+    def remove(self, item):
+        key = self.item_cells.pop(item, None)
+        if key is None:
+            return
+        cell = self.cells[key]
+        del cell[item]
+        if not cell:
+            del self.cells[key]
+
+    def move(self, item, x, y):
+        # Only touches the buckets when the item actually changed cell
+        key = self.key(x, y)
+        if self.item_cells.get(item) != key:
+            self.remove(item)
+            self.cells.setdefault(key, {})[item] = None
+            self.item_cells[item] = key
+
+    def clear(self):
+        self.cells.clear()
+        self.item_cells.clear()
+
+    def query(self, x, y, radius):
+        # Every item filed in a cell overlapping the square around (x, y);
+        # callers still do their own exact distance test
+        c0, r0 = self.key(x - radius, y - radius)
+        c1, r1 = self.key(x + radius, y + radius)
+        found = []
+        for col in range(c0, c1 + 1):
+            for row in range(r0, r1 + 1):
+                cell = self.cells.get((col, row))
+                if cell:
+                    found.extend(cell)
+        return found
+
+    def query_rect(self, left, top, right, bottom):
+        # Every item filed in a cell overlapping the rectangle
+        c0, r0 = self.key(left, top)
+        c1, r1 = self.key(right, bottom)
+        found = []
+        for col in range(c0, c1 + 1):
+            for row in range(r0, r1 + 1):
+                cell = self.cells.get((col, row))
+                if cell:
+                    found.extend(cell)
+        return found
+
+class SpatialGroup(pygame.sprite.Group):
+    # Sprite group that keeps its members filed in a SpatialHash by position
+    def __init__(self, *sprites, cell_size=50):
+        self.index = SpatialHash(cell_size)
+        super().__init__(*sprites)
+
+    def add_internal(self, sprite, layer=None):
+        super().add_internal(sprite, layer)
+        self.index.insert(sprite, sprite.position.x, sprite.position.y)
+
+    def remove_internal(self, sprite):
+        super().remove_internal(sprite)
+        self.index.remove(sprite)
+
+    def reindex(self):
+        # Call once per tick for groups whose members move
+        for sprite in self.sprites():
+            self.index.move(sprite, sprite.position.x, sprite.position.y)
+
+    def query(self, position, radius):
+        return self.index.query(position.x, position.y, radius)
+
+    def query_rect(self, rect):
+        return self.index.query_rect(rect.left, rect.top, rect.right, rect.bottom)
+
+def nearby(collection, position, radius):
+    # Candidates near position: indexed collections narrow the search,
+    # plain groups and lists are scanned whole
+    query = getattr(collection, 'query', None)
+    if query is None:
+        return collection
+    return query(position, radius)
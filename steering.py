@@ -1,7 +1,9 @@
 import pygame
-import random
+from obstacle import ObstacleMap
 
 class Steering:
+    __slots__ = ('ant', 'max_force', 'perception_radius')
+
     def __init__(self, ant):
         self.ant = ant
         self.max_force = 0.1
@@ -20,6 +22,9 @@ class Steering:
             return wander_force * 1.5 + avoid_force
 
     def avoid_obstacles(self, obstacles):
+        if isinstance(obstacles, ObstacleMap):
+            return obstacles.avoidance(self.ant.position, self.max_force, self.ant.rng)
+
         steering = pygame.math.Vector2(0, 0)
         for obstacle in obstacles:
             to_obstacle = pygame.math.Vector2(obstacle.rect.center) - self.ant.position
@@ -37,7 +42,7 @@ class Steering:
                 if distance_to_edge > 0:
                     avoidance = -to_closest.normalize() * self.max_force * 3
                 else:
-                    avoidance = pygame.math.Vector2(random.uniform(-1, 1), random.uniform(-1, 1)).normalize() * self.max_force * 2
+                    avoidance = pygame.math.Vector2(self.ant.rng.uniform(-1, 1), self.ant.rng.uniform(-1, 1)).normalize() * self.max_force * 2
             elif distance < self.perception_radius + obstacle.rect.width / 2:
                 avoidance = -to_obstacle.normalize() * (self.perception_radius - distance) / self.perception_radius
             else:
@@ -56,7 +61,7 @@ class Steering:
         wander_distance = 50
         wander_jitter = 0.5
 
-        wander_point = pygame.math.Vector2(random.uniform(-1, 1), random.uniform(-1, 1)).normalize() * wander_radius
+        wander_point = pygame.math.Vector2(self.ant.rng.uniform(-1, 1), self.ant.rng.uniform(-1, 1)).normalize() * wander_radius
         target = self.ant.position + self.ant.velocity.normalize() * wander_distance + wander_point
 
         desired = (target - self.ant.position).normalize() * self.ant.max_speed
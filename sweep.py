@@ -0,0 +1,96 @@
+# sweep.py
+import argparse
+import csv
+import itertools
+import multiprocessing
+import os
+import time
+from simulation import Simulation
+
+# Simulation keyword arguments a sweep may vary, with how to parse them from the command line
+SWEEPABLE = {
+    'pheromone_drop_interval': int,
+    'decay_rate': float,
+    'perception_radius': float,
+    'soldier_ratio': float,
+    'shape': str,
+    'num_ants': int,
+    'num_colonies': int,
+}
+
+def parameter_grid(grid):
+    # Every combination of the values in grid, as a list of dicts
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+def run_single(job):
+    # One independent colony; returns one row per sample tick
+    params, seed, ticks, sample_every, vectorized = job
+    start = time.perf_counter()
+    sim = Simulation(seed=seed, vectorized=vectorized, **params)
+    rows = []
+    while sim.ticks < ticks:
+        sim.step(min(sample_every, ticks - sim.ticks))
+        stats = sim.stats()
+        rows.append(dict(params, seed=seed, tick=sim.ticks,
+                         food_stored=stats['food_stored'],
+                         trips_completed=stats['trips_completed'],
+                         pheromone_cells=stats['pheromone_cells'],
+                         pheromone_strength=stats['pheromone_strength']))
+    elapsed = time.perf_counter() - start
+    for row in rows:
+        row['run_seconds'] = round(elapsed, 3)
+    return rows
+
+def sweep(grid, seeds, ticks=2000, sample_every=100, processes=None, vectorized=False):
+    # Fan the grid x seeds runs out over a process pool and collect one table
+    jobs = [(params, seed, ticks, sample_every, vectorized)
+            for params in parameter_grid(grid) for seed in seeds]
+    processes = processes or os.cpu_count() or 1
+    with multiprocessing.Pool(min(processes, len(jobs))) as pool:
+        results = pool.map(run_single, jobs, chunksize=1)
+    return [row for rows in results for row in rows]
+
+def write_table(rows, path):
+    if not rows:
+        return
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+def parse_seeds(text):
+    # "0-9" or "1,5,7"
+    if '-' in text:
+        first, last = text.split('-')
+        return list(range(int(first), int(last) + 1))
+    return [int(seed) for seed in text.split(',')]
+
+def run(argv=None):
+    parser = argparse.ArgumentParser(description="Run a grid of headless colonies across all cores.")
+    parser.add_argument('--param', action='append', default=[], metavar='NAME=V1,V2,...',
+                        help="parameter values to sweep, one of: " + ", ".join(SWEEPABLE))
+    parser.add_argument('--seeds', default='0-3', help="seed list, e.g. 0-9 or 1,5,7")
+    parser.add_argument('--ticks', type=int, default=2000, help="ticks per run")
+    parser.add_argument('--sample-every', type=int, default=100, help="ticks between recorded samples")
+    parser.add_argument('--processes', type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument('--vectorized', action='store_true', help="use the array-based ColonyEngine")
+    parser.add_argument('--out', default='sweep_results.csv', help="CSV file for the result table")
+    args = parser.parse_args(argv)
+
+    grid = {}
+    for item in args.param:
+        name, _, values = item.partition('=')
+        if name not in SWEEPABLE:
+            parser.error(f"unknown parameter {name!r}")
+        grid[name] = [SWEEPABLE[name](value) for value in values.split(',')]
+
+    start = time.perf_counter()
+    rows = sweep(grid, parse_seeds(args.seeds), args.ticks, args.sample_every, args.processes, args.vectorized)
+    write_table(rows, args.out)
+    runs = len(parameter_grid(grid)) * len(parse_seeds(args.seeds))
+    print(f"{runs} runs, {len(rows)} rows written to {args.out} in {time.perf_counter() - start:.1f}s")
+    return rows
+
+if __name__ == "__main__":
+    run()
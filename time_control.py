@@ -0,0 +1,79 @@
+# time_control.py
+import time
+import pygame
+
+class TimeControl:
+    # Fixed timestep scheduler for the window. The world advances in whole
+    # ticks, ticks_per_second of them per second at 1x however fast frames
+    # are drawn: each frame runs the ticks that came due since the last one
+    # (several, or none) and only the state after the last of them is drawn.
+    # Above 10x ticks are run in steps of fast_step ticks (see
+    # Simulation.step). A frame spends at most budget seconds simulating;
+    # ticks that did not fit are dropped rather than carried over, so a world
+    # too slow for the chosen speed runs slower instead of falling behind.
+    SPEEDS = {pygame.K_1: 1, pygame.K_2: 10, pygame.K_3: 100, pygame.K_4: None}  # None: as fast as possible
+
+    def __init__(self, ticks_per_second=60, budget=1 / 40, fast_step=2):
+        self.ticks_per_second = ticks_per_second
+        self.budget = budget
+        self.fast_step = min(fast_step, 4)  # Larger steps let ants pass food and thin walls
+        self.speed = 1
+        self.paused = False
+        self.pending = 0.0  # Ticks due but not run yet
+        self.requested = 0  # Single steps asked for while paused
+        self.last = None  # perf_counter() of the previous advance()
+        self.rate = 0.0  # Ticks per second actually run, smoothed
+
+    def handle_event(self, event):
+        # Space pauses, period steps one tick (pausing first), 1-4 pick
+        # 1x/10x/100x/max. Returns whether the event was one of these keys.
+        if event.type != pygame.KEYDOWN:
+            return False
+        if event.key == pygame.K_SPACE:
+            self.paused = not self.paused
+        elif event.key == pygame.K_PERIOD:
+            self.paused = True
+            self.requested += 1
+        elif event.key in self.SPEEDS:
+            self.speed = self.SPEEDS[event.key]
+        else:
+            return False
+        self.pending = 0.0
+        return True
+
+    def step_size(self):
+        return 1 if self.speed is not None and self.speed <= 10 else self.fast_step
+
+    def advance(self, sim):
+        # Runs the ticks due since the last call; returns how many ran
+        now = time.perf_counter()
+        elapsed = now - self.last if self.last is not None else 0.0
+        self.last = now
+        if self.paused:
+            ran, self.requested = self.requested, 0
+            sim.step(ran)
+            return ran
+
+        step = self.step_size()
+        if self.speed is not None:
+            self.pending += elapsed * self.ticks_per_second * self.speed
+        deadline = now + self.budget
+        ran = 0
+        while self.speed is None or self.pending >= step:
+            sim.step(1, step)
+            ran += step
+            if self.speed is not None:
+                self.pending -= step
+            if time.perf_counter() >= deadline:
+                break
+        if self.pending >= step:
+            self.pending = 0.0  # Out of time: drop the backlog
+        if elapsed > 0:
+            self.rate += (ran / elapsed - self.rate) * 0.1
+        return ran
+
+    def label(self):
+        if self.paused:
+            return "Paused"
+        speed = "Max" if self.speed is None else f"{self.speed}x"
+        return f"{speed} ({self.rate:.0f} ticks/s)"
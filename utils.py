@@ -1,10 +1,11 @@
 import pygame
 import random
 from food import FoodSpot
+from spatial_hash import nearby
 
 def is_valid_food_spot(x, y, obstacles, food_spots, min_distance=200):
     # Check if spot is too close to obstacles
-    for obstacle in obstacles:
+    for obstacle in nearby(obstacles, pygame.math.Vector2(x, y), 100):
         if pygame.math.Vector2(x - obstacle.rect.centerx, 
                              y - obstacle.rect.centery).length() < 100:
             return False
@@ -17,24 +18,29 @@ def is_valid_food_spot(x, y, obstacles, food_spots, min_distance=200):
     
     return True
 
-def create_food_spots(num_spots, obstacles, screen_width, screen_height):
+def create_food_spots(num_spots, obstacles, screen_width, screen_height, rng=random):
     food_spots = []
     min_distance = 200  # Minimum distance between food spots
     
     while len(food_spots) < num_spots:
-        x = random.randint(100, screen_width - 100)
-        y = random.randint(100, screen_height - 100)
+        x = rng.randint(100, screen_width - 100)
+        y = rng.randint(100, screen_height - 100)
         
         if is_valid_food_spot(x, y, obstacles, food_spots, min_distance):
-            spot = FoodSpot(x, y)
+            spot = FoodSpot(x, y, rng=rng)
             spot.add_food(30)  # Add initial food items
             food_spots.append(spot)
     
     return food_spots
 
-def is_valid_nest_position(x, y, obstacles, min_distance=100):
+def is_valid_nest_position(x, y, obstacles, min_distance=100, nests=(), nest_distance=150):
     # Check if the nest's position is too close to any obstacle
-    for obstacle in obstacles:
+    for obstacle in nearby(obstacles, pygame.math.Vector2(x, y), min_distance):
         if pygame.math.Vector2(x - obstacle.rect.centerx, y - obstacle.rect.centery).length() < min_distance:
             return False
-    return True
\ No newline at end of file
+
+    # Check if the nest is too close to another colony's nest
+    for nest in nests:
+        if pygame.math.Vector2(x - nest.position.x, y - nest.position.y).length() < nest_distance:
+            return False
+    return True